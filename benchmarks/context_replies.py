@@ -0,0 +1,118 @@
+"""Prompt size, and optionally measured time to first token, per context_replies mode.
+
+Replays a chatty session (every reply wraps its command in prose, a fenced
+block and a bullet list of flag explanations) through the same
+condense/trim path the REPL uses and reports the estimated prompt tokens
+of each request in each mode. That part is a token-count comparison; it
+runs offline.
+
+With --url, every request of every mode is also sent to that endpoint
+(OpenAI-compatible, streamed, max_tokens=1) and the time to its first
+token is measured, which on a local server is mostly prefill. Servers
+that reuse a cached prompt prefix between requests (llama.cpp does by
+default) hide most of the difference; --no-prompt-cache asks llama.cpp
+not to.
+
+    python benchmarks/context_replies.py [--turns 12]
+    python benchmarks/context_replies.py --url http://localhost:11434/v1 --model gpt-oss:20b [--repeat 3]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+from wtffmpeg.compaction import condense_reply
+from wtffmpeg.config import REPLY_MODES
+from wtffmpeg.context import DEFAULT_CONTEXT_TOKENS, messages_tokens
+from wtffmpeg.repl import trim_messages
+
+SYSTEM = "You are an ffmpeg expert. Answer with one ffmpeg command.\n" * 20
+
+REPLY = """Sure! Here's a command that converts `clip{i}.mov` to an MP4 at {h}p:
+
+```bash
+ffmpeg -i clip{i}.mov -vf scale=-2:{h} -c:v libx264 -preset slow -crf {crf} -c:a aac -b:a 128k clip{i}.mp4
+```
+
+**What each part does:**
+
+- `-vf scale=-2:{h}` resizes to {h} pixels high and keeps the aspect ratio (width rounded to even).
+- `-c:v libx264 -preset slow -crf {crf}` encodes H.264; lower CRF means better quality and bigger files.
+- `-c:a aac -b:a 128k` re-encodes audio to AAC at 128 kbps, which every MP4 player supports.
+
+If the result is too big, raise the CRF by 2-3. For faster encodes use `-preset fast`,
+or `-c:v h264_videotoolbox` / `h264_nvenc` for hardware encoding. Let me know if you want
+to trim it, add subtitles or batch several files!
+"""
+
+
+def run(mode: str, turns: int) -> list[list[dict]]:
+    """The messages of each request in a session replayed with `mode`."""
+    messages = [{"role": "system", "content": SYSTEM}]
+    requests = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"convert clip{i}.mov to mp4, {360 + 60 * i}p please"})
+        messages = trim_messages(messages, 12, DEFAULT_CONTEXT_TOKENS)
+        requests.append(list(messages))
+        raw = REPLY.format(i=i, h=360 + 60 * i, crf=18 + i % 8)
+        messages.append({"role": "assistant", "content": condense_reply(raw, mode)})
+    return requests
+
+
+def first_token(client, model: str, messages: list[dict], extra: dict) -> float:
+    """Seconds from sending `messages` to the first streamed choice."""
+    t0 = time.perf_counter()
+    stream = client.chat.completions.create(model=model, messages=messages, max_tokens=1, stream=True, **extra)
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                break
+    finally:
+        stream.close()
+    return time.perf_counter() - t0
+
+
+def measure(client, model: str, requests: list[list[dict]], repeat: int, extra: dict) -> list[float]:
+    return [min(first_token(client, model, msgs, extra) for _ in range(repeat)) for msgs in requests]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=12)
+    ap.add_argument("--url", help="OpenAI-compatible endpoint to time requests against (default: sizes only).")
+    ap.add_argument("--model", default="gpt-oss:20b")
+    ap.add_argument("--bearer-token", default="ollama")
+    ap.add_argument("--repeat", type=int, default=3, help="Timed runs per request; the fastest counts (default 3).")
+    ap.add_argument("--no-prompt-cache", action="store_true", help="Send cache_prompt=false (llama.cpp).")
+    args = ap.parse_args()
+
+    requests = {mode: run(mode, args.turns) for mode in REPLY_MODES}
+    sizes = {mode: [messages_tokens(m) for m in reqs] for mode, reqs in requests.items()}
+    base = sizes["full"]
+    print(f"{'mode':<10}{'last turn':>12}{'mean':>10}{'total':>10}{'vs full':>9}{'history':>9}")
+    for mode, s in sizes.items():
+        # growth beyond the fixed system prompt is what the mode controls
+        growth = (base[-1] - base[0]) / max(1, s[-1] - s[0])
+        print(f"{mode:<10}{s[-1]:>12}{statistics.fmean(s):>10.0f}{sum(s):>10}{sum(base) / sum(s):>8.2f}x{growth:>8.1f}x")
+    print("(estimated prompt tokens per request)")
+
+    if not args.url:
+        return
+    from openai import OpenAI
+
+    client = OpenAI(base_url=args.url, api_key=args.bearer_token, max_retries=0)
+    extra = {"extra_body": {"cache_prompt": False}} if args.no_prompt_cache else {}
+    print(f"\nTime to first token against {args.url} ({args.model}), fastest of {args.repeat}:")
+    print(f"{'mode':<10}{'last turn':>12}{'mean':>10}{'total':>10}{'vs full':>9}")
+    first_token(client, args.model, requests["full"][0], extra)  # connection setup and model load
+    timed = {mode: measure(client, args.model, reqs, args.repeat, extra) for mode, reqs in requests.items()}
+    for mode, t in timed.items():
+        print(
+            f"{mode:<10}{t[-1] * 1000:>10.0f}ms{statistics.fmean(t) * 1000:>8.0f}ms"
+            f"{sum(t):>9.2f}s{sum(timed['full']) / sum(t):>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Command extraction time against response size.
+
+Builds responses of 1 KB to 10 MB in four shapes and times
+extract_commands() on each, plus a StreamExtractor (JsonStreamExtractor
+for structured replies) fed the same text in small chunks the way a
+streamed response arrives. Linear scaling shows up
+as a flat MB/s column.
+
+  chatty   prose, fenced blocks and bullet lists, many short commands
+  wrapped  one fenced command wrapped over a line per option
+  oneline  a single command on one very long line
+  json     a structured reply with many commands
+
+    python benchmarks/extract.py [--max-mb 10] [--chunk 64]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from wtffmpeg.llm import JsonStreamExtractor, StreamExtractor, extract_commands
+
+BLOCK = """Here's one way to do it for part {i}:
+
+```bash
+ffmpeg -i part{i}.mov \\
+  -vf scale=-2:720 -c:v libx264 -crf 20 part{i}.mp4
+```
+
+- `-vf scale=-2:720` resizes to 720p.
+- `-crf 20` keeps quality high.
+
+"""
+
+
+def chatty(size: int) -> str:
+    parts, n, i = [], 0, 0
+    while n < size:
+        block = BLOCK.format(i=i)
+        parts.append(block)
+        n += len(block)
+        i += 1
+    return "".join(parts)[:size]
+
+
+def wrapped(size: int) -> str:
+    lines = ["```", "ffmpeg -i in.mov"]
+    n, i = 0, 0
+    while n < size:
+        line = f"-metadata:s:{i} title=t{i}"
+        lines.append(line)
+        n += len(line) + 1
+        i += 1
+    return "\n".join(lines + ["out.mkv", "```"])
+
+
+def oneline(size: int) -> str:
+    opts = " ".join(f"-metadata k{i}=v{i}" for i in range(size // 20 + 1))
+    return f"ffmpeg -i in.mov {opts} out.mkv\n"
+
+
+def structured(size: int) -> str:
+    cmds, n, i = [], 0, 0
+    while n < size:
+        cmds.append(f"ffmpeg -i part{i}.mov -vf scale=-2:720 -c:v libx264 -crf 20 part{i}.mp4")
+        n += len(cmds[-1]) + 4
+        i += 1
+    return json.dumps({"commands": cmds, "notes": "One per part."})
+
+
+SHAPES = {"chatty": chatty, "wrapped": wrapped, "oneline": oneline, "json": structured}
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def streamed(text: str, chunk: int) -> list[str]:
+    ex = JsonStreamExtractor() if text.startswith("{") else StreamExtractor()
+    for i in range(0, len(text), chunk):
+        ex.feed(text[i : i + chunk])
+    ex.close()
+    return ex.commands
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--max-mb", type=float, default=10.0)
+    ap.add_argument("--chunk", type=int, default=64, help="Streamed chunk size in characters (default 64).")
+    args = ap.parse_args()
+
+    sizes = [s for s in (1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20) if s <= args.max_mb * (1 << 20)]
+    print(f"{'shape':<9}{'size':>10}{'whole':>11}{'MB/s':>8}{'streamed':>11}{'MB/s':>8}{'commands':>10}")
+    for name, make in SHAPES.items():
+        for size in sizes:
+            text = make(size)
+            mb = len(text) / 1e6
+            repeat = 5 if size <= 1 << 20 else 1
+            whole = best_of(lambda: extract_commands(text), repeat)
+            stream = best_of(lambda: streamed(text, args.chunk), repeat)
+            n = len(extract_commands(text))
+            print(
+                f"{name:<9}{len(text) / 1024:>8.0f}KB{whole * 1000:>9.1f}ms{mb / whole:>8.1f}"
+                f"{stream * 1000:>9.1f}ms{mb / stream:>8.1f}{n:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
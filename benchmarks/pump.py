@@ -0,0 +1,79 @@
+"""Relaying a chatty child's output: line-by-line print vs the output pump.
+
+A child process writes --mb megabytes of ffmpeg-debug-like log lines as
+fast as it can. The old path (text mode, bufsize=1, one prompt_toolkit
+print per line) and pump.run_shell both copy it to a terminal stand-in,
+/dev/null by default. Reported: wall time, how long the child itself took
+to write everything (how much the relay held it back), and the relay's
+own CPU time.
+
+    python benchmarks/pump.py [--mb 1] [--out /dev/null]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import resource
+import shlex
+import subprocess
+import sys
+import time
+
+from prompt_toolkit import print_formatted_text
+from prompt_toolkit.output import create_output
+
+from wtffmpeg.pump import run_shell
+
+CHILD = (
+    "import sys, time\n"
+    "line = '[h264 @ 0x55d0c8a1b2c0] nal_unit_type: 1(Coded slice of a non-IDR picture), nal_ref_idc: 2\\n'\n"
+    "n = int({mb} * 1e6) // len(line)\n"
+    "t0 = time.monotonic()\n"
+    "for _ in range(n):\n"
+    "    sys.stderr.write(line)\n"
+    "sys.stderr.flush()\n"
+    "print(f'child wrote for {{time.monotonic() - t0:.2f}}s', file=sys.stderr)\n"
+)
+
+
+def cpu() -> float:
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+
+def line_by_line(command: str, out) -> str:
+    output = create_output(stdout=out)
+    last = ""
+    with subprocess.Popen(
+        command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+    ) as proc:
+        for line in proc.stdout:
+            print_formatted_text(line, end="", output=output)
+            last = line
+        proc.wait()
+    return last
+
+
+def pumped(command: str, out) -> str:
+    return run_shell(command, out=out).output.splitlines()[-1]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--mb", type=float, default=1.0)
+    ap.add_argument("--out", default=os.devnull)
+    args = ap.parse_args()
+
+    command = f"{shlex.quote(sys.executable)} -c {shlex.quote(CHILD.format(mb=args.mb))}"
+    print(f"{'relay':<14}{'wall':>9}{'child':>9}{'relay cpu':>11}")
+    with open(args.out, "w") as out:
+        for name, relay in (("line-by-line", line_by_line), ("pump", pumped)):
+            c0, t0 = cpu(), time.monotonic()
+            last = relay(command, out)
+            wall, used = time.monotonic() - t0, cpu() - c0
+            child = last.split("for ")[-1].strip().rstrip("s")
+            print(f"{name:<14}{wall:>8.2f}s{child:>8}s{used:>10.2f}s")
+
+
+if __name__ == "__main__":
+    main()
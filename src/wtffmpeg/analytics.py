@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import gzip
+import json
+import math
+from array import array
+from collections import Counter
+from itertools import compress, filterfalse
+from pathlib import Path
+from typing import IO, Iterable
+
+from .telemetry import percentile
+
+UNKNOWN = "(unknown)"
+GROUP_KEYS = ("model", "profile")
+# Commands-per-exchange histogram buckets: 0, 1, 2, 3 and "4+".
+MAX_CMD_BUCKET = 4
+NAN = float("nan")
+
+
+def transcript_files(paths: Iterable[Path]) -> list[Path]:
+    """Expand directories to the *.jsonl / *.jsonl.gz files inside them."""
+    out: list[Path] = []
+    for p in paths:
+        if p.is_dir():
+            out.extend(sorted(q for q in p.rglob("*") if q.name.endswith((".jsonl", ".jsonl.gz"))))
+        else:
+            out.append(p)
+    return out
+
+
+def _open(path: Path) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return path.open(encoding="utf-8", errors="replace")
+
+
+class Columns:
+    """Exchanges from transcript JSONL files, stored column by column.
+
+    One compact array per field (model and profile as integer codes into
+    `labels`, missing latencies as NaN) instead of a dict per record, so
+    millions of exchanges take tens of bytes each and aggregation works on
+    whole columns at a time.
+    """
+
+    def __init__(self) -> None:
+        self.model = array("I")
+        self.profile = array("I")
+        self.wall = array("d")
+        self.ttft = array("d")
+        self.ncmd = array("I")
+        self.executed = bytearray()
+        self.ok = bytearray()
+        self.labels: dict[str, list[str]] = {k: [] for k in GROUP_KEYS}
+        self._codes: dict[str, dict[str, int]] = {k: {} for k in GROUP_KEYS}
+        self.files = 0
+        self.skipped = 0  # unreadable lines
+
+    def __len__(self) -> int:
+        return len(self.ncmd)
+
+    def _code(self, key: str, value) -> int:
+        name = str(value) if value else UNKNOWN
+        codes = self._codes[key]
+        if name not in codes:
+            codes[name] = len(codes)
+            self.labels[key].append(name)
+        return codes[name]
+
+    def _add_exchange(self, rec: dict) -> None:
+        wall = rec.get("wall")
+        ttft = rec.get("ttft", rec.get("ttfc"))  # older records only have ttfc
+        self.model.append(self._code("model", rec.get("model")))
+        self.profile.append(self._code("profile", rec.get("profile")))
+        self.wall.append(float(wall) if isinstance(wall, (int, float)) else NAN)
+        self.ttft.append(float(ttft) if isinstance(ttft, (int, float)) else NAN)
+        self.ncmd.append(len(rec.get("commands") or []))
+        self.executed.append(0)
+        self.ok.append(0)
+
+    def read(self, lines: Iterable[str]) -> None:
+        """Append the exchanges in one transcript, a line at a time.
+
+        Exec records mark the exchange they name by its ts (the latest, for
+        records from before they did) if the command run is one it
+        suggested, as Transcript.log_exec does; an exchange succeeded if
+        any such run exited 0. Cancelled (partial) responses are left out.
+        """
+        self.files += 1
+        current = -1
+        suggested: set[str] = set()
+        by_ts: dict[float, tuple[int, set[str]]] = {}  # exchange ts -> (index, commands); -1 if cancelled
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+                kind = rec.get("t")
+            except (ValueError, AttributeError):
+                self.skipped += 1
+                continue
+            if kind == "exchange":
+                if rec.get("cancelled"):
+                    current, suggested = -1, set()
+                else:
+                    self._add_exchange(rec)
+                    current = len(self) - 1
+                    suggested = {str(c).strip() for c in rec.get("commands") or []}
+                if isinstance(rec.get("ts"), (int, float)):
+                    by_ts[rec["ts"]] = (current, suggested)
+            elif kind == "exec":
+                owner = rec.get("exchange")
+                index, cmds = by_ts.get(owner, (-1, set())) if owner is not None else (current, suggested)
+                if index >= 0 and str(rec.get("command", "")).strip() in cmds:
+                    self.executed[index] = 1
+                    if rec.get("exit_code") == 0:
+                        self.ok[index] = 1
+
+
+def load(paths: Iterable[Path]) -> Columns:
+    cols = Columns()
+    for path in transcript_files(paths):
+        with _open(path) as f:
+            cols.read(f)
+    return cols
+
+
+def _pct(part: int, whole: int) -> float:
+    return round(100.0 * part / whole, 1) if whole else 0.0
+
+
+def _grouped_percentiles(codes: array, values: array, ngroups: int) -> dict[int, tuple[int, float, float]]:
+    """code -> (samples, p50, p95) of the non-NaN `values` in each group.
+
+    Each group is selected from the whole column with compress() and a
+    vectorized mask, so the per-record work stays in C.
+    """
+    out = {}
+    for code in range(ngroups):
+        xs = sorted(filterfalse(math.isnan, compress(values, map(code.__eq__, codes))))
+        if xs:
+            out[code] = (len(xs), percentile(xs, 50), percentile(xs, 95))
+    return out
+
+
+def _latency(stats: tuple[int, float, float] | None) -> dict | None:
+    if stats is None:
+        return None
+    n, p50, p95 = stats
+    return {"n": n, "p50": round(p50, 3), "p95": round(p95, 3)}
+
+
+def summarize(cols: Columns) -> dict:
+    """Success rates, per-model/profile latency percentiles and the commands histogram."""
+    n = len(cols)
+    executed, ok = sum(cols.executed), sum(cols.ok)
+    out: dict = {
+        "files": cols.files,
+        "exchanges": n,
+        "skipped_lines": cols.skipped,
+        "executed": executed,
+        "succeeded": ok,
+        "executed_pct": _pct(executed, n),
+        "success_pct": _pct(ok, n),
+        "success_of_executed_pct": _pct(ok, executed),
+    }
+    for key in GROUP_KEYS:
+        codes = getattr(cols, key)
+        count = Counter(codes)
+        ran = Counter(compress(codes, cols.executed))
+        good = Counter(compress(codes, cols.ok))
+        ngroups = len(cols.labels[key])
+        wall = _grouped_percentiles(codes, cols.wall, ngroups)
+        ttft = _grouped_percentiles(codes, cols.ttft, ngroups)
+        groups = {}
+        for code, name in enumerate(cols.labels[key]):
+            groups[name] = {
+                "exchanges": count[code],
+                "executed_pct": _pct(ran[code], count[code]),
+                "success_pct": _pct(good[code], count[code]),
+                "wall": _latency(wall.get(code)),
+                "ttft": _latency(ttft.get(code)),
+            }
+        out[f"by_{key}"] = dict(sorted(groups.items(), key=lambda kv: -kv[1]["exchanges"]))
+    hist = Counter(min(c, MAX_CMD_BUCKET) for c in cols.ncmd)
+    out["commands_per_exchange"] = {
+        "mean": round(sum(cols.ncmd) / n, 2) if n else 0.0,
+        "histogram": {
+            (f"{b}+" if b == MAX_CMD_BUCKET else str(b)): hist[b] for b in range(MAX_CMD_BUCKET + 1)
+        },
+    }
+    return out
+
+
+def _fmt_latency(lat: dict | None) -> str:
+    return "-" if lat is None else f"{lat['p50']:.2f}/{lat['p95']:.2f}"
+
+
+def format_summary(s: dict) -> str:
+    """Plain-text tables for `wtff stats`."""
+    lines = [
+        f"{s['exchanges']} exchanges in {s['files']} file(s)"
+        + (f" ({s['skipped_lines']} unreadable lines skipped)" if s["skipped_lines"] else ""),
+        f"Executed: {s['executed']} ({s['executed_pct']}%)   "
+        f"Succeeded (exit 0): {s['succeeded']} ({s['success_pct']}%; "
+        f"{s['success_of_executed_pct']}% of executed)",
+    ]
+    for key in GROUP_KEYS:
+        groups = s[f"by_{key}"]
+        if not groups:
+            continue
+        width = max(len(key), *(len(name) for name in groups))
+        lines += [
+            "",
+            f"{key:<{width}}  {'n':>8}  {'exec%':>6}  {'ok%':>6}  {'wall p50/p95':>13}  {'ttft p50/p95':>13}",
+        ]
+        for name, g in groups.items():
+            lines.append(
+                f"{name:<{width}}  {g['exchanges']:>8}  {g['executed_pct']:>6}  {g['success_pct']:>6}  "
+                f"{_fmt_latency(g['wall']):>13}  {_fmt_latency(g['ttft']):>13}"
+            )
+    cpe = s["commands_per_exchange"]
+    total = s["exchanges"]
+    lines += ["", f"Commands per exchange (mean {cpe['mean']}):"]
+    for bucket, count in cpe["histogram"].items():
+        bar = "#" * math.ceil(40 * count / total) if total else ""
+        lines.append(f"  {bucket:>2}  {count:>8}  {_pct(count, total):>5}%  {bar}")
+    return "\n".join(lines)
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import IO, Iterable
+
+from .cache import ResponseCache
+from .config import AppConfig, resolve_profile
+from .context import messages_tokens
+from .llm import extract_commands, paths_in_command, request_completion
+from .resilience import CircuitBreaker
+from .telemetry import RequestStats
+
+BATCH_ORDERS = ("input", "completion")
+DEFAULT_JOBS = 4
+
+
+def read_prompts(lines: Iterable[str]) -> list[str]:
+    """One prompt per line; blank lines and '#' comments are skipped."""
+    out: list[str] = []
+    for ln in lines:
+        ln = ln.strip()
+        if ln and not ln.startswith("#"):
+            out.append(ln)
+    return out
+
+
+def run_one(
+    index: int,
+    prompt: str,
+    client,
+    cfg: AppConfig,
+    system: str,
+    cache: ResponseCache | None = None,
+    breaker: CircuitBreaker | None = None,
+) -> dict:
+    """Generate for a single prompt; never raises, failures land in "error"."""
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt},
+    ]
+    t0 = time.monotonic()
+    raw, error, cached = "", None, False
+    stats = RequestStats()
+    try:
+        hit = cache.lookup(cfg, messages, verify=paths_in_command) if cache is not None else None
+        if hit is not None:
+            raw, cached = hit, True
+        else:
+            raw = request_completion(messages, client, cfg, breaker=breaker, stats=stats)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    commands = extract_commands(raw)
+    if cache is not None and commands and not cached:
+        cache.store(cfg, messages, raw, model=cfg.model)
+    if error is None and not commands:
+        error = "no ffmpeg command in response"
+    return {
+        "index": index,
+        "prompt": prompt,
+        "raw": raw,
+        "commands": commands,
+        "latency": round(time.monotonic() - t0, 3),
+        "tokens_in": messages_tokens(messages),
+        **stats.to_record(),
+        "cached": cached,
+        "error": error,
+    }
+
+
+def run_batch(
+    prompts: list[str],
+    client,
+    cfg: AppConfig,
+    *,
+    out: IO[str],
+    jobs: int = DEFAULT_JOBS,
+    order: str = "input",
+    cache: ResponseCache | None = None,
+    breaker: CircuitBreaker | None = None,
+) -> int:
+    """Run every prompt through one shared client with at most `jobs` in flight.
+
+    Writes one JSONL record per prompt to `out`, either in input order (each
+    record as soon as all earlier ones are written) or in completion order.
+    Returns 0 if every prompt produced a command, else 1. With a `breaker`,
+    prompts fail fast once the endpoint has failed repeatedly.
+    """
+    if order not in BATCH_ORDERS:
+        raise ValueError(f"Invalid batch order '{order}'. Expected one of: {', '.join(BATCH_ORDERS)}.")
+    system = resolve_profile(cfg).text
+    t0 = time.monotonic()
+    failed = 0
+    buffered: dict[int, dict] = {}
+    next_index = 0
+
+    def emit(rec: dict) -> None:
+        out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        out.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [
+            pool.submit(run_one, i, p, client, cfg, system, cache, breaker)
+            for i, p in enumerate(prompts)
+        ]
+        for fut in as_completed(futures):
+            rec = fut.result()
+            if rec["error"]:
+                failed += 1
+            if order == "completion":
+                emit(rec)
+                continue
+            buffered[rec["index"]] = rec
+            while next_index in buffered:
+                emit(buffered.pop(next_index))
+                next_index += 1
+
+    wall = time.monotonic() - t0
+    rate = len(prompts) / wall if wall > 0 else 0.0
+    print(
+        f"batch: {len(prompts)} prompts, {failed} failed, {wall:.1f}s wall "
+        f"({rate:.2f}/s, {max(1, jobs)} concurrent)",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
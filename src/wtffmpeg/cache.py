@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+DEFAULT_CACHE_DIR = Path.home() / ".wtffmpeg" / "cache"
+
+DEFAULT_TTL = 7 * 24 * 3600  # seconds; 0 = entries never expire
+DEFAULT_MAX_MB = 64
+# Hard cap on entry count so eviction scans stay cheap.
+MAX_ENTRIES = 5000
+
+
+# A file-ish token: quoted text ending in an extension, or an unquoted
+# (optionally ~/ ./ / prefixed) path whose last component has an extension
+# starting with a letter (so "h.264", "e.g." and "1.5x" don't count).
+_PATH_RE = re.compile(
+    r"""(["'])([^"'\n]+?\.[A-Za-z][A-Za-z0-9]{1,4})\1"""
+    r"""|(?<![\w./~-])((?:~/|\.{1,2}/|/)?(?:[\w.\-]+/)*[\w\-][\w.\-]*\.[A-Za-z][A-Za-z0-9]{1,4})(?![\w/-]|\.\w)"""
+)
+_PLACEHOLDER_RE = re.compile(r"\{\{(path|stem)(\d+)\}\}")
+# Starts the ffprobe summary probe.with_media_info() appends to a prompt.
+MEDIA_INFO_HEADER = "Media info (ffprobe):"
+# Shorter stems ("in", "a") are too likely to be ordinary words or filter pads.
+MIN_STEM = 3
+
+
+def find_paths(texts: list[str]) -> list[str]:
+    """Path-like tokens across `texts`, in order of first appearance."""
+    out: list[str] = []
+    for text in texts:
+        for m in _PATH_RE.finditer(text or ""):
+            p = m.group(2) or m.group(3)
+            if p not in out:
+                out.append(p)
+    return out
+
+
+def bare_prompt(text: str) -> str:
+    """A user message without the media summary appended to it, i.e. what was typed."""
+    head, sep, _ = (text or "").partition("\n\n" + MEDIA_INFO_HEADER + "\n")
+    return head if sep else text
+
+
+def _bare_messages(messages: list[dict]) -> list[dict]:
+    return [
+        {**m, "content": bare_prompt(m.get("content") or "")} if m.get("role") == "user" else m
+        for m in messages
+    ]
+
+
+def _stem(path: str) -> str:
+    return Path(path).stem
+
+
+def template_text(text: str, paths: list[str], *, stems: bool = False) -> str:
+    """Replace each of `paths` in `text` with {{pathN}}; optionally also bare stems with {{stemN}}.
+
+    Stems catch names the model derived from an input ("A001_proxy.mov").
+    """
+    for i, p in sorted(enumerate(paths, 1), key=lambda t: -len(t[1])):
+        text = re.sub(
+            r"(?<![\w./~-])" + re.escape(p) + r"(?![\w/-]|\.\w)",
+            lambda _m, i=i: f"{{{{path{i}}}}}",
+            text,
+        )
+    if stems:
+        for i, p in enumerate(paths, 1):
+            st = _stem(p)
+            if len(st) >= MIN_STEM:
+                text = re.sub(
+                    r"(?<![\w.~-])" + re.escape(st) + r"(?![A-Za-z0-9])",
+                    lambda _m, i=i: f"{{{{stem{i}}}}}",
+                    text,
+                )
+    return text
+
+
+def fill_template(text: str, paths: list[str]) -> str:
+    """Inverse of template_text() for a new set of paths."""
+
+    def sub(m: re.Match) -> str:
+        p = paths[int(m.group(2)) - 1]
+        return p if m.group(1) == "path" else _stem(p)
+
+    return _PLACEHOLDER_RE.sub(sub, text)
+
+
+def template_messages(messages: list[dict]) -> tuple[list[dict], list[str]]:
+    """Pull paths out of the user turns; template every non-system turn with them."""
+    messages = _bare_messages(messages)
+    paths = find_paths([m.get("content") or "" for m in messages if m.get("role") == "user"])
+    out = []
+    for m in messages:
+        content = m.get("content") or ""
+        if m.get("role") != "system" and paths:
+            content = template_text(content, paths, stems=m.get("role") == "assistant")
+        out.append({"role": m.get("role"), "content": content})
+    return out, paths
+
+
+def cache_key(cfg, messages: list[dict], *, namespace: str = "") -> str:
+    """Content address for a request: endpoint, model, profile text and messages.
+
+    The profile text is the system message the caller built from the active
+    profile, so editing a profile invalidates its entries. User messages
+    count as typed, without their media summary: it describes the files
+    named, which would otherwise keep a template from matching another one.
+    """
+    messages = _bare_messages(messages)
+    profile = ""
+    if messages and messages[0].get("role") == "system":
+        profile = messages[0].get("content") or ""
+    blob = json.dumps(
+        {
+            "provider": cfg.provider,
+            "base_url": cfg.base_url,
+            "model": cfg.model,
+            "profile": profile,
+            "namespace": namespace,
+            "messages": [
+                {"role": m.get("role"), "content": m.get("content")} for m in messages
+            ],
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    template_hits: int
+
+
+class ResponseCache:
+    """On-disk, content-addressed cache of raw model responses.
+
+    One JSON file per entry under `root/<2 hex>/<key>.json`. A file's mtime is
+    its last use, so eviction past `max_bytes` drops least-recently-used
+    entries first. An entry expires `ttl` seconds after it was stored (its
+    `created` time, however often it has been used since): it is then
+    treated as a miss and removed. All filesystem errors degrade to a miss.
+
+    With `templates`, responses are also stored with the prompt's file paths
+    replaced by placeholders, so the same task on a different file can be
+    answered by substituting the new paths back in (see lookup()).
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_CACHE_DIR,
+        *,
+        ttl: int = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        templates: bool = True,
+    ):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.templates = templates
+        self.hits = 0
+        self.misses = 0
+        self.template_hits = 0
+        # running totals, computed lazily by the first put()
+        self._entries: int | None = None
+        self._bytes = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        p = self._path(key)
+        try:
+            rec = json.loads(p.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if self._expired(rec.get("created", 0)):
+            self._remove(p)
+            return None
+        try:
+            os.utime(p)  # mark as recently used
+        except OSError:
+            pass
+        return rec.get("raw")
+
+    @staticmethod
+    def _template_key(cfg, messages: list[dict]) -> tuple[str, list[str]] | None:
+        tmsgs, paths = template_messages(messages)
+        if not paths:
+            return None
+        # extensions stay part of the key: .mov -> .mp4 may need another command
+        exts = ",".join(Path(p).suffix.lower() for p in paths)
+        return cache_key(cfg, tmsgs, namespace=f"paths:{exts}"), paths
+
+    def lookup(
+        self,
+        cfg,
+        messages: list[dict],
+        verify: Callable[[str, list[str]], bool] | None = None,
+    ) -> str | None:
+        """Cached response for `messages`, exact first, then filename-templated.
+
+        A templated hit has the new paths substituted back in and is only
+        returned if `verify(raw, paths)` accepts it.
+        """
+        raw = self.get(cache_key(cfg, messages))
+        if raw is None and self.templates:
+            tk = self._template_key(cfg, messages)
+            if tk is not None:
+                key, paths = tk
+                templated = self.get(key)
+                if templated is not None:
+                    filled = fill_template(templated, paths)
+                    if verify is None or verify(filled, paths):
+                        raw = filled
+                        self.template_hits += 1
+        if raw is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return raw
+
+    def store(self, cfg, messages: list[dict], raw: str, **meta) -> None:
+        """Cache `raw` for `messages`, plus a templated copy when it uses every path."""
+        self.put(cache_key(cfg, messages), raw, **meta)
+        if not self.templates:
+            return
+        tk = self._template_key(cfg, messages)
+        if tk is None:
+            return
+        key, paths = tk
+        if len({_stem(p) for p in paths}) != len(paths):
+            return  # ambiguous stems can't be substituted back reliably
+        templated = template_text(raw, paths, stems=True)
+        if all(f"{{{{path{i}}}}}" in templated for i in range(1, len(paths) + 1)):
+            self.put(key, templated, **meta)
+
+    def put(self, key: str, raw: str, **meta) -> None:
+        p = self._path(key)
+        data = json.dumps({"created": time.time(), "raw": raw, **meta}, ensure_ascii=False)
+        try:
+            self._scan_totals()
+            old = p.stat().st_size if p.exists() else None
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, p)
+        except OSError:
+            return
+        size = len(data.encode("utf-8"))
+        if old is None:
+            self._entries += 1
+            self._bytes += size
+        else:
+            self._bytes += size - old
+        if self._bytes > self.max_bytes or self._entries > MAX_ENTRIES:
+            self._evict()
+
+    def _files(self) -> list[tuple[float, int, Path]]:
+        out = []
+        if not self.root.is_dir():
+            return out
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, p))
+        return out
+
+    def _scan_totals(self) -> None:
+        if self._entries is None:
+            files = self._files()
+            self._entries = len(files)
+            self._bytes = sum(size for _, size, _ in files)
+
+    def _remove(self, p: Path) -> None:
+        try:
+            size = p.stat().st_size
+            p.unlink()
+        except OSError:
+            return
+        if self._entries is not None:
+            self._entries -= 1
+            self._bytes -= size
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def _created(self, p: Path, mtime: float) -> float:
+        """When the entry at `p` was stored (no later than its last use, `mtime`)."""
+        if self._expired(mtime):
+            return mtime  # expired whichever way it is counted; no need to read it
+        try:
+            return float(json.loads(p.read_text(encoding="utf-8")).get("created", 0))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return 0.0
+
+    def _evict(self) -> None:
+        """Drop expired entries, then least-recently-used ones, down to ~90% of the limits."""
+        files = sorted(self._files())
+        self._entries = len(files)
+        self._bytes = sum(size for _, size, _ in files)
+        byte_target = int(self.max_bytes * 0.9)
+        entry_target = int(MAX_ENTRIES * 0.9)
+        for mtime, _, p in files:
+            expired = bool(self.ttl) and self._expired(self._created(p, mtime))
+            if not expired and self._bytes <= byte_target and self._entries <= entry_target:
+                continue
+            self._remove(p)
+
+    def clear(self) -> int:
+        """Delete every entry; returns how many were removed."""
+        n = 0
+        for _, _, p in self._files():
+            try:
+                p.unlink()
+                n += 1
+            except OSError:
+                pass
+        self._entries, self._bytes = 0, 0
+        return n
+
+    def stats(self) -> CacheStats:
+        files = self._files()
+        return CacheStats(
+            entries=len(files),
+            bytes=sum(size for _, size, _ in files),
+            hits=self.hits,
+            misses=self.misses,
+            template_hits=self.template_hits,
+        )
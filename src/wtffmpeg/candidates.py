@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import re
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import openai
+
+from .cache import find_paths
+from .config import AppConfig
+from .context import estimate_tokens, messages_tokens
+from .llm import command_args, create_completion, extract_commands
+from .resilience import CircuitBreaker, call_with_retries
+from .telemetry import RequestStats, usage_counts
+
+# Sampling temperature for compat servers; a single response uses 0.0
+# (completion_kwargs), which would make every sample the same.
+CANDIDATE_TEMPERATURE = 0.7
+
+# Placeholders a model leaves for the user to fill in.
+_PLACEHOLDER_RE = re.compile(r"<[^<>\s]+>|/path/to/|\b(?:INPUT|OUTPUT)_?FILE\b")
+
+
+def sampling_kwargs(cfg: AppConfig) -> dict:
+    # OpenAI's gpt-5 family only accepts its default temperature (1.0), which samples anyway.
+    return {} if cfg.provider == "openai" else {"temperature": CANDIDATE_TEMPERATURE}
+
+
+def syntax_problems(cmd: str) -> list[str]:
+    """Reasons `cmd` can't run as is (empty if it looks well-formed)."""
+    try:
+        args = shlex.split(cmd)
+    except ValueError:
+        return ["unbalanced quotes"]
+    problems = []
+    if not args or Path(args[0]).name != "ffmpeg":
+        problems.append("not an ffmpeg command")
+    inputs = [i for i, a in enumerate(args) if a == "-i"]
+    if not inputs:
+        problems.append("no -i input")
+    elif any(i + 1 >= len(args) or (args[i + 1].startswith("-") and args[i + 1] != "-") for i in inputs):
+        problems.append("-i without a file")
+    elif len(args) - 1 <= inputs[-1] + 1 or (args[-1].startswith("-") and args[-1] != "-"):
+        problems.append("no output")
+    if _PLACEHOLDER_RE.search(cmd):
+        problems.append("placeholder left in")
+    return problems
+
+
+def path_coverage(cmd: str, paths: list[str]) -> float:
+    """Fraction of `paths` (from the prompt) that appear in the command's arguments."""
+    if not paths:
+        return 1.0
+    args = command_args(cmd)
+    return sum(any(p in a for a in args) for p in paths) / len(paths)
+
+
+def _similarity(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def rank_commands(samples: list[list[str]], prompt: str) -> list[str]:
+    """Merge the commands of several sampled responses, best first.
+
+    Ranked by, in order: no syntax problems, how many of the prompt's file
+    paths the command uses, and agreement across samples (for each other
+    sample, the closest of its commands by shared arguments; averaged).
+    Ties keep the order the commands first appeared in.
+    """
+    paths = find_paths([prompt])
+    arg_sets = [[set(command_args(c)) for c in cmds] for cmds in samples]
+    order: list[str] = []
+    owner: dict[str, int] = {}
+    for i, cmds in enumerate(samples):
+        for c in cmds:
+            if c not in owner:
+                owner[c] = i
+                order.append(c)
+
+    def agreement(cmd: str) -> float:
+        mine = set(command_args(cmd))
+        others = [s for j, s in enumerate(arg_sets) if j != owner[cmd]]
+        if not others:
+            return 0.0
+        return sum(max((_similarity(mine, o) for o in s), default=0.0) for s in others) / len(others)
+
+    def key(item: tuple[int, str]):
+        pos, cmd = item
+        return (-len(syntax_problems(cmd)), path_coverage(cmd, paths), agreement(cmd), -pos)
+
+    return [cmd for _, cmd in sorted(enumerate(order), key=key, reverse=True)]
+
+
+class InFlight:
+    """The response streams still open, so cancelling can close them (the server then stops generating)."""
+
+    def __init__(self):
+        self.closed = False
+        self._streams: set = set()
+        self._lock = threading.Lock()
+
+    def add(self, stream) -> bool:
+        """Track `stream`; False (and it is closed) if close() already ran."""
+        with self._lock:
+            if not self.closed:
+                self._streams.add(stream)
+                return True
+        stream.close()
+        return False
+
+    def discard(self, stream) -> None:
+        with self._lock:
+            self._streams.discard(stream)
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            streams, self._streams = list(self._streams), set()
+        for stream in streams:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+def sample_responses(
+    messages: list[dict],
+    client,
+    cfg: AppConfig,
+    n: int,
+    *,
+    breaker: CircuitBreaker | None = None,
+    stats: RequestStats | None = None,
+    inflight: InFlight | None = None,
+) -> list[str]:
+    """`n` sampled responses to the same conversation.
+
+    Asks for all of them in one request with `n=`; servers that reject the
+    parameter, or ignore it and answer once, are topped up with parallel
+    single requests. Responses are streamed (choices told apart by index)
+    so that closing `inflight` ends every request still running. Raises
+    only if no response at all came back.
+    """
+    t0 = time.monotonic()
+    raws: list[str] = []
+    usages = []
+
+    def create(kw: dict, count: int) -> tuple[list[str], object]:
+        if inflight is not None and inflight.closed:
+            raise InterruptedError("cancelled")  # not transient: no retry
+        stream = create_completion(
+            client,
+            cfg,
+            messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **({"n": count} if count > 1 else {}),
+            **sampling_kwargs(cfg),
+            **kw,
+        )
+        if inflight is not None and not inflight.add(stream):
+            raise InterruptedError("cancelled")
+        texts: dict[int, list[str]] = {}
+        usage = None
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:  # the final chunk, with include_usage
+                    usage = chunk.usage
+                for c in chunk.choices or []:
+                    texts.setdefault(c.index, []).append(c.delta.content or "")
+        finally:
+            if inflight is not None:
+                inflight.discard(stream)
+        return ["".join(texts[i]).strip() for i in sorted(texts)], usage
+
+    def one(count: int) -> list[str]:
+        texts, usage = call_with_retries(lambda kw: create(kw, count), cfg, breaker=breaker)
+        usages.append(usage)
+        return texts
+
+    try:
+        raws = one(n)[:n]
+    except (openai.BadRequestError, openai.UnprocessableEntityError):
+        pass  # n= not supported; one request per sample below
+    error: BaseException | None = None
+    missing = n - len(raws)
+    if missing > 0:
+        with ThreadPoolExecutor(max_workers=missing) as pool:
+            for fut in [pool.submit(one, 1) for _ in range(missing)]:
+                try:
+                    raws.extend(fut.result())
+                except Exception as e:
+                    error = e
+    if not raws and error is not None:
+        raise error
+
+    if stats is not None:
+        stats.wall = time.monotonic() - t0
+        counts = [usage_counts(u) for u in usages]
+        if counts and all(c is not None for pair in counts for c in pair):
+            stats.prompt_tokens = sum(p for p, _ in counts)
+            stats.completion_tokens = sum(c for _, c in counts)
+        else:
+            stats.prompt_tokens = messages_tokens(messages) * max(1, len(usages))
+            stats.completion_tokens = sum(estimate_tokens(r) for r in raws)
+            stats.estimated = True
+    return raws
+
+
+class CandidateGeneration:
+    """Sample `n` responses on a background thread and rank their commands.
+
+    Same interface as StreamedGeneration (the REPL treats them alike), but
+    nothing is available until every sample is in: `commands` is the
+    ranked, merged list and `raw` is the response the best command came
+    from. `samples` holds every response.
+    """
+
+    def __init__(
+        self,
+        messages: list[dict],
+        client,
+        cfg: AppConfig,
+        *,
+        n: int,
+        prompt: str,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.messages = list(messages)
+        self.client = client
+        self.cfg = cfg
+        self.n = n
+        self.prompt = prompt
+        self.breaker = breaker
+        self.samples: list[str] = []
+        self.commands: list[str] = []
+        self.raw = ""
+        self.ttfc: float | None = None
+        self.elapsed: float | None = None
+        self.stats = RequestStats()
+        self.error: BaseException | None = None
+        self.cancelled = False
+        self._inflight = InFlight()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def first_command(self) -> str:
+        return self.commands[0] if self.commands else ""
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> "CandidateGeneration":
+        self._t0 = time.monotonic()
+        self._thread.start()
+        return self
+
+    def wait_first(self, timeout: float | None = None) -> str:
+        self._done.wait(timeout)
+        return self.first_command
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def cancel(self) -> None:
+        """Stop waiting and close the HTTP responses still open so the server stops generating."""
+        self.cancelled = True
+        self._inflight.close()
+        self._done.set()
+
+    def _run(self) -> None:
+        try:
+            samples = sample_responses(
+                self.messages,
+                self.client,
+                self.cfg,
+                self.n,
+                breaker=self.breaker,
+                stats=self.stats,
+                inflight=self._inflight,
+            )
+            if self.cancelled:
+                return
+            per_sample = [extract_commands(r) for r in samples]
+            ranked = rank_commands(per_sample, self.prompt)
+            self.samples, self.commands = samples, ranked
+            if ranked:
+                self.raw = next(r for r, cmds in zip(samples, per_sample) if ranked[0] in cmds)
+                self.ttfc = time.monotonic() - self._t0
+            else:
+                self.raw = samples[0] if samples else ""
+        except Exception as e:
+            if not self.cancelled:
+                self.error = e
+        finally:
+            self.elapsed = time.monotonic() - self._t0
+            self._done.set()
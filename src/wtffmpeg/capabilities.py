@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from .llm import command_args
+
+DEFAULT_INDEX_PATH = Path.home() / ".wtffmpeg" / "capabilities.json"
+INDEX_VERSION = 1
+QUERY_TIMEOUT = 30.0  # seconds per ffmpeg invocation
+
+# What each category is built from: `ffmpeg -hide_banner <args>`.
+QUERIES: dict[str, tuple[str, ...]] = {
+    "options": ("-h", "full"),
+    "filters": ("-filters",),
+    "encoders": ("-encoders",),
+    "decoders": ("-decoders",),
+    "muxers": ("-muxers",),
+    "demuxers": ("-demuxers",),
+    "pix_fmts": ("-pix_fmts",),
+}
+
+# "-y   overwrite output files" and "  -crf   <float>   E..V..... ..." (AVOptions)
+_OPTION_RE = re.compile(r"^ {0,2}-([A-Za-z0-9][\w-]*)", re.MULTILINE)
+# " TSC scale   V->V   Scale the input video size ..."
+_FILTER_RE = re.compile(r"^\s*\S+\s+(\S+)\s+\S*->\S*", re.MULTILINE)
+# a filter's name inside a graph: after any [pad] labels, up to '=', '@' or a label
+_FILTER_NAME_RE = re.compile(r"(?:\s*\[[^\]]*\])*\s*([A-Za-z0-9_]+)")
+
+# Options whose value is a filtergraph, a codec, a pixel format or a container format.
+GRAPH_OPTIONS = frozenset({"vf", "af", "filter", "filter_complex", "lavfi"})
+CODEC_OPTIONS = frozenset({"c", "codec", "vcodec", "acodec", "scodec"})
+# Tokens that end the ffmpeg part of a shell line.
+SHELL_OPS = frozenset({"|", "||", "&&", ";", "&"})
+
+
+def parse_options(text: str) -> set[str]:
+    """Option names from `ffmpeg -h full` (global, per-file and every AVOptions section)."""
+    return set(_OPTION_RE.findall(text))
+
+
+def parse_filters(text: str) -> set[str]:
+    """Filter names from `ffmpeg -filters`."""
+    return set(_FILTER_RE.findall(text))
+
+
+def parse_listing(text: str) -> set[str]:
+    """Names from a `-encoders`/`-decoders`/`-muxers`/`-demuxers`/`-pix_fmts` table.
+
+    Entries follow a line of dashes as "<flags> <name[,name...]> <description>".
+    """
+    names: set[str] = set()
+    started = False
+    for line in text.splitlines():
+        s = line.strip()
+        if not started:
+            started = bool(s) and set(s) == {"-"}
+            continue
+        parts = s.split(None, 2)
+        if len(parts) >= 2:
+            names.update(n for n in parts[1].split(",") if n)
+    return names
+
+
+PARSERS: dict[str, Callable[[str], set[str]]] = {
+    "options": parse_options,
+    "filters": parse_filters,
+    "encoders": parse_listing,
+    "decoders": parse_listing,
+    "muxers": parse_listing,
+    "demuxers": parse_listing,
+    "pix_fmts": parse_listing,
+}
+
+
+@dataclass(frozen=True)
+class CapabilityIndex:
+    """What the local ffmpeg build supports, one name set per QUERIES category.
+
+    A category that couldn't be read is empty and isn't checked.
+    """
+
+    sets: dict[str, frozenset[str]] = field(default_factory=dict)
+
+    def get(self, category: str) -> frozenset[str]:
+        return self.sets.get(category, frozenset())
+
+    def to_json(self) -> dict:
+        return {k: sorted(v) for k, v in self.sets.items()}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "CapabilityIndex":
+        return cls({k: frozenset(v) for k, v in data.items() if k in QUERIES and isinstance(v, list)})
+
+
+def _run_query(binary: str, args: tuple[str, ...]) -> str:
+    proc = subprocess.run(
+        [binary, "-hide_banner", *args],
+        capture_output=True,
+        text=True,
+        errors="replace",
+        timeout=QUERY_TIMEOUT,
+    )
+    return proc.stdout or proc.stderr
+
+
+def build_index(binary: str, run: Callable[[str, tuple[str, ...]], str] = _run_query) -> CapabilityIndex:
+    """Query `binary` for every category (in parallel) and parse the output."""
+
+    def one(category: str) -> frozenset[str]:
+        try:
+            return frozenset(PARSERS[category](run(binary, QUERIES[category])))
+        except (OSError, subprocess.SubprocessError):
+            return frozenset()
+
+    with ThreadPoolExecutor(max_workers=len(QUERIES)) as pool:
+        results = dict(zip(QUERIES, pool.map(one, QUERIES)))
+    return CapabilityIndex({k: v for k, v in results.items() if v})
+
+
+def binary_key(binary: str) -> dict:
+    """What identifies a build: its resolved path, size and mtime."""
+    path = os.path.realpath(binary)
+    st = os.stat(path)
+    return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def load_index(
+    binary: str | None = None,
+    path: Path = DEFAULT_INDEX_PATH,
+    *,
+    build: Callable[[str], CapabilityIndex] = build_index,
+) -> CapabilityIndex | None:
+    """The index for `binary` (default: ffmpeg on PATH), from disk or built and saved.
+
+    The saved index is reused while the binary's path, size and mtime are
+    unchanged, so ffmpeg is only queried again after an upgrade. Returns
+    None if there is no ffmpeg to ask.
+    """
+    binary = binary or shutil.which("ffmpeg")
+    if not binary:
+        return None
+    try:
+        key = binary_key(binary)
+    except OSError:
+        return None
+    try:
+        saved = json.loads(path.read_text(encoding="utf-8"))
+        if saved.get("version") == INDEX_VERSION and saved.get("key") == key:
+            return CapabilityIndex.from_json(saved.get("index") or {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    index = build(binary)
+    if not index.sets:
+        return None  # ffmpeg didn't answer; try again next session
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"version": INDEX_VERSION, "key": key, "index": index.to_json()}), encoding="utf-8"
+        )
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return index
+
+
+class IndexLoader:
+    """load_index() on a background thread, so startup never waits on ffmpeg."""
+
+    def __init__(self, binary: str | None = None, path: Path = DEFAULT_INDEX_PATH):
+        self.index: CapabilityIndex | None = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(binary, path), daemon=True)
+
+    def start(self) -> "IndexLoader":
+        self._thread.start()
+        return self
+
+    def _run(self, binary: str | None, path: Path) -> None:
+        try:
+            self.index = load_index(binary, path)
+        except Exception:
+            self.index = None
+        finally:
+            self._done.set()
+
+    def get(self, timeout: float | None = None) -> CapabilityIndex | None:
+        """The index once loaded (None if not ready within `timeout` or unavailable)."""
+        self._done.wait(timeout)
+        return self.index
+
+
+def split_filtergraph(graph: str) -> list[str]:
+    """The filter specs of a filtergraph: split on ',' and ';' outside quotes and escapes."""
+    out: list[str] = []
+    cur: list[str] = []
+    quoted = escaped = False
+    for ch in graph:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == "'":
+            quoted = not quoted
+        elif ch in ",;" and not quoted:
+            out.append("".join(cur))
+            cur = []
+            continue
+        cur.append(ch)
+    out.append("".join(cur))
+    return [s for s in out if s.strip()]
+
+
+def filter_names(graph: str) -> list[str]:
+    """Names of the filters used in a filtergraph, in order."""
+    names = []
+    for spec in split_filtergraph(graph):
+        m = _FILTER_NAME_RE.match(spec)
+        if m and not (m.group(1) == "sws_flags" and "=" in spec):
+            names.append(m.group(1))
+    return names
+
+
+def option_name(tok: str) -> str | None:
+    """'-c:v' -> 'c'; None for values that merely start with '-' (numbers, '-' for stdio)."""
+    name = tok[1:].split(":", 1)[0]
+    if name.startswith("/"):  # -/filter: value read from a file
+        name = name[1:]
+    if not name or not (name[0].isalpha() or name[0] == "_"):
+        return None
+    return name
+
+
+def check_command(cmd: str, index: CapabilityIndex) -> list[str]:
+    """Options, filters, codecs, pixel formats and formats in `cmd` that this ffmpeg lacks.
+
+    Only names are checked, not whether they make sense together. Empty
+    if everything is known (or `cmd` isn't an ffmpeg command).
+    """
+    args = command_args(cmd)
+    if not args or Path(args[0]).name != "ffmpeg":
+        return []
+    options, filters = index.get("options"), index.get("filters")
+    codecs = index.get("encoders") | index.get("decoders")
+    formats = index.get("muxers") | index.get("demuxers")
+    pix_fmts = index.get("pix_fmts")
+    problems: list[str] = []
+
+    def flag(msg: str) -> None:
+        if msg not in problems:
+            problems.append(msg)
+
+    args = args[1:]
+    for i, tok in enumerate(args):
+        if tok in SHELL_OPS:
+            break
+        if not tok.startswith("-") or (name := option_name(tok)) is None:
+            continue
+        value = args[i + 1] if i + 1 < len(args) else None
+        if options and name not in options and not (name.startswith("no") and name[2:] in options):
+            flag(f"option -{name}")
+            continue
+        if value is None:
+            continue
+        if name in GRAPH_OPTIONS and filters:
+            for f in filter_names(value):
+                if f not in filters:
+                    flag(f"filter '{f}'")
+        elif name in CODEC_OPTIONS and codecs and value != "copy" and value not in codecs:
+            flag(f"codec '{value}'")
+        elif name == "pix_fmt" and pix_fmts and value.lstrip("+") not in pix_fmts:
+            flag(f"pixel format '{value}'")
+        elif name == "f" and formats and value not in formats:
+            flag(f"format '{value}'")
+    return problems
@@ -1,4 +1,5 @@
 import argparse
+import json
 import sys
 from pathlib import Path
 
@@ -6,6 +7,11 @@ from .llm import build_client, print_models
 from .repl import repl, single_shot
 from .config import resolve_config, DEFAULT_CONFIG_PATH
 from .profiles import list_profiles
+from .batch import BATCH_ORDERS, DEFAULT_JOBS, read_prompts, run_batch
+from .runtime import build_cache
+from .resilience import CircuitBreaker
+from .transcript import DEFAULT_TRANSCRIPT_PATH
+from . import analytics
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -31,6 +37,36 @@ def build_parser() -> argparse.ArgumentParser:
         help="Single-shot mode: generate for PROMPT once, then exit (use -c to copy).",
     )
 
+    p.add_argument(
+        "--batch",
+        metavar="FILE",
+        default=None,
+        help=(
+            "Batch mode: generate for every line of FILE ('-' = stdin) and write one\n"
+            "JSONL record per prompt (prompt, raw, commands, latency, error), then exit."
+        ),
+    )
+    p.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f"Batch mode: requests in flight at once (default {DEFAULT_JOBS}; match your server's parallel slots).",
+    )
+    p.add_argument(
+        "--order",
+        choices=BATCH_ORDERS,
+        default="input",
+        help="Batch mode: write records in input order (default) or as they complete.",
+    )
+    p.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=None,
+        help="Batch mode: write JSONL here instead of stdout.",
+    )
+
     p.add_argument(
         "--model",
         type=str,
@@ -55,6 +91,15 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="Base URL for OpenAI-compatible API. Defaults WTFFMPEG_LLM_API_URL then http://localhost:11434",
     )
+    p.add_argument(
+        "--pool",
+        type=str,
+        default=None,
+        help=(
+            "Comma-separated base URLs of OpenAI-compatible nodes serving the same\n"
+            "models; requests are load-balanced across them. Defaults WTFFMPEG_LLM_API_POOL."
+        ),
+    )
     p.add_argument(
         "--provider",
         choices=["openai", "compat"],
@@ -85,6 +130,101 @@ def build_parser() -> argparse.ArgumentParser:
         default=None,
         help="How many prior user/assistant turns to include in REPL requests (0 = stateless).",
     )
+    p.add_argument(
+        "--context-tokens",
+        type=int,
+        default=None,
+        help=(
+            "Token budget for the conversation sent with each REPL request (default 8000;\n"
+            "0 = no budget). Older turns are dropped or truncated to fit."
+        ),
+    )
+    p.add_argument(
+        "-n",
+        "--candidates",
+        type=int,
+        default=None,
+        help=(
+            "Sample N responses per request (one call with n= where the server\n"
+            "supports it, parallel calls otherwise), rank the commands locally and\n"
+            "prefill the best; the rest go into history. Default 1."
+        ),
+    )
+    p.add_argument(
+        "--structured",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=(
+            "Ask for JSON ({commands, notes}) via response_format instead of parsing\n"
+            "free text; falls back to text if the server rejects the schema."
+        ),
+    )
+    p.add_argument(
+        "--validate",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=(
+            "Flag options, filters and codecs the local ffmpeg doesn't have in\n"
+            "generated commands (default off; needs ffmpeg on PATH)."
+        ),
+    )
+    p.add_argument(
+        "--probe",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=(
+            "Run ffprobe on existing files named in the prompt and send the model\n"
+            "a summary of their streams (default off; results are cached)."
+        ),
+    )
+    p.add_argument(
+        "--preflight",
+        choices=["off", "warn", "refuse"],
+        default=None,
+        help=(
+            "Dry-run ffmpeg commands (a few frames to the null muxer) before !running\n"
+            "them: warn and ask when that fails, refuse to run, or off (default)."
+        ),
+    )
+    p.add_argument(
+        "--background",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Run ffmpeg !commands as background jobs (see /jobs); !&cmd always does.",
+    )
+    p.add_argument(
+        "--max-jobs",
+        type=int,
+        default=None,
+        help="Background jobs running at once; the rest wait (default: cores / 4).",
+    )
+    p.add_argument(
+        "--parallel",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Encode !ffmpeg commands in up to N segments at once, then join them (default: 0, off).",
+    )
+    p.add_argument(
+        "--context-replies",
+        choices=["full", "commands", "brief"],
+        default=None,
+        help=(
+            "How earlier model replies are sent back as context: in full (default),\n"
+            "only their commands, or commands plus a one-line note. /raw always\n"
+            "shows the full text."
+        ),
+    )
+    p.add_argument(
+        "--compact",
+        dest="compact",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=(
+            "Fold turns that no longer fit into a summary of prompts, commands and\n"
+            "exit codes instead of dropping them (default off)."
+        ),
+    )
 
     p.add_argument("--profile", type=str, default=None, help="Profile name or path")
     p.add_argument("--list-profiles", action="store_true", help="List available profiles and exit")
@@ -117,6 +257,65 @@ def build_parser() -> argparse.ArgumentParser:
             "(default on; view in the REPL with /raw). --no-transcript disables."
         ),
     )
+    p.add_argument(
+        "--stream",
+        dest="stream",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=(
+            "Stream responses and prefill the first command as soon as it is\n"
+            "complete; the rest of the response keeps arriving in the transcript."
+        ),
+    )
+    p.add_argument(
+        "--cache",
+        dest="cache",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=(
+            "Reuse cached responses for identical requests from ~/.wtffmpeg/cache\n"
+            "(default off: every request asks the model)."
+        ),
+    )
+    p.add_argument(
+        "--hedge-model",
+        type=str,
+        default=None,
+        help=(
+            "Hedge slow requests: if no command has arrived after --hedge-delay\n"
+            "seconds, also ask this model; the first usable answer wins."
+        ),
+    )
+    p.add_argument(
+        "--hedge-url",
+        type=str,
+        default=None,
+        help="Send the hedge request to this OpenAI-compatible endpoint (default: same endpoint).",
+    )
+    p.add_argument(
+        "--hedge-delay",
+        type=float,
+        default=None,
+        help="Seconds to wait for the primary before hedging (default 2.0; 0 races both at once).",
+    )
+    p.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Seconds to wait on each attempt before giving up on it (default 60; 0 = no limit).",
+    )
+    p.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Seconds for a whole request, retries included (default 180; 0 = no limit).",
+    )
+    p.add_argument(
+        "--retries",
+        type=int,
+        default=None,
+        help="Retries on connection errors, timeouts, 429 and 5xx, with jittered backoff (default 2).",
+    )
     p.add_argument(
         "--config",
         type=Path,
@@ -126,7 +325,68 @@ def build_parser() -> argparse.ArgumentParser:
     return p
 
 
+def build_stats_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        prog="wtff stats",
+        description="Summarize transcript history: success rates, latency per model/profile, commands per exchange.",
+    )
+    p.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        default=[DEFAULT_TRANSCRIPT_PATH],
+        help=f"Transcript files or directories of them (*.jsonl, *.jsonl.gz). Default: {DEFAULT_TRANSCRIPT_PATH}",
+    )
+    p.add_argument("--json", action="store_true", help="Print the summary as JSON instead of tables.")
+    return p
+
+
+def stats_main(argv: list[str]) -> int:
+    """wtff stats: aggregate transcript files, streamed a line at a time."""
+    args = build_stats_parser().parse_args(argv)
+    try:
+        cols = analytics.load(args.paths)
+    except OSError as e:
+        raise RuntimeError(f"Cannot read transcript: {e}") from e
+    summary = analytics.summarize(cols)
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        print(analytics.format_summary(summary))
+    return 0
+
+
+def batch_main(args, cfg) -> int:
+    """--batch: read prompts, run them concurrently, write JSONL."""
+    try:
+        if args.batch == "-":
+            prompts = read_prompts(sys.stdin)
+        else:
+            prompts = read_prompts(Path(args.batch).read_text(encoding="utf-8").splitlines())
+    except OSError as e:
+        raise RuntimeError(f"Cannot read batch prompts from {args.batch}: {e}") from e
+
+    client = build_client(cfg)
+    kwargs = dict(
+        jobs=args.jobs,
+        order=args.order,
+        cache=build_cache(cfg),
+        breaker=CircuitBreaker(cfg.breaker_threshold, cfg.breaker_cooldown),
+    )
+    if args.output is None:
+        return run_batch(prompts, client, cfg, out=sys.stdout, **kwargs)
+    with args.output.open("w", encoding="utf-8") as out:
+        return run_batch(prompts, client, cfg, out=out, **kwargs)
+
+
 def main() -> None:
+    if sys.argv[1:2] == ["stats"]:
+        try:
+            raise SystemExit(stats_main(sys.argv[2:]))
+        except RuntimeError as e:
+            print(str(e), file=sys.stderr)
+            raise SystemExit(2)
+
     parser = build_parser()
     args = parser.parse_args()
 
@@ -147,6 +407,9 @@ def main() -> None:
             client = build_client(cfg)
             raise SystemExit(print_models(client, cfg))
 
+        if args.batch is not None:
+            raise SystemExit(batch_main(args, cfg))
+
         if cfg.prompt_once is not None:
             client = build_client(cfg)
             rc = single_shot(client=client, cfg=cfg)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import re
+
+from .cache import bare_prompt
+from .config import DEFAULT_COMPACT_KEEP
+from .context import messages_tokens, pinned_count, split_turns
+from .llm import extract_commands
+from .structured import parse_response
+from .transcript import Exchange
+
+SUMMARY_HEADER = (
+    "Summary of earlier turns in this session (compacted; commands shown are the "
+    "ones suggested and, where noted, actually run with their exit codes):"
+)
+# The summary goes at the end of the system message: some chat templates
+# (llama.cpp, Ollama) reject a second system message.
+SUMMARY_MARK = "\n\n" + SUMMARY_HEADER
+# Oldest items are dropped past this so the summary stays bounded too.
+MAX_SUMMARY_ITEMS = 16
+MAX_PROMPT_CHARS = 200
+MAX_NOTE_CHARS = 120
+
+_MARKUP_RE = re.compile(r"[*_`#>]+")
+
+
+def has_summary(message: dict) -> bool:
+    return message.get("role") == "system" and SUMMARY_MARK in (message.get("content") or "")
+
+
+def summary_suffix(message: dict) -> str:
+    """The compaction summary at the end of a system message, or ""."""
+    if not has_summary(message):
+        return ""
+    content = message.get("content") or ""
+    return content[content.find(SUMMARY_MARK):]
+
+
+def _one_line(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def summarize_turn(turn: list[dict], ex: Exchange | None) -> str:
+    """One summary item: what was asked, suggested and run."""
+    prompt = bare_prompt(turn[0].get("content") or "") if turn[0].get("role") == "user" else ""
+    lines = [f"- Asked: {_one_line(prompt, MAX_PROMPT_CHARS)}"]
+    if ex is not None:
+        commands = ex.commands
+    else:
+        reply = "\n".join(m.get("content") or "" for m in turn if m.get("role") == "assistant")
+        commands = extract_commands(reply)
+    if commands:
+        lines.append(f"  Suggested: {_one_line(commands[0], 400)}")
+    for cmd, code in ex.runs if ex is not None else []:
+        lines.append(f"  Ran: {_one_line(cmd, 400)} -> exit {code}")
+    return "\n".join(lines)
+
+
+def reply_note(raw: str, commands: list[str]) -> str:
+    """First line of prose in `raw` (not a fence or command), de-markdowned and shortened.
+
+    For a structured reply, the first line of its notes.
+    """
+    parsed = parse_response(raw)
+    if parsed is not None:
+        raw, commands = parsed[1], []
+    in_cmd = {ln.strip() for c in commands for ln in c.splitlines()}
+    for line in raw.splitlines():
+        s = line.strip()
+        if not s or s.startswith("```") or s in in_cmd or s.startswith("ffmpeg"):
+            continue
+        s = _MARKUP_RE.sub("", s).strip(" :")
+        if any(ch.isalpha() for ch in s):
+            return _one_line(s, MAX_NOTE_CHARS)
+    return ""
+
+
+def condense_reply(raw: str, mode: str) -> str:
+    """The assistant message to keep in context for a response `raw`.
+
+    "full" keeps it as is; "commands" keeps only the extracted commands;
+    "brief" adds the first line of prose as a shell comment. A response with
+    no command (a question, a refusal) is always kept in full.
+    """
+    if mode == "full":
+        return raw
+    commands = extract_commands(raw)
+    if not commands:
+        return raw
+    body = "\n".join(commands)
+    if mode == "brief":
+        note = reply_note(raw, commands)
+        if note:
+            body = f"# {note}\n{body}"
+    return body
+
+
+def _summary_items(suffix: str) -> list[str]:
+    body = suffix[len(SUMMARY_MARK):]
+    items: list[str] = []
+    for line in body.splitlines():
+        if line.startswith("- "):
+            items.append(line)
+        elif line.strip() and items:
+            items[-1] += "\n" + line
+    return items
+
+
+def _match_exchanges(turns: list[list[dict]], exchanges: list[Exchange]) -> list[Exchange | None]:
+    """Pair each turn with the transcript exchange for its prompt.
+
+    Matched newest-first, so a repeated prompt ("again") pairs with its own,
+    most recent exchange rather than an older one.
+    """
+    out: list[Exchange | None] = []
+    j = len(exchanges)
+    for turn in reversed(turns):
+        prompt = bare_prompt(turn[0].get("content") or "") if turn[0].get("role") == "user" else None
+        found = None
+        for k in range(j - 1, -1, -1):
+            if exchanges[k].prompt == prompt and not exchanges[k].cancelled:
+                found, j = exchanges[k], k
+                break
+        out.append(found)
+    return out[::-1]
+
+
+def compact_messages(
+    messages: list[dict],
+    exchanges: list[Exchange],
+    *,
+    keep_turns: int = DEFAULT_COMPACT_KEEP,
+    max_turns: int,
+    max_tokens: int = 0,
+    force: bool = False,
+) -> list[dict]:
+    """Fold older turns into one summary message once history outgrows its limits.
+
+    Compaction kicks in when there are more than `max_turns` turns or more
+    than ~`max_tokens` estimated tokens (the same limits trim_messages()
+    enforces by dropping turns). Everything but the newest `keep_turns`
+    turns is replaced by a summary appended to the system message, listing
+    each folded prompt, the command suggested and the commands actually run
+    with their exit codes (from `exchanges`, the session Transcript). An
+    earlier summary is extended rather than repeated. `force` compacts even
+    under the limits. Returns `messages` unchanged when there is nothing
+    to do.
+    """
+    n = pinned_count(messages)
+    pinned, rest = messages[:n], messages[n:]
+    turns = split_turns(rest)
+    over = len(turns) > max_turns or (max_tokens > 0 and messages_tokens(messages) > max_tokens)
+    keep_turns = max(1, keep_turns)
+    if not (over or force) or len(turns) <= keep_turns:
+        return messages
+
+    fold, keep = turns[:-keep_turns], turns[-keep_turns:]
+    suffix = summary_suffix(pinned[0])
+    items = _summary_items(suffix) if suffix else []
+    matched = _match_exchanges(turns, exchanges)[: len(fold)]
+    items.extend(summarize_turn(t, ex) for t, ex in zip(fold, matched))
+    items = items[-MAX_SUMMARY_ITEMS:]
+
+    content = pinned[0].get("content") or ""
+    profile = content[: len(content) - len(suffix)]
+    system = {"role": "system", "content": profile + SUMMARY_MARK + "\n" + "\n".join(items)}
+    return [system] + pinned[1:] + [m for t in keep for m in t]
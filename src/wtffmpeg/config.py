@@ -7,6 +7,16 @@ from typing import Optional, Literal, Any
 import os
 
 from .profiles import load_profile, Profile, DEFAULT_PROFILE_DIR
+from .cache import DEFAULT_TTL, DEFAULT_MAX_MB
+from .pool import DEFAULT_CHECK_INTERVAL
+from .context import DEFAULT_CONTEXT_TOKENS
+from .resilience import (
+    DEFAULT_BREAKER_COOLDOWN,
+    DEFAULT_BREAKER_THRESHOLD,
+    DEFAULT_DEADLINE,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+)
 
 Provider = Literal["openai", "compat"]
 
@@ -15,11 +25,23 @@ DEFAULT_MODEL_COMPAT = "gpt-oss:20b"
 DEFAULT_MODEL_OPENAI = "gpt-5.4-mini"
 DEFAULT_PROFILE_NAME = "minimal"
 
+DEFAULT_HEDGE_DELAY = 2.0  # seconds
+DEFAULT_COMPACT_KEEP = 4  # newest turns kept verbatim when compacting
+MAX_CANDIDATES = 8
+
 DEFAULT_CONFIG_PATH = Path.home() / ".wtffmpeg" / "config.env"
 
 # What plain up/down arrows scroll through in the REPL.
 HISTORY_MODES = ("prompt", "command", "all")
 
+# What an assistant turn looks like when it is sent back as context:
+# the full response, just its commands, or commands plus a one-line note.
+REPLY_MODES = ("full", "commands", "brief")
+
+# What happens when an ffmpeg command's dry run fails before it is run:
+# nothing (no dry run), a warning and a prompt, or it isn't run.
+PREFLIGHT_MODES = ("off", "warn", "refuse")
+
 # Keys that are safe to accept from a config file / REPL.
 CONFIG_KEYS: set[str] = {
     "model",
@@ -28,11 +50,38 @@ CONFIG_KEYS: set[str] = {
     "openai_api_key",
     "bearer_token",
     "context_turns",
+    "context_tokens",
+    "compact",
+    "compact_keep",
+    "context_replies",
+    "candidates",
+    "structured",
+    "validate",
+    "probe",
+    "preflight",
+    "background",
+    "max_jobs",
+    "parallel",
     "profile",
     "no_nag",
     "copy",
     "history",
     "transcript",
+    "stream",
+    "cache",
+    "cache_ttl",
+    "cache_max_mb",
+    "cache_templates",
+    "hedge_model",
+    "hedge_url",
+    "hedge_delay",
+    "pool",
+    "pool_check_interval",
+    "timeout",
+    "deadline",
+    "retries",
+    "breaker_threshold",
+    "breaker_cooldown",
 }
 
 # Keys we persist by default (avoid secrets).
@@ -41,11 +90,38 @@ PERSIST_KEYS: set[str] = {
     "provider",
     "base_url",
     "context_turns",
+    "context_tokens",
+    "compact",
+    "compact_keep",
+    "context_replies",
+    "candidates",
+    "structured",
+    "validate",
+    "probe",
+    "preflight",
+    "background",
+    "max_jobs",
+    "parallel",
     "profile",
     "no_nag",
     "copy",
     "history",
     "transcript",
+    "stream",
+    "cache",
+    "cache_ttl",
+    "cache_max_mb",
+    "cache_templates",
+    "hedge_model",
+    "hedge_url",
+    "hedge_delay",
+    "pool",
+    "pool_check_interval",
+    "timeout",
+    "deadline",
+    "retries",
+    "breaker_threshold",
+    "breaker_cooldown",
 }
 
 @dataclass(frozen=True)
@@ -77,6 +153,56 @@ class AppConfig:
     history: str = "all"  # one of HISTORY_MODES
     transcript: bool = True
 
+    # stream responses; prefill the first command as soon as it is complete
+    stream: bool = False
+
+    # on-disk response cache (~/.wtffmpeg/cache)
+    cache: bool = False
+    cache_ttl: int = DEFAULT_TTL  # seconds; 0 = never expire
+    cache_max_mb: int = DEFAULT_MAX_MB
+    # also match the same prompt about different files (paths templated out)
+    cache_templates: bool = True
+
+    # hedged requests: race a second model and/or endpoint once the primary
+    # has gone hedge_delay seconds without a command; unset = no hedging
+    hedge_model: Optional[str] = None
+    hedge_url: Optional[str] = None  # normalized like base_url
+    hedge_delay: float = DEFAULT_HEDGE_DELAY
+
+    # load-balanced compat nodes serving the same models; when set, base_url
+    # is the first of them (used for display and cache keys)
+    pool: tuple[str, ...] = ()
+    pool_check_interval: int = DEFAULT_CHECK_INTERVAL  # seconds; 0 = no periodic checks
+
+    # token budget for the conversation sent with each request; 0 = turns only
+    context_tokens: int = DEFAULT_CONTEXT_TOKENS
+    # fold turns that would be trimmed into a summary (prompts, commands, exit codes)
+    compact: bool = False
+    compact_keep: int = DEFAULT_COMPACT_KEEP
+    context_replies: str = "full"  # one of REPLY_MODES
+
+    # responses sampled per request and ranked locally; 1 = a single response
+    candidates: int = 1
+    # ask for {"commands": [...], "notes": "..."} via response_format (json_schema)
+    structured: bool = False
+    # check generated commands against the local ffmpeg's options/filters/codecs
+    validate: bool = False
+    # describe files named in the prompt (ffprobe) in the message sent to the model
+    probe: bool = False
+    # dry-run ffmpeg commands to the null muxer before running them; one of PREFLIGHT_MODES
+    preflight: str = "off"
+    # run ffmpeg !commands as background jobs (!&cmd always does)
+    background: bool = False
+    max_jobs: int = 0  # background jobs running at once; 0 = cores / jobs.FFMPEG_THREADS
+    parallel: int = 0  # encode !ffmpeg commands in up to this many segments at once; 0 = off
+
+    # request resilience (seconds; 0 = no limit)
+    timeout: float = DEFAULT_TIMEOUT  # per attempt
+    deadline: float = DEFAULT_DEADLINE  # whole request, retries included
+    retries: int = DEFAULT_RETRIES  # extra attempts on connection errors / 429 / 5xx
+    breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD  # failures in a row; 0 = off
+    breaker_cooldown: float = DEFAULT_BREAKER_COOLDOWN
+
 
 def _resolve_bool(cli_value: Optional[bool], file_value: Any, default: bool = False) -> bool:
     """Tri-state resolution: explicit CLI true/false > config file > default."""
@@ -105,6 +231,17 @@ def normalize_base_url(url: str) -> str:
     return url
 
 
+def parse_pool(value: Any) -> tuple[str, ...]:
+    """Comma/space separated base URLs (or a sequence of them), normalized and deduped."""
+    items = value.replace(",", " ").split() if isinstance(value, str) else list(value or ())
+    out: list[str] = []
+    for item in items:
+        url = normalize_base_url(str(item))
+        if url not in out:
+            out.append(url)
+    return tuple(out)
+
+
 def normalize_provider(provider: str) -> Provider:
     p = provider.strip().lower()
     if p not in ("openai", "compat"):
@@ -121,13 +258,36 @@ def normalize_history_mode(mode: str) -> str:
     return m
 
 
+def normalize_reply_mode(mode: str) -> str:
+    m = mode.strip().lower()
+    if m not in REPLY_MODES:
+        raise ValueError(
+            f"Invalid context_replies mode '{mode}'. Expected one of: {', '.join(REPLY_MODES)}."
+        )
+    return m
+
+
+def normalize_preflight_mode(mode: str) -> str:
+    m = mode.strip().lower()
+    if m not in PREFLIGHT_MODES:
+        raise ValueError(
+            f"Invalid preflight mode '{mode}'. Expected one of: {', '.join(PREFLIGHT_MODES)}."
+        )
+    return m
+
+
 def _coerce_value(key: str, raw: str) -> Any:
     v = raw.strip()
     if v.lower() in ("none", "null"):
         return None
-    if key in ("context_turns",):
+    if key in (
+        "context_turns", "context_tokens", "compact_keep", "cache_ttl", "cache_max_mb", "pool_check_interval",
+        "retries", "breaker_threshold", "candidates", "max_jobs", "parallel",
+    ):
         return int(v)
-    if key in ("copy", "no_nag", "transcript"):
+    if key in ("hedge_delay", "timeout", "deadline", "breaker_cooldown"):
+        return float(v)
+    if key in ("copy", "no_nag", "transcript", "stream", "cache", "cache_templates", "compact", "structured", "validate", "probe", "background"):
         if v.lower() in ("1", "true", "yes", "on"):
             return True
         if v.lower() in ("0", "false", "no", "off"):
@@ -135,6 +295,12 @@ def _coerce_value(key: str, raw: str) -> Any:
         raise ValueError(f"Bad boolean for {key}: {raw}")
     if key == "history":
         return normalize_history_mode(v)
+    if key == "context_replies":
+        return normalize_reply_mode(v)
+    if key == "preflight":
+        return normalize_preflight_mode(v)
+    if key == "pool":
+        return parse_pool(v)
     return v
 
 
@@ -179,6 +345,8 @@ def save_config(cfg: AppConfig, path: Path | None = None, keys: set[str] | None
             v = getattr(cfg, k)
         if v is None:
             continue
+        if isinstance(v, tuple):
+            v = ",".join(v)
         lines.append(f"{k}={v}")
     path.write_text("\n".join(lines) + ("\n" if lines else ""), encoding="utf-8")
     return path
@@ -202,12 +370,31 @@ def apply_overrides(cfg: AppConfig, overrides: dict[str, Any]) -> AppConfig:
         updates["base_url"] = normalize_base_url(str(updates["base_url"]))
 
     # provider should be a valid Literal
+    # a pool implies compat and replaces base_url with its first node
+    if "pool" in updates:
+        updates["pool"] = parse_pool(updates["pool"])
+        if updates["pool"]:
+            updates["base_url"] = updates["pool"][0]
+            updates["provider"] = "compat"
+
+    if "hedge_url" in updates and updates["hedge_url"]:
+        updates["hedge_url"] = normalize_base_url(str(updates["hedge_url"]))
+
     if "provider" in updates and updates["provider"] is not None:
         updates["provider"] = normalize_provider(str(updates["provider"]))
 
     if "history" in updates and updates["history"] is not None:
         updates["history"] = normalize_history_mode(str(updates["history"]))
 
+    if "candidates" in updates and updates["candidates"] is not None:
+        updates["candidates"] = min(MAX_CANDIDATES, max(1, int(updates["candidates"])))
+
+    if "context_replies" in updates and updates["context_replies"] is not None:
+        updates["context_replies"] = normalize_reply_mode(str(updates["context_replies"]))
+
+    if "preflight" in updates and updates["preflight"] is not None:
+        updates["preflight"] = normalize_preflight_mode(str(updates["preflight"]))
+
     return replace(cfg, **updates)
 
 
@@ -236,8 +423,14 @@ def resolve_config(args, *, config_path: Path | None = None) -> AppConfig:
     bearer_token = getattr(args, "bearer_token", None) or _env_nonempty("WTFFMPEG_BEARER_TOKEN") or file_cfg.get("bearer_token")
     # A URL explicitly provided from any source is a compat signal; only fall
     # back to the default localhost URL after inference has run.
+    pool = parse_pool(
+        getattr(args, "pool", None)
+        or _env_nonempty("WTFFMPEG_LLM_API_POOL")
+        or file_cfg.get("pool")
+    )
     url_explicit = (
-        getattr(args, "url", None)
+        (pool[0] if pool else None)
+        or getattr(args, "url", None)
         or _env_nonempty("WTFFMPEG_LLM_API_URL")
         or file_cfg.get("base_url")
     )
@@ -295,6 +488,27 @@ def resolve_config(args, *, config_path: Path | None = None) -> AppConfig:
     transcript = _resolve_bool(
         getattr(args, "transcript", None), file_cfg.get("transcript"), default=True
     )
+    stream = _resolve_bool(getattr(args, "stream", None), file_cfg.get("stream"))
+    cache = _resolve_bool(getattr(args, "cache", None), file_cfg.get("cache"), default=False)
+    cache_templates = _resolve_bool(None, file_cfg.get("cache_templates"), default=True)
+    cache_ttl = file_cfg.get("cache_ttl")
+    cache_max_mb = file_cfg.get("cache_max_mb")
+
+    pool_check_interval = file_cfg.get("pool_check_interval")
+
+    def _number(name: str, default, kind):
+        v = getattr(args, name, None)
+        if v is None:
+            v = file_cfg.get(name)
+        return default if v is None else kind(v)
+
+    hedge_model = getattr(args, "hedge_model", None) or file_cfg.get("hedge_model")
+    hedge_url = getattr(args, "hedge_url", None) or file_cfg.get("hedge_url")
+    hedge_delay = (
+        getattr(args, "hedge_delay", None)
+        if getattr(args, "hedge_delay", None) is not None
+        else file_cfg.get("hedge_delay")
+    )
 
     return AppConfig(
         model=str(model),
@@ -311,6 +525,39 @@ def resolve_config(args, *, config_path: Path | None = None) -> AppConfig:
         profile_dir=profile_dir,
         history=history,
         transcript=transcript,
+        stream=stream,
+        cache=cache,
+        cache_ttl=DEFAULT_TTL if cache_ttl is None else int(cache_ttl),
+        cache_max_mb=DEFAULT_MAX_MB if cache_max_mb is None else int(cache_max_mb),
+        cache_templates=cache_templates,
+        hedge_model=hedge_model,
+        hedge_url=normalize_base_url(str(hedge_url)) if hedge_url else None,
+        hedge_delay=DEFAULT_HEDGE_DELAY if hedge_delay is None else float(hedge_delay),
+        pool=pool if provider == "compat" else (),
+        pool_check_interval=(
+            DEFAULT_CHECK_INTERVAL if pool_check_interval is None else int(pool_check_interval)
+        ),
+        context_tokens=_number("context_tokens", DEFAULT_CONTEXT_TOKENS, int),
+        compact=_resolve_bool(getattr(args, "compact", None), file_cfg.get("compact"), default=False),
+        compact_keep=_number("compact_keep", DEFAULT_COMPACT_KEEP, int),
+        context_replies=normalize_reply_mode(
+            str(getattr(args, "context_replies", None) or file_cfg.get("context_replies") or "full")
+        ),
+        structured=_resolve_bool(getattr(args, "structured", None), file_cfg.get("structured"), default=False),
+        validate=_resolve_bool(getattr(args, "validate", None), file_cfg.get("validate"), default=False),
+        probe=_resolve_bool(getattr(args, "probe", None), file_cfg.get("probe"), default=False),
+        background=_resolve_bool(getattr(args, "background", None), file_cfg.get("background"), default=False),
+        max_jobs=max(0, _number("max_jobs", 0, int)),
+        parallel=max(0, _number("parallel", 0, int)),
+        preflight=normalize_preflight_mode(
+            str(getattr(args, "preflight", None) or file_cfg.get("preflight") or "off")
+        ),
+        candidates=min(MAX_CANDIDATES, max(1, _number("candidates", 1, int))),
+        timeout=_number("timeout", DEFAULT_TIMEOUT, float),
+        deadline=_number("deadline", DEFAULT_DEADLINE, float),
+        retries=_number("retries", DEFAULT_RETRIES, int),
+        breaker_threshold=_number("breaker_threshold", DEFAULT_BREAKER_THRESHOLD, int),
+        breaker_cooldown=_number("breaker_cooldown", DEFAULT_BREAKER_COOLDOWN, float),
     )
 
 def resolve_profile(cfg: AppConfig) -> Profile:
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import re
+
+DEFAULT_CONTEXT_TOKENS = 8000  # 0 = no token budget, only context_turns applies
+
+# Rough per-message cost of role markers and separators in chat templates.
+MESSAGE_OVERHEAD = 4
+# Don't bother keeping a truncated message smaller than this.
+MIN_TRUNCATED_TOKENS = 48
+TRUNCATION_MARK = "\n[... truncated to fit the context budget ...]"
+
+# Letter runs, digit runs, and single punctuation characters; approximates
+# how BPE tokenizers split English prose and shell/ffmpeg syntax.
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer): ~4 letters or ~3 digits per token, 1 per symbol."""
+    n = 0
+    for m in _PIECE_RE.finditer(text or ""):
+        piece = m.group()
+        c = piece[0]
+        if c.isalpha():
+            n += (len(piece) + 3) // 4
+        elif c.isdigit():
+            n += (len(piece) + 2) // 3
+        else:
+            n += 1
+    return n
+
+
+def message_tokens(message: dict) -> int:
+    return MESSAGE_OVERHEAD + estimate_tokens(message.get("content") or "")
+
+
+def messages_tokens(messages: list[dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Keep the head of `text` within ~`budget` tokens, marking the cut."""
+    budget -= estimate_tokens(TRUNCATION_MARK)
+    if budget <= 0:
+        return TRUNCATION_MARK.strip()
+    used = 0
+    end = 0
+    for m in _PIECE_RE.finditer(text):
+        used += estimate_tokens(m.group())
+        if used > budget:
+            break
+        end = m.end()
+    return text[:end].rstrip() + TRUNCATION_MARK
+
+
+def pinned_count(messages: list[dict]) -> int:
+    """Number of leading system messages (never trimmed)."""
+    n = min(1, len(messages))
+    while n < len(messages) and messages[n].get("role") == "system":
+        n += 1
+    return n
+
+
+def split_turns(rest: list[dict]) -> list[list[dict]]:
+    """Group non-system messages into turns, each starting at a user message."""
+    turns: list[list[dict]] = []
+    for m in rest:
+        if m.get("role") == "user" or not turns:
+            turns.append([m])
+        else:
+            turns[-1].append(m)
+    return turns
+
+
+def fit_messages(messages: list[dict], *, max_turns: int, max_tokens: int = 0) -> list[dict]:
+    """Trim history to at most `max_turns` turns and ~`max_tokens` estimated tokens.
+
+    The system message (first, plus any system messages right after it)
+    and the newest turn are always kept whole.
+    Older turns are kept newest-first while they fit; the first one that
+    doesn't gets its assistant reply truncated if that leaves a useful amount,
+    and everything older is dropped. max_tokens=0 means no token budget.
+    Untouched messages are passed through as the same objects.
+    """
+    if max_turns <= 0:
+        return messages[:1]  # keep only system
+    n = pinned_count(messages)
+    system, rest = messages[:n], messages[n:]
+    turns = split_turns(rest)
+    if len(turns) > max_turns:
+        turns = turns[-max_turns:]
+    if max_tokens <= 0 or not turns:
+        return system + [m for t in turns for m in t]
+
+    kept = [turns[-1]]
+    left = max_tokens - messages_tokens(system) - messages_tokens(turns[-1])
+    for turn in reversed(turns[:-1]):
+        cost = messages_tokens(turn)
+        if cost <= left:
+            kept.append(turn)
+            left -= cost
+            continue
+        head, tail = turn[:-1], turn[-1]
+        room = left - messages_tokens(head) - MESSAGE_OVERHEAD
+        if tail.get("role") == "assistant" and room >= MIN_TRUNCATED_TOKENS:
+            kept.append(head + [{**tail, "content": truncate_to_tokens(tail.get("content") or "", room)}])
+        break
+    return system + [m for t in reversed(kept) for m in t]
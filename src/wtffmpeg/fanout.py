@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import glob
+import os
+import shlex
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Callable
+
+from .capabilities import option_name
+from .jobs import Job, JobManager
+from .llm import command_args
+from .preflight import FLAG_OPTIONS, STDIN_INPUTS, ends_command
+from .progress import StatusLine, format_clock
+
+
+@dataclass(frozen=True)
+class MapTemplate:
+    """An ffmpeg command with the argument positions /map rewrites per file."""
+
+    args: tuple[str, ...]
+    input: int  # index of the input path in args
+    outputs: tuple[int, ...]  # indexes of the output paths
+
+    @property
+    def input_path(self) -> str:
+        return self.args[self.input]
+
+
+@dataclass
+class MapItem:
+    input: str
+    outputs: list[str]
+    command: str
+    skip: str = ""  # why it isn't run ('' = run it)
+    job: Job | None = None
+
+    @property
+    def status(self) -> str:
+        if self.skip:
+            return "skipped"
+        return self.job.state if self.job is not None else "queued"
+
+
+@dataclass
+class MapRun:
+    """A /map in progress (or done): every matched file and what became of it."""
+
+    template: MapTemplate
+    items: list[MapItem]
+    started: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    label: str = "Map"  # status line prefix
+
+    @property
+    def to_run(self) -> list[MapItem]:
+        return [it for it in self.items if not it.skip]
+
+    def counts(self) -> dict[str, int]:
+        out: dict[str, int] = {}
+        for it in self.items:
+            out[it.status] = out.get(it.status, 0) + 1
+        return out
+
+    def fraction(self) -> float | None:
+        """Share of the work done: by output time when every file's duration is known, else by files."""
+        items = self.to_run
+        if not items:
+            return None
+        done = total = 0.0
+        for it in items:
+            p = it.job.progress if it.job is not None else None
+            if p is None or not p.duration:
+                break
+            total += p.duration
+            done += p.duration if it.status in ("done", "failed", "killed") else min(p.out_time, p.duration)
+        else:
+            return done / total
+        return sum(it.status in ("done", "failed", "killed") for it in items) / len(items)
+
+    def status_line(self) -> str:
+        c = self.counts()
+        finished = c.get("done", 0) + c.get("failed", 0) + c.get("killed", 0)
+        parts = [f"{self.label}: {finished}/{len(self.to_run)} files"]
+        if c.get("failed"):
+            parts.append(f"{c['failed']} failed")
+        if c.get("running"):
+            parts.append(f"{c['running']} running")
+        f = self.fraction()
+        if f is not None and finished < len(self.to_run):
+            elapsed = time.monotonic() - self.started
+            parts.append(f"{f:.0%}")
+            if f > 0:
+                parts.append(f"ETA {format_clock(elapsed * (1 - f) / f)[:-3]}")
+        return "  ".join(parts)
+
+    def summary(self) -> str:
+        c = self.counts()
+        took = (self.finished or time.monotonic()) - self.started
+        parts = [f"{c.get(s)} {s}" for s in ("done", "failed", "killed", "skipped") if c.get(s)]
+        return f"{len(self.items)} files: {', '.join(parts) or 'nothing to do'} in {format_clock(took)[:-3]}"
+
+
+def map_template(command: str) -> MapTemplate | None:
+    """Find the input and output paths of a plain ffmpeg command.
+
+    The first input that is a file (not stdin, not a -f lavfi source) is
+    the one /map swaps; any others (a watermark, a subtitle file) stay as
+    they are. Outputs are the words that are neither options nor their
+    values, as in preflight.dry_run_args. None if `command` isn't a single
+    ffmpeg command with a file input and a file output.
+    """
+    args = command_args(command)
+    if not args or Path(args[0]).name != "ffmpeg":
+        return None
+    source = None
+    outputs: list[int] = []
+    fmt = None  # -f seen since the last input/output
+    i = 1
+    while i < len(args):
+        tok = args[i]
+        if ends_command(tok):
+            return None
+        name = option_name(tok) if tok.startswith("-") else None
+        if name is None:
+            if tok not in STDIN_INPUTS:
+                outputs.append(i)
+            fmt = None
+            i += 1
+            continue
+        takes_value = name not in FLAG_OPTIONS and i + 1 < len(args)
+        if name == "f" and takes_value:
+            fmt = args[i + 1]
+        elif name == "i" and takes_value:
+            if source is None and args[i + 1] not in STDIN_INPUTS and fmt != "lavfi":
+                source = i + 1
+            fmt = None
+        i += 2 if takes_value else 1
+    if source is None or not outputs:
+        return None
+    return MapTemplate(tuple(args), source, tuple(outputs))
+
+
+def map_output(output: str, template_input: str, new_input: str) -> str:
+    """Where `output` goes when the command runs on `new_input` instead of `template_input`.
+
+    The input's stem in the output's name is swapped for the new one
+    (A001.mov -> A001_proxy.mp4 becomes B002.mov -> B002_proxy.mp4); if it
+    isn't there, the new stem is prefixed (out.mp4 -> B002_out.mp4). An
+    output next to the template's input goes next to each new input; one
+    in another directory stays there.
+    """
+    out, src, new = Path(output), Path(template_input), Path(new_input)
+    if src.stem and src.stem in out.name:
+        name = out.name.replace(src.stem, new.stem)
+    else:
+        name = f"{new.stem}_{out.name}"
+    parent = new.parent if out.parent == src.parent else out.parent
+    return str(parent / name)
+
+
+def expand_globs(patterns: list[str]) -> list[str]:
+    """Files matching any of `patterns` (** recurses), sorted, each once."""
+    found: set[str] = set()
+    for pat in patterns:
+        found.update(p for p in glob.glob(os.path.expanduser(pat), recursive=True) if os.path.isfile(p))
+    return sorted(found)
+
+
+def plan_map(template: MapTemplate, paths: list[str]) -> MapRun:
+    """One MapItem per path, with the ones not to run marked and explained.
+
+    Skipped: files that are an output of another matched file (a previous
+    run's results caught by the same glob), files whose output already
+    exists (done before), and files mapping to an output another file
+    already claimed or to themselves.
+    """
+    planned = []
+    for path in paths:
+        outputs = [map_output(template.args[i], template.input_path, path) for i in template.outputs]
+        args = list(template.args)
+        args[template.input] = path
+        for i, out in zip(template.outputs, outputs):
+            args[i] = out
+        planned.append(MapItem(path, outputs, shlex.join(args)))
+
+    produced = {os.path.abspath(o) for it in planned for o in it.outputs}
+    claimed: set[str] = set()
+    items = []
+    for it in planned:
+        outs = [os.path.abspath(o) for o in it.outputs]
+        if os.path.abspath(it.input) in outs:
+            it.skip = "output would overwrite the input"
+        elif os.path.abspath(it.input) in produced:
+            continue  # another file's output, not a source
+        elif any(o in claimed for o in outs):
+            it.skip = "another file maps to the same output"
+        elif any(os.path.exists(o) for o in outs):
+            it.skip = "output exists"
+        claimed.update(outs)
+        items.append(it)
+    return MapRun(template, items)
+
+
+def _remove_partial(item: MapItem) -> None:
+    for out in item.outputs:
+        try:
+            os.remove(out)
+        except OSError:
+            pass
+
+
+def run_map(
+    run: MapRun,
+    max_jobs: int,
+    *,
+    probes=None,
+    on_result: Callable[[MapItem], None] | None = None,
+    out: IO[str] | None = None,
+    interval: float = 0.25,
+) -> MapRun:
+    """Run every item not skipped, at most `max_jobs` at a time, until all are done.
+
+    Each file runs as a background job (see jobs.JobManager), with its own
+    progress pipe; a status line shows files done and, from those, the
+    overall percentage and ETA. `on_result(item)` is called (from the job's
+    thread) as each file finishes; a file that failed or was stopped has
+    its partial output removed, so the next /map retries it rather than
+    skipping it. ctrl-c stops every job and is re-raised.
+    """
+    out = out or sys.stdout
+    status = StatusLine(out)
+    lock = threading.Lock()
+    by_job: dict[int, MapItem] = {}
+
+    def finished(job: Job) -> None:
+        with lock:  # held while submitting, so by_job is complete
+            item = by_job[job.id]
+        if job.state != "done":
+            _remove_partial(item)
+        if job.state == "failed":
+            tail = job.result.output.strip().splitlines()[-1:] if job.result else []
+            status.write(f"failed ({job.exit_code}): {item.input}" + (f": {tail[0]}" if tail else "") + "\n")
+        if on_result is not None:
+            on_result(item)
+
+    manager = JobManager(max_jobs, probes=probes, on_finish=finished)
+    run.started = time.monotonic()
+    try:
+        with lock:
+            for item in run.to_run:
+                item.job = manager.submit(item.command)
+                by_job[item.job.id] = item
+        for item in run.to_run:
+            while not item.job.done.wait(interval):
+                status.show(run.status_line())
+    except KeyboardInterrupt:
+        for item in run.to_run:
+            if item.job is not None:
+                manager.kill(item.job)
+        for item in run.to_run:
+            if item.job is None:
+                continue
+            item.job.done.wait(10)
+            if item.job.result is None and on_result is not None:
+                on_result(item)  # dropped from the queue: never started, no on_finish
+        raise
+    finally:
+        run.finished = time.monotonic()
+        status.clear()
+    return run
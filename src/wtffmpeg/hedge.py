@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import replace
+from typing import Any, Callable, Optional
+
+from .config import AppConfig
+from .llm import StreamedGeneration
+from .resilience import CircuitBreaker
+from .telemetry import RequestStats
+
+# (label, client, cfg) for one model/endpoint a request can be sent to.
+Backend = tuple[str, Any, AppConfig]
+
+
+def backend_label(cfg: AppConfig) -> str:
+    return cfg.model if cfg.provider == "openai" else f"{cfg.model}@{cfg.base_url}"
+
+
+def hedge_config(cfg: AppConfig) -> Optional[AppConfig]:
+    """Config for the hedge backend, or None when hedging is not configured."""
+    if not (cfg.hedge_model or cfg.hedge_url):
+        return None
+    updates: dict[str, Any] = {"model": cfg.hedge_model or cfg.model}
+    if cfg.hedge_url:
+        updates.update(base_url=cfg.hedge_url, provider="compat", pool=())
+    return replace(cfg, **updates)
+
+
+def hedge_backends(cfg: AppConfig, client, hedge_client) -> list[Backend]:
+    """Primary + hedge backends to race, or [] when hedging is off."""
+    hcfg = hedge_config(cfg)
+    if hcfg is None or hedge_client is None:
+        return []
+    primary, hedge = backend_label(cfg), backend_label(hcfg)
+    if hedge == primary:
+        hedge += " (hedge)"
+    return [(primary, client, cfg), (hedge, hedge_client, hcfg)]
+
+
+class HedgedGeneration:
+    """Race a generation against delayed copies sent to other backends.
+
+    The first backend starts immediately; each further one starts once
+    `delay` seconds pass without a command (or as soon as every running
+    backend has finished without one). The first backend whose response
+    yields a command wins and the others are cancelled. Exposes the same
+    interface as StreamedGeneration, delegating to the winner, plus
+    `backend` (winning label) and `latencies` (label -> seconds from that
+    backend's start to its first command, None if it never produced one).
+    `breakers`, if given, holds each backend's circuit breaker (or None).
+    """
+
+    def __init__(
+        self,
+        messages: list[dict],
+        backends: list[Backend],
+        *,
+        delay: float,
+        on_update: Callable[["HedgedGeneration"], None] | None = None,
+        breakers: list[CircuitBreaker | None] | None = None,
+    ):
+        self.messages = list(messages)
+        self.backends = backends
+        self.delay = delay
+        self.on_update = on_update
+        self.breakers = breakers or [None] * len(backends)
+        self.gens: list[StreamedGeneration] = []
+        self.offsets: list[float] = []  # start time of each gen, relative to ours
+        self.winner: StreamedGeneration | None = None
+        self.cancelled = False
+        self._cv = threading.Condition()
+        self._decided = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._coordinate, daemon=True)
+
+    # --- StreamedGeneration interface ---------------------------------------
+
+    def _result(self) -> StreamedGeneration:
+        return self.winner or self.gens[0]
+
+    @property
+    def raw(self) -> str:
+        return self._result().raw
+
+    @property
+    def commands(self) -> list[str]:
+        return self._result().commands
+
+    @property
+    def first_command(self) -> str:
+        return self.winner.first_command if self.winner else ""
+
+    @property
+    def ttfc(self) -> float | None:
+        w = self.winner
+        if w is None or w.ttfc is None:
+            return None
+        return self.offsets[self.gens.index(w)] + w.ttfc
+
+    @property
+    def cfg(self) -> AppConfig:
+        return self._result().cfg
+
+    @property
+    def error(self) -> BaseException | None:
+        return self._result().error
+
+    @property
+    def elapsed(self) -> float | None:
+        return self._result().elapsed
+
+    @property
+    def stats(self) -> RequestStats:
+        """The winner's stats, timed from when the race started."""
+        r = self._result()
+        return r.stats.shifted(self.offsets[self.gens.index(r)])
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def backend(self) -> str | None:
+        if self.winner is None:
+            return None
+        return self.backends[self.gens.index(self.winner)][0]
+
+    @property
+    def latencies(self) -> dict[str, float | None]:
+        return {
+            self.backends[i][0]: (None if g.ttfc is None else round(g.ttfc, 3))
+            for i, g in enumerate(self.gens)
+        }
+
+    def start(self) -> "HedgedGeneration":
+        self._t0 = time.monotonic()
+        with self._cv:
+            self._launch()
+        self._thread.start()
+        return self
+
+    def wait_first(self, timeout: float | None = None) -> str:
+        self._decided.wait(timeout)
+        return self.first_command
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for g in list(self.gens):
+            g.cancel()
+        with self._cv:
+            self._cv.notify_all()
+
+    # --- coordination --------------------------------------------------------
+
+    def _launch(self) -> None:
+        i = len(self.gens)
+        _, client, cfg = self.backends[i]
+        self.offsets.append(time.monotonic() - self._t0)
+        self.gens.append(
+            StreamedGeneration(
+                self.messages, client, cfg, on_update=self._child_update, breaker=self.breakers[i]
+            ).start()
+        )
+
+    def _child_update(self, gen: StreamedGeneration) -> None:
+        with self._cv:
+            self._cv.notify_all()
+        if gen is self.winner and self.on_update and not self.cancelled:
+            self.on_update(self)
+
+    def _decide(self, gen: StreamedGeneration) -> None:
+        self.winner = gen
+        for g in self.gens:
+            if g is not gen:
+                g.cancel()
+        self._decided.set()
+
+    def _coordinate(self) -> None:
+        try:
+            with self._cv:
+                next_at = self.delay
+                while not self.cancelled:
+                    won = next((g for g in self.gens if g.first_command), None)
+                    if won is not None:
+                        self._decide(won)
+                        break
+                    running = [g for g in self.gens if not g.done]
+                    more = len(self.gens) < len(self.backends)
+                    now = time.monotonic() - self._t0
+                    if more and (now >= next_at or not running):
+                        self._launch()
+                        next_at = now + self.delay
+                        continue
+                    if not running and not more:
+                        # nobody produced a command; report the first clean answer
+                        self._decide(next((g for g in self.gens if g.error is None), self.gens[0]))
+                        break
+                    self._cv.wait(max(0.0, next_at - now) if more else 0.1)
+            if self.winner is not None and not self.cancelled:
+                if self.on_update:
+                    self.on_update(self)
+                self.winner.wait()
+        finally:
+            self._decided.set()
+            self._done.set()
+            if self.on_update and not self.cancelled:
+                self.on_update(self)
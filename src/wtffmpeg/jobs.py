@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import IO, Callable
+
+from .progress import Progress, StatusLine, expected_duration, ffmpeg_word, format_clock
+from .pump import TAIL_CHARS, ExecResult, TailBuffer, run_shell
+
+# Threads a typical ffmpeg encode keeps busy; the default job limit is the
+# number of cores divided by this.
+FFMPEG_THREADS = 4
+TICK = 1.0  # seconds between toolbar refreshes while jobs run
+
+
+def default_max_jobs() -> int:
+    return max(1, (os.cpu_count() or 1) // FFMPEG_THREADS)
+
+
+class JobOutput:
+    """Where a background job's output goes: a tail buffer, plus the terminal while attached (/fg)."""
+
+    def __init__(self):
+        self.tail = TailBuffer(TAIL_CHARS)
+        self.attached: StatusLine | None = None
+        self._lock = threading.Lock()
+
+    def write(self, s: str) -> None:
+        with self._lock:
+            self.tail.append(s)
+            if self.attached is not None:
+                self.attached.write(s)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+    def attach(self, status: StatusLine | None) -> str:
+        """Start (or with None, stop) copying output to `status`; returns the output so far."""
+        with self._lock:
+            self.attached = status
+            return self.tail.text()
+
+
+@dataclass
+class Job:
+    id: int
+    command: str
+    state: str = "queued"  # queued, running, done, failed, killed
+    progress: Progress | None = None
+    result: ExecResult | None = None
+    output: JobOutput = field(default_factory=JobOutput)
+    submitted: float = field(default_factory=time.monotonic)
+    started: float | None = None
+    finished: float | None = None
+    proc: object | None = None  # the shell's Popen while running
+    done: threading.Event = field(default_factory=threading.Event)
+    killed: bool = False
+
+    @property
+    def exit_code(self) -> int | None:
+        return self.result.exit_code if self.result is not None else None
+
+    def describe_progress(self) -> str:
+        p = self.progress
+        if self.state != "running" or p is None:
+            return ""
+        if p.fraction is not None:
+            eta = f" ETA {format_clock(p.eta)[:-3]}" if p.eta is not None else ""
+            return f"{p.fraction:.0%}{eta}"
+        return format_clock(p.out_time)[:-3]
+
+    def describe(self) -> str:
+        if self.state == "running":
+            status = "running " + (self.describe_progress() or "")
+        elif self.state == "queued":
+            status = "queued"
+        else:
+            took = f" in {self.finished - self.started:.0f}s" if self.started and self.finished else ""
+            code = f", exit {self.exit_code}" if self.exit_code is not None else ""
+            status = f"{self.state}{code}{took}"
+        return f"[{self.id}] {status.strip():<24} {self.command}"
+
+
+class JobManager:
+    """Runs shell commands in the background, at most `max_jobs` at a time, the rest queued.
+
+    Jobs run in their own session (ctrl-c in the REPL doesn't reach them)
+    with stdin closed. ffmpeg commands get a progress pipe, as in the
+    foreground. `on_finish(job)` is called from the job's thread when it
+    ends; `on_change()` whenever the toolbar should be redrawn.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = 0,
+        *,
+        probes=None,
+        on_finish: Callable[[Job], None] | None = None,
+        on_change: Callable[[], None] | None = None,
+    ):
+        self.max_jobs = max_jobs or default_max_jobs()
+        self.probes = probes
+        self.on_finish = on_finish
+        self.on_change = on_change
+        self.jobs: list[Job] = []
+        self._unreported: list[Job] = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._ticker: threading.Thread | None = None
+
+    def set_limit(self, max_jobs: int) -> None:
+        """Change how many jobs may run at once (0 = default_max_jobs()); starts queued ones if it grew."""
+        self.max_jobs = max_jobs or default_max_jobs()
+        self._dispatch()
+
+    def submit(self, command: str) -> Job:
+        with self._lock:
+            job = Job(self._next_id, command.strip())
+            self._next_id += 1
+            self.jobs.append(job)
+        self._dispatch()
+        self._changed()
+        return job
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception:
+                pass
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while there are free slots."""
+        starting = []
+        with self._lock:
+            free = self.max_jobs - sum(j.state == "running" for j in self.jobs)
+            for job in self.jobs:
+                if free <= 0:
+                    break
+                if job.state == "queued":
+                    job.state, job.started = "running", time.monotonic()
+                    starting.append(job)
+                    free -= 1
+            if starting and (self._ticker is None or not self._ticker.is_alive()):
+                self._ticker = threading.Thread(target=self._tick, daemon=True)
+                self._ticker.start()
+        for job in starting:
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _tick(self) -> None:
+        while self.running():
+            time.sleep(TICK)
+            self._changed()
+
+    def _run(self, job: Job) -> None:
+        if ffmpeg_word(job.command) is not None and os.name == "posix":
+            try:
+                job.progress = Progress(duration=expected_duration(job.command, self.probes))
+            except Exception:
+                job.progress = Progress()
+
+        def started(proc) -> None:
+            job.proc = proc
+            if job.killed:
+                _terminate(proc)
+
+        try:
+            result = run_shell(
+                job.command, progress=job.progress, out=job.output, background=True, on_start=started
+            )
+        except Exception as e:
+            result = ExecResult(1, f"Error executing command: {e}\n")
+        with self._lock:
+            job.result, job.proc, job.finished = result, None, time.monotonic()
+            job.state = "killed" if job.killed else ("done" if result.exit_code == 0 else "failed")
+            self._unreported.append(job)
+        job.done.set()
+        if self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception:
+                pass
+        self._dispatch()
+        self._changed()
+
+    def get(self, job_id: int | None = None) -> Job | None:
+        """Job `job_id`, or the newest running (else queued) one."""
+        with self._lock:
+            if job_id is not None:
+                return next((j for j in self.jobs if j.id == job_id), None)
+            for state in ("running", "queued"):
+                job = next((j for j in reversed(self.jobs) if j.state == state), None)
+                if job is not None:
+                    return job
+        return None
+
+    def kill(self, job: Job) -> bool:
+        """Stop a running job (SIGTERM to its process group) or drop a queued one."""
+        with self._lock:
+            if job.state not in ("queued", "running"):
+                return False
+            job.killed = True
+            if job.state == "queued":
+                job.state, job.finished = "killed", time.monotonic()
+                job.done.set()
+                self._unreported.append(job)
+            proc = job.proc
+        if proc is not None:
+            _terminate(proc)
+        self._changed()
+        return True
+
+    def running(self) -> list[Job]:
+        with self._lock:
+            return [j for j in self.jobs if j.state == "running"]
+
+    def queued(self) -> list[Job]:
+        with self._lock:
+            return [j for j in self.jobs if j.state == "queued"]
+
+    def take_finished(self) -> list[Job]:
+        """Jobs that ended since the last call (to report them at the prompt)."""
+        with self._lock:
+            out, self._unreported = self._unreported, []
+        return out
+
+    def summary(self) -> str:
+        """Toolbar text: running jobs with their progress, and how many wait ('' if none)."""
+        running, queued = self.running(), self.queued()
+        if not running and not queued:
+            return ""
+        parts = [f"[{j.id}] {j.describe_progress() or 'running'}" for j in running]
+        if queued:
+            parts.append(f"{len(queued)} queued")
+        return "Jobs: " + ", ".join(parts)
+
+
+def _terminate(proc) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGTERM)  # the shell and everything it started
+        else:
+            proc.terminate()
+    except (OSError, ProcessLookupError):
+        pass
+
+
+def follow(job: Job, out: IO[str] | None = None, interval: float = 0.25) -> None:
+    """Show a job's output so far, then live with its progress line until it ends (/fg).
+
+    ctrl-c stops following; the job keeps running.
+    """
+    status = StatusLine(out)
+    status.write(job.output.attach(status))
+    try:
+        while not job.done.wait(interval):
+            if job.progress is not None and job.progress.frame:
+                status.show(job.progress.status_line())
+    finally:
+        job.output.attach(None)
+        status.clear()
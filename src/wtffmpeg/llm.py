@@ -1,11 +1,36 @@
 from __future__ import annotations
 import openai
 from openai import OpenAI
-from typing import Tuple
+from typing import Callable, Tuple
 from pathlib import Path
+import re
+import shlex
 import sys
+import threading
+import time
 
-from .config import AppConfig, resolve_config
+from .config import AppConfig, resolve_config, resolve_profile
+from .cache import ResponseCache
+from .context import estimate_tokens, messages_tokens
+from .pool import EndpointPool
+from .resilience import (
+    Attempts,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    call_with_retries,
+)
+from .telemetry import RequestStats, usage_counts
+from .structured import (
+    RESPONSE_FORMAT,
+    CommandScanner,
+    is_rejection,
+    keep_commands,
+    mark_rejected,
+    parse_response,
+    structured_enabled,
+    with_instruction,
+)
 
 def verify_connection(client: OpenAI, base_url: str | None) -> None:
     """
@@ -86,71 +111,347 @@ def extract_commands(raw: str) -> list[str]:
 
     Handles fenced code blocks, inline backticks, '$ ' prompt markers,
     backslash line continuations, and (inside fences) commands wrapped
-    across lines without backslashes. Deduplicates preserving order.
+    across lines without backslashes. Deduplicates preserving order. A
+    structured (JSON) reply is parsed directly instead. Runs in one pass
+    over the text (a StreamExtractor fed the whole response).
     """
     if not raw:
         return []
-    text = raw.strip()
-    if text.lower().startswith("assistant:"):
-        text = text[len("assistant:"):].strip()
-
-    candidates: list[str] = []
-
-    def scan(chunk: str, fenced: bool) -> None:
-        # join backslash continuations first
-        joined: list[str] = []
-        pending = ""
-        for ln in chunk.splitlines():
-            ln = ln.strip()
-            if ln.endswith("\\"):
-                pending += ln[:-1].rstrip() + " "
-                continue
-            joined.append(pending + ln)
-            pending = ""
-        if pending:
-            joined.append(pending.strip())
-
-        for ln in joined:
-            ln = ln.strip().strip("`").strip()
-            if ln.startswith("$ "):
-                ln = ln[2:]
-            if ln.lower().startswith("ffmpeg"):
-                candidates.append(ln)
-            elif fenced and candidates and ln.startswith("-") and not ln.startswith("- "):
-                # option line continuing a wrapped command inside a code block
-                candidates[-1] += " " + ln
-
-    for idx, chunk in enumerate(text.split("```")):
-        if idx % 2 == 1:  # fenced block: drop a leading language tag
-            first, _, rest = chunk.strip().partition("\n")
-            if first.strip().lower() in _FENCE_LANGS:
-                chunk = rest
-        scan(chunk, fenced=(idx % 2 == 1))
-
-    seen: set[str] = set()
-    out: list[str] = []
-    for c in candidates:
-        if c not in seen:
-            seen.add(c)
-            out.append(c)
-    return out
-
-
-def generate_ffmpeg_command(messages: list[dict], client: OpenAI, cfg: AppConfig) -> Tuple[str, str]:
-    """Generate a single ffmpeg command from the LLM, and try to strip markdown/commentary."""
+    parsed = parse_response(raw)
+    if parsed is not None:
+        return parsed[0]
+    ex = StreamExtractor()
+    ex.feed(raw)
+    ex.close()
+    return ex.commands
+
+
+# Line breaks as str.splitlines() sees them, plus the fence marker, so the
+# extractor cuts lines exactly where splitting on fences, then lines, would.
+_BREAK_RE = re.compile("(```|\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029])")
+_ASSISTANT_PREFIX = "assistant:"
+# First characters of a stripped line that can still start a command.
+_COMMAND_START = frozenset("fF`$")
+
+
+class StreamExtractor:
+    """Single-pass command extractor: feed response text as it arrives.
+
+    feed() returns the commands that closed since the previous call: an
+    unfenced command closes at the end of its (joined) line, a fenced one at
+    the next non-option line or the closing fence. After close(), `commands`
+    is the extract_commands() result for the concatenated input.
+
+    Work is linear in the input however it is chunked: text without a line
+    break is only held until one arrives, and continuations and wrapped
+    option lines are collected as pieces and joined once.
+    """
+
+    def __init__(self):
+        self._held: list[str] = []  # unscanned text: the start of an incomplete line
+        self._tail = ""  # last two held characters; a fence marker can straddle chunks
+        self._started = False  # leading 'assistant:' prefix resolved
+        self._fenced = False
+        self._lang_pending = False  # next non-blank fenced line may be a lang tag
+        self._pending: list[str] = []  # backslash continuation being joined
+        self._cands: list[str] = []  # every candidate but the last
+        self._last: list[str] = []  # pieces of the last candidate (option lines extend it)
+        self._open = False  # last candidate can still take option lines
+        self._seen: set[str] = set()
+        self._ready: list[str] = []
+
+    @property
+    def commands(self) -> list[str]:
+        cands = self._cands + ["".join(self._last)] if self._last else self._cands
+        seen: set[str] = set()
+        out: list[str] = []
+        for c in cands:
+            if c not in seen:
+                seen.add(c)
+                out.append(c)
+        return out
+
+    def feed(self, chunk: str) -> list[str]:
+        window = self._tail + chunk
+        self._held.append(chunk)
+        self._tail = window[-2:]
+        if self._started and _BREAK_RE.search(window) is None:
+            return []  # still inside a line
+        self._drain(final=False)
+        out, self._ready = self._ready, []
+        return out
+
+    def close(self) -> list[str]:
+        self._drain(final=True)
+        self._end_segment()
+        self._close_candidate()
+        out, self._ready = self._ready, []
+        return out
+
+    def _drain(self, final: bool) -> None:
+        buf = "".join(self._held)
+        if not self._started:
+            head = buf.lstrip()
+            n = len(_ASSISTANT_PREFIX)
+            if not final and len(head) < n and _ASSISTANT_PREFIX.startswith(head.lower()):
+                self._held = [buf]
+                return  # can't tell yet whether the prefix is coming
+            if head[:n].lower() == _ASSISTANT_PREFIX:
+                head = head[n:]
+            buf = head
+            self._started = True
+
+        # [line, break, line, break, ..., rest]
+        pieces = _BREAK_RE.split(buf)
+        rest = pieces.pop()
+        if not final and not rest and pieces and pieces[-1] == "\r":
+            pieces.pop()  # may be the first half of a \r\n
+            rest = pieces.pop() + "\r"
+        line = self._line
+        for i in range(0, len(pieces), 2):
+            line(pieces[i])
+            if pieces[i + 1] == "```":
+                self._end_segment()
+                self._fenced = not self._fenced
+                self._lang_pending = self._fenced
+        if final and rest:
+            line(rest)
+            rest = ""
+        self._held = [rest] if rest else []
+        self._tail = rest[-2:]
+
+    def _line(self, ln: str) -> None:
+        ln = ln.strip()
+        if self._lang_pending:
+            if not ln:
+                return
+            self._lang_pending = False
+            if ln.lower() in _FENCE_LANGS:
+                return
+        if ln.endswith("\\"):
+            self._pending.append(ln[:-1].rstrip() + " ")
+            return
+        if self._pending:
+            self._pending.append(ln)
+            ln = "".join(self._pending)
+            self._pending = []
+        elif not self._fenced and ln[:1] not in _COMMAND_START:
+            return  # prose: outside a fence only a command line matters
+        self._joined(ln)
+
+    def _end_segment(self) -> None:
+        if self._pending:
+            joined = "".join(self._pending).strip()
+            self._pending = []
+            self._joined(joined)
+        if self._fenced:
+            self._close_candidate()
+
+    def _joined(self, ln: str) -> None:
+        ln = ln.strip().strip("`").strip()
+        if ln.startswith("$ "):
+            ln = ln[2:]
+        if ln[:6].lower() == "ffmpeg":
+            self._close_candidate()
+            if self._last:
+                self._cands.append("".join(self._last))
+            self._last = [ln]
+            self._open = True
+            if not self._fenced:
+                self._close_candidate()
+        elif self._fenced and self._last and ln.startswith("-") and not ln.startswith("- "):
+            # option line continuing a wrapped command inside a code block
+            self._last += (" ", ln)
+        elif self._fenced and ln:
+            self._close_candidate()
+
+    def _close_candidate(self) -> None:
+        if not self._open:
+            return
+        self._open = False
+        c = "".join(self._last)
+        self._last = [c]
+        if c not in self._seen:
+            self._seen.add(c)
+            self._ready.append(c)
+
+
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*", re.IGNORECASE)
+
+
+class JsonStreamExtractor:
+    """StreamExtractor counterpart for structured replies.
+
+    Each command closes as soon as its string in the "commands" array is
+    complete. A reply that doesn't start with '{' (the server ignored the
+    format) is handed to a StreamExtractor instead.
+    """
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._head: str | None = ""  # the reply's start, until it's clear whether it is JSON
+        self._scanner = CommandScanner()
+        self._text: StreamExtractor | None = None
+        self._cmds: list[str] = []
+        self._seen: set[str] = set()
+
+    @property
+    def commands(self) -> list[str]:
+        return self._text.commands if self._text is not None else list(self._cmds)
+
+    def _new(self, cmds: list[str]) -> list[str]:
+        fresh = [c for c in keep_commands(cmds) if c not in self._seen]
+        self._seen.update(fresh)
+        self._cmds.extend(fresh)
+        return fresh
+
+    def _json_start(self) -> bool | None:
+        """Whether the reply is JSON (possibly fenced); None while it can't be told yet."""
+        head = _JSON_FENCE_RE.sub("", self._head.lstrip(), count=1)
+        if not head or "```".startswith(head) or "json".startswith(head.lower()):
+            return None
+        return head.startswith("{")
+
+    def feed(self, chunk: str) -> list[str]:
+        if self._text is not None:
+            return self._text.feed(chunk)
+        self._parts.append(chunk)
+        if self._head is not None:
+            self._head += chunk
+            is_json = self._json_start()
+            if is_json is None:
+                return []
+            if not is_json:
+                self._text = StreamExtractor()
+                return self._text.feed(self._head)
+            chunk, self._head = self._head, None  # scan everything so far, once
+        return self._new(self._scanner.feed(chunk))
+
+    def close(self) -> list[str]:
+        buf = "".join(self._parts)
+        if self._text is None:
+            parsed = parse_response(buf)
+            if parsed is not None:
+                return self._new(parsed[0])
+            if self._cmds:  # truncated JSON: keep what completed
+                return []
+            self._text = StreamExtractor()
+            self._text.feed(buf)
+        return self._text.close()
+
+
+def command_args(cmd: str) -> list[str]:
+    """Split an extracted command into shell words (whitespace split if unbalanced quotes)."""
     try:
-        # OpenAI's gpt-5 family rejects any temperature other than the default,
-        # so only pin temperature for compat (local/self-hosted) endpoints.
-        kwargs = {} if cfg.provider == "openai" else {"temperature": 0.0}
-        resp = client.chat.completions.create(
-            model=cfg.model,
-            messages=messages,
-            **kwargs,
+        return shlex.split(cmd)
+    except ValueError:
+        return cmd.split()
+
+
+def paths_in_command(raw: str, paths: list[str]) -> bool:
+    """True if every path shows up in an argument of the response's primary command."""
+    commands = extract_commands(raw)
+    if not commands:
+        return False
+    args = command_args(commands[0])
+    return all(any(p in a for a in args) for p in paths)
+
+
+def completion_kwargs(cfg: AppConfig) -> dict:
+    """Per-request keyword arguments shared by every completion call."""
+    # OpenAI's gpt-5 family rejects any temperature other than the default,
+    # so only pin temperature for compat (local/self-hosted) endpoints.
+    return {} if cfg.provider == "openai" else {"temperature": 0.0}
+
+
+def limit_kwargs(cfg: AppConfig, *, structured: bool = False) -> dict:
+    """max_tokens/stop from the active profile's header (see profiles.GenerationLimits).
+
+    Stop strings are left out of structured requests, where one could cut
+    the JSON short.
+    """
+    limits = resolve_profile(cfg).limits
+    kw: dict = {}
+    if limits.max_tokens:
+        # OpenAI's reasoning models only take max_completion_tokens
+        key = "max_completion_tokens" if cfg.provider == "openai" else "max_tokens"
+        kw[key] = limits.max_tokens
+    # the gpt-5 family rejects stop, so it only goes to compat endpoints
+    if limits.stop and not structured and cfg.provider != "openai":
+        kw["stop"] = list(limits.stop)
+    return kw
+
+
+def create_completion(client: OpenAI, cfg: AppConfig, messages: list[dict], **kwargs):
+    """client.chat.completions.create() for cfg's model, as structured output when enabled.
+
+    The active profile's generation limits are applied (limit_kwargs).
+    If the server rejects the schema the request is repeated without it,
+    and structured mode stays off for this endpoint and model from then on
+    (replies are parsed as free text). If the plain request fails too, the
+    schema wasn't the problem and its error is raised.
+    """
+    if structured_enabled(cfg):
+        try:
+            return client.chat.completions.create(
+                model=cfg.model,
+                messages=with_instruction(messages),
+                response_format=RESPONSE_FORMAT,
+                **limit_kwargs(cfg, structured=True),
+                **kwargs,
+            )
+        except Exception as e:
+            if not is_rejection(e):
+                raise
+        resp = client.chat.completions.create(model=cfg.model, messages=messages, **limit_kwargs(cfg), **kwargs)
+        mark_rejected(cfg)
+        return resp
+    return client.chat.completions.create(model=cfg.model, messages=messages, **limit_kwargs(cfg), **kwargs)
+
+
+def request_completion(
+    messages: list[dict],
+    client: OpenAI,
+    cfg: AppConfig,
+    *,
+    breaker: CircuitBreaker | None = None,
+    stats: RequestStats | None = None,
+) -> str:
+    """One blocking completion; returns the stripped response text. Raises on failure.
+
+    Transient failures are retried per cfg.retries/timeout/deadline (see
+    resilience.call_with_retries). `stats`, if given, is filled in with the
+    request's wall time and token usage.
+    """
+    t0 = time.monotonic()
+    resp = call_with_retries(
+        lambda kw: create_completion(client, cfg, messages, **completion_kwargs(cfg), **kw),
+        cfg,
+        breaker=breaker,
+    )
+    text = (resp.choices[0].message.content or "").strip()
+    if stats is not None:
+        stats.wall = time.monotonic() - t0
+        stats.prompt_tokens, stats.completion_tokens = usage_counts(getattr(resp, "usage", None))
+        if stats.completion_tokens is None:
+            stats.prompt_tokens = messages_tokens(messages)
+            stats.completion_tokens = estimate_tokens(text)
+            stats.estimated = True
+    return text
+
+
+def report_generation_error(e: BaseException, cfg: AppConfig) -> None:
+    """Print a user-facing explanation of a failed completion to stderr."""
+    if isinstance(e, CircuitOpenError):
+        print(f"Not sending the request: {e}", file=sys.stderr)
+    elif isinstance(e, (DeadlineExceeded, openai.APITimeoutError)):
+        print(
+            f"The request timed out (timeout={cfg.timeout:g}s per attempt, deadline={cfg.deadline:g}s overall).\n"
+            f"  Raise them with /config set timeout=... deadline=..., or try a smaller/faster model.\n"
+            f"  Detail: {type(e).__name__}: {e}",
+            file=sys.stderr,
         )
-        raw = (resp.choices[0].message.content or "").strip()
-        commands = extract_commands(raw)
-        return raw, (commands[0] if commands else "")
-    except openai.NotFoundError as e:
+    elif isinstance(e, openai.NotFoundError):
         print(
             f"Model or endpoint not found (404) for model '{cfg.model}'.\n"
             f"  - The model may not exist on this server: run /models (REPL) or wtff --list-models to see what's available.\n"
@@ -158,37 +459,251 @@ def generate_ffmpeg_command(messages: list[dict], client: OpenAI, cfg: AppConfig
             f"  Detail: {e}",
             file=sys.stderr,
         )
-        return "", ""
-    except openai.AuthenticationError as e:
+    elif isinstance(e, openai.AuthenticationError):
         who = (
             "--api-key / WTFFMPEG_OPENAI_API_KEY"
             if cfg.provider == "openai"
             else "--bearer-token / WTFFMPEG_BEARER_TOKEN"
         )
         print(f"Authentication failed. Check {who}.\n  Detail: {e}", file=sys.stderr)
-        return "", ""
-    except openai.APIConnectionError as e:
+    elif isinstance(e, openai.APIConnectionError):
         target = cfg.base_url or "https://api.openai.com/v1"
         print(
             f"Could not connect to {target}. Is the server running? Try /ping, or check --url / WTFFMPEG_LLM_API_URL.\n"
             f"  Detail: {e}",
             file=sys.stderr,
         )
-        return "", ""
-    except Exception as e:
+    else:
         print(f"Error during model inference: {type(e).__name__}: {e}", file=sys.stderr)
+
+
+def generate_ffmpeg_command(
+    messages: list[dict],
+    client: OpenAI,
+    cfg: AppConfig,
+    *,
+    cache: ResponseCache | None = None,
+    breaker: CircuitBreaker | None = None,
+) -> Tuple[str, str]:
+    """Generate a single ffmpeg command from the LLM, and try to strip markdown/commentary.
+
+    With a `cache`, an identical earlier request (or the same request about
+    different files) is answered from disk, and responses that yielded a
+    command are stored for next time.
+    """
+    raw = cache.lookup(cfg, messages, verify=paths_in_command) if cache is not None else None
+    if raw is not None:
+        commands = extract_commands(raw)
+        return raw, (commands[0] if commands else "")
+    try:
+        raw = request_completion(messages, client, cfg, breaker=breaker)
+    except Exception as e:
+        report_generation_error(e, cfg)
         return "", ""
+    commands = extract_commands(raw)
+    if cache is not None and commands:
+        cache.store(cfg, messages, raw, model=cfg.model)
+    return raw, (commands[0] if commands else "")
+
 
+def cache_generation(cache: ResponseCache, gen) -> None:
+    """Store a finished generation's response under the backend that produced it.
 
-def build_client(cfg: AppConfig) -> OpenAI:
+    That is `gen.cfg`, not the session's: a hedge that won the race may be
+    another model or endpoint, and its answer mustn't come back later as
+    the primary's.
+    """
+    cache.store(gen.cfg, gen.messages, gen.raw, model=gen.cfg.model)
+
+
+class StreamedGeneration:
+    """A streaming completion consumed on a background thread.
+
+    The first extracted command is available (wait_first()) as soon as it
+    closes in the stream; the rest of the response keeps accumulating in
+    `raw`/`commands` until done. `on_update(gen)` is called from the worker
+    thread after every chunk. cancel() closes the HTTP response, so the REPL
+    uses this for every request to keep ctrl-c responsive. `stats` holds the
+    request's timing and token usage once done. With a single_command
+    profile the stream is closed as soon as the first command is complete
+    (`stopped_early`; plain-text replies only), so the server stops
+    decoding the rest.
+    """
+
+    def __init__(
+        self,
+        messages: list[dict],
+        client: OpenAI,
+        cfg: AppConfig,
+        *,
+        on_update: Callable[["StreamedGeneration"], None] | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.messages = list(messages)
+        self.client = client
+        self.cfg = cfg
+        self.on_update = on_update
+        self.breaker = breaker
+        self.attempts = 0  # retries made before the response started
+        self.first_command = ""
+        self.ttfc: float | None = None  # seconds until the first command closed
+        self.elapsed: float | None = None
+        self.stats = RequestStats()
+        self.error: BaseException | None = None
+        self.cancelled = False
+        self.stopped_early = False
+        self._single = resolve_profile(cfg).limits.single_command
+        self._parts: list[str] = []
+        self._extractor = JsonStreamExtractor() if structured_enabled(cfg) else StreamExtractor()
+        self._stream = None
+        self._first = threading.Event()
+        self._done = threading.Event()
+        self._cancel = threading.Event()  # interrupts a backoff sleep
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def raw(self) -> str:
+        return "".join(self._parts).strip()
+
+    @property
+    def commands(self) -> list[str]:
+        return self._extractor.commands
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def start(self) -> "StreamedGeneration":
+        self._t0 = time.monotonic()
+        self._thread.start()
+        return self
+
+    def wait_first(self, timeout: float | None = None) -> str:
+        """Block until the first command closes or the stream ends."""
+        self._first.wait(timeout)
+        return self.first_command
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def cancel(self) -> None:
+        """Stop reading and close the HTTP response so the server stops generating."""
+        self.cancelled = True
+        self._cancel.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+    def _command_closed(self, cmd: str) -> None:
+        if not self.first_command:
+            self.first_command = cmd
+            self.ttfc = time.monotonic() - self._t0
+            self._first.set()
+
+    def _attempt(self, att: Attempts) -> None:
+        self._stream = create_completion(
+            self.client,
+            self.cfg,
+            self.messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **completion_kwargs(self.cfg),
+            **att.request_kwargs(),
+        )
+        if isinstance(self._extractor, JsonStreamExtractor) and not structured_enabled(self.cfg):
+            self._extractor = StreamExtractor()  # schema rejected; plain text follows
+        if self.cancelled:  # cancelled while the request was being sent
+            self._stream.close()
+            return
+        for chunk in self._stream:
+            if self.cancelled:
+                break
+            if att.expired():
+                self._stream.close()
+                raise DeadlineExceeded(f"response still incomplete after {self.cfg.deadline:g}s")
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:  # the final chunk, with include_usage
+                self.stats.prompt_tokens, self.stats.completion_tokens = usage_counts(usage)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content or ""
+            if not text:
+                continue
+            if self.stats.ttft is None:
+                self.stats.ttft = time.monotonic() - self._t0
+            self._parts.append(text)
+            for cmd in self._extractor.feed(text):
+                self._command_closed(cmd)
+            if self.on_update and not self.cancelled:
+                self.on_update(self)
+            # a structured reply has to finish for its JSON to parse
+            if self._single and self.first_command and isinstance(self._extractor, StreamExtractor):
+                self.stopped_early = True
+                self._stream.close()
+                break
+        for cmd in self._extractor.close():
+            self._command_closed(cmd)
+
+    def _run(self) -> None:
+        att = Attempts(self.cfg)
+        try:
+            while True:
+                if self.breaker is not None:
+                    self.breaker.check()
+                try:
+                    self._attempt(att)
+                except Exception as e:
+                    if self.cancelled:
+                        return
+                    if self.breaker is not None:
+                        self.breaker.record_failure(e)
+                    # once text has arrived a retry would duplicate it
+                    delay = None if self._parts else att.next_delay(e)
+                    if delay is None:
+                        raise
+                    self.attempts += 1
+                    if self._cancel.wait(delay):
+                        return
+                    continue
+                if self.breaker is not None and not self.cancelled:
+                    self.breaker.record_success()
+                return
+        except Exception as e:
+            if not self.cancelled:
+                self.error = e
+        finally:
+            self.elapsed = self.stats.wall = time.monotonic() - self._t0
+            if self.stats.completion_tokens is None and self._parts:
+                self.stats.prompt_tokens = messages_tokens(self.messages)
+                self.stats.completion_tokens = estimate_tokens(self.raw)
+                self.stats.estimated = True
+            self._first.set()
+            self._done.set()
+            if self.on_update and not self.cancelled:
+                self.on_update(self)
+
+
+def build_client(cfg: AppConfig) -> OpenAI | EndpointPool:
+    if cfg.provider == "openai" and not cfg.openai_api_key:
+        raise RuntimeError(
+            "Provider is 'openai' but no API key is set. "
+            "Pass --api-key, set WTFFMPEG_OPENAI_API_KEY, or switch providers "
+            "with --provider compat / --url."
+        )
+    # retries are ours (resilience.py), so the SDK's own are turned off
+    timeout = cfg.timeout or None
     if cfg.provider == "openai":
-        if not cfg.openai_api_key:
-            raise RuntimeError(
-                "Provider is 'openai' but no API key is set. "
-                "Pass --api-key, set WTFFMPEG_OPENAI_API_KEY, or switch providers "
-                "with --provider compat / --url."
-            )
-        return OpenAI(api_key=cfg.openai_api_key)
+        return OpenAI(api_key=cfg.openai_api_key, timeout=timeout, max_retries=0)
     
     api_key = cfg.bearer_token or "ollama"
-    return OpenAI(base_url=cfg.base_url, api_key=api_key)
\ No newline at end of file
+    if cfg.pool:
+        return EndpointPool(
+            list(cfg.pool),
+            lambda url: OpenAI(base_url=url, api_key=api_key, timeout=timeout, max_retries=0),
+            check=verify_connection,
+            interval=cfg.pool_check_interval,
+        )
+    return OpenAI(base_url=cfg.base_url, api_key=api_key, timeout=timeout, max_retries=0)
\ No newline at end of file
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+
+import openai
+
+DEFAULT_CHECK_INTERVAL = 30  # seconds between health checks; 0 = only on demand
+# Weight of the newest sample in the latency moving average.
+EWMA_ALPHA = 0.3
+
+
+@dataclass
+class Node:
+    url: str
+    client: Any
+    healthy: bool = True
+    outstanding: int = 0
+    ewma: Optional[float] = None  # seconds to first output
+    requests: int = 0
+    failures: int = 0
+    last_error: str = ""
+    checked_at: float = field(default=0.0)
+
+    def observe(self, seconds: float) -> None:
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.ewma
+
+
+def is_node_failure(e: BaseException) -> bool:
+    """Errors that say the node is down or broken, not that the request was bad."""
+    if isinstance(e, openai.APIConnectionError):
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code >= 500
+    return False
+
+
+class _TrackedStream:
+    """Wraps a streaming response so the pool sees its latency, errors and end."""
+
+    def __init__(self, pool: "EndpointPool", node: Node, stream, t0: float):
+        self._pool, self._node, self._stream, self._t0 = pool, node, stream, t0
+        self._released = False
+
+    def __iter__(self):
+        first = True
+        try:
+            for chunk in self._stream:
+                if first:
+                    self._node.observe(time.monotonic() - self._t0)
+                    first = False
+                yield chunk
+        except Exception as e:
+            self._pool._failed(self._node, e)
+            raise
+        finally:
+            self._release()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._pool._release(self._node)
+
+
+class EndpointPool:
+    """Client for a set of OpenAI-compatible nodes serving the same models.
+
+    Quacks like the parts of `OpenAI` this package uses (`chat.completions.create`
+    and `models.list`). Each request goes to the healthy node with the fewest
+    requests in flight, ties broken by the lowest moving-average latency.
+    A node that fails at the connection level (or answers 5xx) is ejected
+    until a health check (`check(client, url)`, run every `interval` seconds
+    on a background thread) succeeds again. If every node is down, all of
+    them are tried in turn rather than failing outright.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        make_client: Callable[[str], Any],
+        *,
+        check: Callable[[Any, str], None],
+        interval: int = DEFAULT_CHECK_INTERVAL,
+    ):
+        if not urls:
+            raise ValueError("EndpointPool needs at least one URL.")
+        self.nodes = [Node(url=u, client=make_client(u)) for u in urls]
+        self.base_url = urls[0]
+        self._check = check
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.models = SimpleNamespace(list=self._list_models)
+
+    # --- routing -------------------------------------------------------------
+
+    def _pick(self, exclude: set[int]) -> Node | None:
+        with self._lock:
+            cands = [n for n in self.nodes if id(n) not in exclude]
+            up = [n for n in cands if n.healthy] or cands
+            if not up:
+                return None
+            node = min(up, key=lambda n: (n.outstanding, n.ewma or 0.0))
+            node.outstanding += 1
+            node.requests += 1
+            return node
+
+    def _release(self, node: Node) -> None:
+        with self._lock:
+            node.outstanding -= 1
+
+    def _failed(self, node: Node, e: BaseException) -> None:
+        if not is_node_failure(e):
+            return
+        with self._lock:
+            node.failures += 1
+            node.healthy = False
+            node.last_error = f"{type(e).__name__}: {e}"
+
+    def _create(self, **kwargs):
+        """Route one completion; connection-level failures move on to the next node."""
+        self._ensure_checker()
+        tried: set[int] = set()
+        last: BaseException | None = None
+        while True:
+            node = self._pick(tried)
+            if node is None:
+                raise last  # every node failed; there is at least one
+            tried.add(id(node))
+            t0 = time.monotonic()
+            try:
+                resp = node.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self._release(node)
+                self._failed(node, e)
+                if not is_node_failure(e):
+                    raise
+                last = e
+                continue
+            if kwargs.get("stream"):
+                return _TrackedStream(self, node, resp, t0)
+            node.observe(time.monotonic() - t0)
+            self._release(node)
+            return resp
+
+    def _list_models(self):
+        self._ensure_checker()
+        tried: set[int] = set()
+        last: BaseException | None = None
+        while True:
+            node = self._pick(tried)
+            if node is None:
+                raise last
+            tried.add(id(node))
+            try:
+                return node.client.models.list()
+            except Exception as e:
+                self._failed(node, e)
+                if not is_node_failure(e):
+                    raise
+                last = e
+            finally:
+                self._release(node)
+
+    # --- health --------------------------------------------------------------
+
+    def check_all(self) -> list[Node]:
+        """Health-check every node now (in parallel); returns the nodes."""
+        threads = [threading.Thread(target=self._check_node, args=(n,), daemon=True) for n in self.nodes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.nodes
+
+    def _check_node(self, node: Node) -> None:
+        try:
+            self._check(node.client, node.url)
+        except Exception as e:
+            cause = e.__cause__ or e  # verify_connection wraps the real error
+            ok, err = False, f"{type(cause).__name__}: {cause}"
+        else:
+            ok, err = True, ""
+        with self._lock:
+            node.healthy, node.last_error, node.checked_at = ok, err, time.time()
+
+    def _ensure_checker(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._check_loop, daemon=True)
+        self._thread.start()
+
+    def _check_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check_all()
+
+    def healthy_count(self) -> int:
+        return sum(1 for n in self.nodes if n.healthy)
+
+    def close(self) -> None:
+        self._stop.set()
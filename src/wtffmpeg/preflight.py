@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from .capabilities import SHELL_OPS, option_name
+from .llm import command_args
+
+DRY_RUN_FRAMES = 5  # frames per output stream
+DRY_RUN_TIMEOUT = 5.0  # seconds; a dry run that takes longer proves nothing either way
+KEEP_RESULTS = 32  # dry runs remembered per session (newest)
+
+# Options that take no value. Anything else starting with '-' is assumed to
+# take the next word, which is how outputs are told apart from values.
+FLAG_OPTIONS = frozenset(
+    {
+        "y", "n", "an", "vn", "sn", "dn", "re", "hide_banner", "nostdin", "stdin",
+        "stats", "nostats", "shortest", "copyts", "start_at_zero", "accurate_seek",
+        "noaccurate_seek", "autorotate", "noautorotate", "autoscale", "noautoscale",
+        "xerror", "ignore_unknown", "copy_unknown", "benchmark", "benchmark_all",
+        "dump", "hex", "report", "vstats", "psnr", "debug_ts", "bitexact",
+        "copyinkf", "sameq", "same_quant", "deinterlace", "intra", "qphist",
+        "stream_group", "print_graphs",
+    }
+)
+# Options that write files of their own (two-pass logs, stats, attachments);
+# left out of a dry run along with their values.
+WRITE_OPTIONS = frozenset({"pass", "passlogfile", "vstats_file", "progress", "dump_attachment", "report", "vstats"})
+# Inputs a dry run can't read: whatever is piped in when the real command runs.
+STDIN_INPUTS = frozenset({"-", "pipe:", "pipe:0", "/dev/stdin"})
+
+
+@dataclass(frozen=True)
+class DryRun:
+    """Outcome of a dry run: 'pass', 'fail' or 'timeout' (inconclusive)."""
+
+    status: str
+    seconds: float
+    error: str = ""  # ffmpeg's last error lines on failure
+
+    @property
+    def failed(self) -> bool:
+        return self.status == "fail"
+
+    def describe(self) -> str:
+        if self.status == "pass":
+            return f"passed in {self.seconds:.2f}s"
+        if self.status == "timeout":
+            return f"inconclusive (still running after {self.seconds:.0f}s)"
+        first = self.error.splitlines()[-1] if self.error else "no error output"
+        return f"failed in {self.seconds:.2f}s: {first}"
+
+    def to_record(self) -> dict:
+        rec = {"status": self.status, "seconds": round(self.seconds, 3)}
+        if self.error:
+            rec["error"] = self.error
+        return rec
+
+
+def ends_command(tok: str) -> bool:
+    # pipes, lists and redirections ('>', '2>', '<')
+    return tok in SHELL_OPS or tok.lstrip("0123456789").startswith((">", "<"))
+
+
+def dry_run_args(cmd: str, frames: int = DRY_RUN_FRAMES) -> list[str] | None:
+    """`cmd` rewritten to encode a few frames of each output to the null muxer.
+
+    Every output file becomes `-frames <n> -f null -`, so inputs, stream
+    maps, filtergraphs and encoder settings are all exercised but nothing is
+    written. None if `cmd` isn't a plain ffmpeg command this can be done for
+    (a shell loop, a pipeline into ffmpeg, no output found).
+    """
+    args = command_args(cmd)
+    if not args or Path(args[0]).name != "ffmpeg":
+        return None
+    out = [args[0], "-hide_banner", "-nostdin", "-v", "error"]
+    outputs = 0
+    i = 1
+    while i < len(args):
+        tok = args[i]
+        if ends_command(tok):
+            break
+        name = option_name(tok) if tok.startswith("-") else None
+        if name is None:  # not an option, not a value: an output
+            out += ["-frames", str(frames), "-f", "null", "-"]
+            outputs += 1
+            i += 1
+            continue
+        takes_value = name not in FLAG_OPTIONS and i + 1 < len(args)
+        if name == "i" and takes_value and args[i + 1] in STDIN_INPUTS:
+            return None
+        if name not in WRITE_OPTIONS:
+            out += args[i : i + 2] if takes_value else [tok]
+        i += 2 if takes_value else 1
+    if not outputs:
+        return None
+    return [os.path.expanduser(a) if a.startswith("~") else a for a in out]
+
+
+def reads_only_files(cmd: str) -> bool:
+    """Whether every input of `cmd` is an existing regular file.
+
+    Only such a command is dry-run before the user chooses to run it:
+    opening a capture device (avfoundation, v4l2, x11grab, dshow), a
+    network stream or a generated source has effects of its own, or takes
+    as long as it likes.
+    """
+    args = command_args(cmd)
+    inputs = []
+    i = 1
+    while i < len(args):
+        tok = args[i]
+        if ends_command(tok):
+            break
+        name = option_name(tok) if tok.startswith("-") else None
+        takes_value = name is not None and name not in FLAG_OPTIONS and i + 1 < len(args)
+        if name == "i" and takes_value:
+            inputs.append(args[i + 1])
+        i += 2 if takes_value else 1
+    return bool(inputs) and all(os.path.isfile(os.path.expanduser(p)) for p in inputs)
+
+
+def run_ffmpeg(args: list[str], timeout: float) -> tuple[int, str]:
+    """Run an ffmpeg command line with no stdin and stdout discarded; (exit code, stderr)."""
+    proc = subprocess.run(
+        args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        timeout=timeout,
+    )
+    return proc.returncode, proc.stderr
+
+
+def dry_run(
+    cmd: str,
+    *,
+    timeout: float = DRY_RUN_TIMEOUT,
+    run: Callable[[list[str], float], tuple[int, str]] = run_ffmpeg,
+) -> DryRun | None:
+    """Dry-run `cmd` (see dry_run_args); None if it can't be dry-run."""
+    args = dry_run_args(cmd)
+    if args is None:
+        return None
+    t0 = time.monotonic()
+    try:
+        rc, err = run(args, timeout)
+    except subprocess.TimeoutExpired:
+        return DryRun("timeout", time.monotonic() - t0)
+    except OSError as e:  # no ffmpeg
+        return DryRun("fail", time.monotonic() - t0, str(e))
+    elapsed = time.monotonic() - t0
+    if rc == 0:
+        return DryRun("pass", elapsed)
+    lines = [ln for ln in err.strip().splitlines() if ln.strip()]
+    return DryRun("fail", elapsed, "\n".join(lines[-5:]) or f"ffmpeg exited {rc}")
+
+
+class Preflight:
+    """Dry runs on background threads, one per command, results kept by command.
+
+    start() as soon as a command is known (it is prefilled) and only reads
+    files (see reads_only_files), so the result is usually in by the time
+    it is run; get() starts it if need be and waits for it.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DRY_RUN_TIMEOUT,
+        *,
+        run: Callable[[list[str], float], tuple[int, str]] = run_ffmpeg,
+    ):
+        self.timeout = timeout
+        self.run = run
+        self.on_done: Callable[[str], None] | None = None  # called from the worker thread
+        self._results: dict[str, DryRun | None] = {}
+        self._done: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def start(self, cmd: str) -> None:
+        cmd = cmd.strip()
+        with self._lock:
+            if cmd in self._done:
+                return
+            if len(self._done) >= KEEP_RESULTS:
+                oldest = next((c for c, ev in self._done.items() if ev.is_set()), None)
+                if oldest is not None:
+                    self._done.pop(oldest)
+                    self._results.pop(oldest, None)
+            self._done[cmd] = threading.Event()
+        threading.Thread(target=self._run, args=(cmd,), daemon=True).start()
+
+    def _run(self, cmd: str) -> None:
+        try:
+            result = dry_run(cmd, timeout=self.timeout, run=self.run)
+        except Exception:
+            result = None
+        with self._lock:
+            self._results[cmd] = result
+            done = self._done.get(cmd)
+        if done is not None:
+            done.set()
+        if self.on_done is not None:
+            self.on_done(cmd)
+
+    def peek(self, cmd: str) -> tuple[bool, DryRun | None]:
+        """(finished, result) without waiting; (False, None) if never started."""
+        cmd = cmd.strip()
+        with self._lock:
+            done = self._done.get(cmd)
+            return (done is not None and done.is_set()), self._results.get(cmd)
+
+    def get(self, cmd: str) -> DryRun | None:
+        """The dry run of `cmd`, started if need be and waited for."""
+        self.start(cmd)
+        with self._lock:
+            done = self._done.get(cmd.strip())
+        if done is not None:
+            done.wait(self.timeout + 5)
+        return self.peek(cmd)[1]
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from .cache import MEDIA_INFO_HEADER, find_paths
+
+DEFAULT_PROBE_DIR = Path.home() / ".wtffmpeg" / "probes"
+PROBE_TIMEOUT = 10.0  # seconds per ffprobe run
+MAX_FILES = 8  # files probed per prompt
+# Stored results kept on disk; the least recently used go first past this.
+MAX_ENTRIES = 2000
+
+# Only what the summary uses, so stored results stay small.
+SHOW_ENTRIES = (
+    "format=format_name,duration,bit_rate"
+    ":stream=index,codec_type,codec_name,profile,width,height,pix_fmt,"
+    "avg_frame_rate,r_frame_rate,sample_rate,channels,channel_layout,bit_rate"
+    ":stream_tags=language:stream_disposition=attached_pic"
+)
+
+
+def run_ffprobe(ffprobe: str, path: str) -> dict:
+    """ffprobe's JSON for `path` (the SHOW_ENTRIES fields), or {"error": ...} if it can't read it."""
+    proc = subprocess.run(
+        [ffprobe, "-v", "error", "-of", "json", "-show_entries", SHOW_ENTRIES, path],
+        capture_output=True,
+        text=True,
+        errors="replace",
+        timeout=PROBE_TIMEOUT,
+    )
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["ffprobe failed"])[-1]}
+    return json.loads(proc.stdout or "{}")
+
+
+def file_key(path: str) -> str:
+    """Content address for a probe: resolved path, size and mtime."""
+    real = os.path.realpath(path)
+    st = os.stat(real)
+    return hashlib.sha256(f"{real}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+
+class ProbeCache:
+    """ffprobe results, memoized in memory and on disk.
+
+    One JSON file per (path, size, mtime) under `root/<2 hex>/<key>.json`, so
+    a file is probed once until it changes, across sessions. Failed probes
+    (not a media file) are stored too. Filesystem errors degrade to probing
+    again.
+    """
+
+    def __init__(
+        self,
+        root: Path = DEFAULT_PROBE_DIR,
+        ffprobe: str | None = None,
+        *,
+        run: Callable[[str, str], dict] = run_ffprobe,
+    ):
+        self.root = Path(root)
+        self.ffprobe = ffprobe or shutil.which("ffprobe")
+        self.run = run
+        self._memo: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load(self, key: str) -> dict | None:
+        p = self._path(key)
+        try:
+            info = json.loads(p.read_text(encoding="utf-8"))
+            os.utime(p)  # mark as recently used
+        except (OSError, ValueError):
+            return None
+        return info if isinstance(info, dict) else None
+
+    def _store(self, key: str, info: dict) -> None:
+        p = self._path(key)
+        try:
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(".tmp")
+            tmp.write_text(json.dumps(info), encoding="utf-8")
+            os.replace(tmp, p)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        try:
+            files = list(self.root.glob("*/*.json"))
+            if len(files) <= MAX_ENTRIES:
+                return
+            files.sort(key=lambda f: f.stat().st_mtime)
+            for f in files[: len(files) - MAX_ENTRIES]:
+                f.unlink()
+        except OSError:
+            pass
+
+    def get(self, path: str) -> dict | None:
+        """ffprobe's JSON for `path` (or {"error": ...}); None if it can't be probed."""
+        try:
+            key = file_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        info = self._load(key)
+        if info is None:
+            if not self.ffprobe:
+                return None
+            try:
+                info = self.run(self.ffprobe, path)
+            except (OSError, ValueError, subprocess.SubprocessError) as e:
+                return {"error": str(e)}  # not stored: may work next time
+            self._store(key, info)
+        with self._lock:
+            self._memo[key] = info
+        return info
+
+    def probe_all(self, paths: list[str]) -> dict[str, dict]:
+        """get() for each path, in parallel; paths that can't be probed are left out."""
+        if not paths:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(len(paths), MAX_FILES)) as pool:
+            results = dict(zip(paths, pool.map(self.get, paths)))
+        self._evict()
+        return {p: info for p, info in results.items() if info is not None}
+
+
+def _rate(value: str | None) -> float | None:
+    try:
+        num, _, den = (value or "").partition("/")
+        r = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return r or None
+
+
+def _duration(value) -> str | None:
+    try:
+        secs = float(value)
+    except (TypeError, ValueError):
+        return None
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:05.2f}"
+
+
+def _kbps(value) -> str | None:
+    try:
+        return f"{int(value) // 1000} kb/s"
+    except (TypeError, ValueError):
+        return None
+
+
+def describe_stream(s: dict) -> str:
+    kind = s.get("codec_type") or "data"
+    codec = s.get("codec_name") or "?"
+    if s.get("profile"):
+        codec += f" ({s['profile']})"
+    parts = [f"#{s.get('index', '?')} {kind} {codec}"]
+    if kind == "video":
+        if s.get("width") and s.get("height"):
+            parts.append(f"{s['width']}x{s['height']}")
+        if s.get("pix_fmt"):
+            parts.append(s["pix_fmt"])
+        fps = _rate(s.get("avg_frame_rate")) or _rate(s.get("r_frame_rate"))
+        if (s.get("disposition") or {}).get("attached_pic"):
+            parts.append("cover art")
+        elif fps:
+            parts.append(f"{fps:.2f}".rstrip("0").rstrip(".") + " fps")
+    elif kind == "audio":
+        if s.get("sample_rate"):
+            parts.append(f"{s['sample_rate']} Hz")
+        layout = s.get("channel_layout") or (f"{s['channels']} ch" if s.get("channels") else None)
+        if layout:
+            parts.append(layout)
+    if kind in ("video", "audio") and _kbps(s.get("bit_rate")):
+        parts.append(_kbps(s.get("bit_rate")))
+    lang = (s.get("tags") or {}).get("language")
+    if lang and lang != "und":
+        parts.append(f"[{lang}]")
+    return " ".join(parts)
+
+
+def describe(path: str, info: dict) -> str:
+    """A few lines on `path`: container, duration and bitrate, then one per stream."""
+    fmt = info.get("format") or {}
+    head = [x for x in (fmt.get("format_name"), _duration(fmt.get("duration")), _kbps(fmt.get("bit_rate"))) if x]
+    lines = [f"{path}: " + (", ".join(head) or "unknown format")]
+    lines.extend("  " + describe_stream(s) for s in info.get("streams") or [])
+    return "\n".join(lines)
+
+
+def prompt_files(prompt: str) -> list[str]:
+    """Path-like tokens in `prompt` that name existing files (at most MAX_FILES)."""
+    out = []
+    for p in find_paths([prompt]):
+        if os.path.isfile(os.path.expanduser(p)):
+            out.append(p)
+    return out[:MAX_FILES]
+
+
+def media_summary(prompt: str, probes: ProbeCache) -> str:
+    """What ffprobe says about the files `prompt` mentions ('' if none)."""
+    files = {p: os.path.expanduser(p) for p in prompt_files(prompt)}
+    infos = probes.probe_all(list(files.values()))
+    # files ffprobe can't read (a concat list, a script) are left for the model to guess
+    blocks = [describe(p, infos[f]) for p, f in files.items() if f in infos and "error" not in infos[f]]
+    if not blocks:
+        return ""
+    return MEDIA_INFO_HEADER + "\n" + "\n".join(blocks)
+
+
+def with_media_info(prompt: str, probes: ProbeCache | None) -> str:
+    """The user message to send for `prompt`: the prompt plus the media summary, if any.
+
+    cache.bare_prompt() undoes it, for the cache key and for matching the
+    message to its transcript exchange.
+    """
+    summary = media_summary(prompt, probes) if probes is not None else ""
+    return f"{prompt}\n\n{summary}" if summary else prompt
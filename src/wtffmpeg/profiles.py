@@ -3,17 +3,111 @@ from __future__ import annotations
 from pathlib import Path
 from dataclasses import dataclass
 from typing import Optional, Literal
+import json
 import os
 
 import importlib.resources  # type: ignore
 DEFAULT_PROFILE_DIR = Path.home() / ".wtffmpeg" / "profiles"
 
+# The most stop strings the OpenAI API accepts in one request.
+MAX_STOP = 4
+
+# Header keys a profile may set; any other line ends the header.
+LIMIT_KEYS = ("max_tokens", "stop", "single_command")
+
+
+@dataclass(frozen=True)
+class GenerationLimits:
+    """When to stop generating, from a profile's `# key: value` header.
+
+    max_tokens caps the completion; stop strings end it server-side;
+    single_command stops reading (and closes the stream) as soon as the
+    first ffmpeg command is complete.
+    """
+    max_tokens: Optional[int] = None
+    stop: tuple[str, ...] = ()
+    single_command: bool = False
+
+    def describe(self) -> str:
+        parts = []
+        if self.max_tokens:
+            parts.append(f"max_tokens={self.max_tokens}")
+        if self.stop:
+            parts.append("stop=" + json.dumps(list(self.stop)))
+        if self.single_command:
+            parts.append("single_command")
+        return ", ".join(parts) or "none"
+
+
 @dataclass(frozen=True)
 class Profile():
     name: str
     source: Literal["user", "builtin", "path"]
     path: Optional[Path]
     text: str
+    limits: GenerationLimits = GenerationLimits()
+
+
+def _parse_bool(key: str, value: str) -> bool:
+    v = value.strip().lower()
+    if v in ("1", "true", "yes", "on"):
+        return True
+    if v in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Profile setting '{key}' must be true or false, got '{value}'")
+
+
+def _parse_stop(value: str) -> tuple[str, ...]:
+    # JSON for anything needing escapes ("\n```"), or a list of them; else taken literally
+    if value.startswith(("[", '"')):
+        try:
+            parsed = json.loads(value)
+        except ValueError as e:
+            raise ValueError(f"Profile setting 'stop' is not valid JSON: {value}") from e
+    else:
+        parsed = value
+    stops = [parsed] if isinstance(parsed, str) else parsed
+    if not isinstance(stops, list) or not all(isinstance(s, str) and s for s in stops):
+        raise ValueError("Profile setting 'stop' must be a string or a list of non-empty strings")
+    if len(stops) > MAX_STOP:
+        raise ValueError(f"Profile setting 'stop' allows at most {MAX_STOP} strings")
+    return tuple(stops)
+
+
+def parse_profile(text: str) -> tuple[str, GenerationLimits]:
+    """Split a profile into its prompt text and generation limits.
+
+    Leading `# max_tokens: N`, `# stop: ...` and `# single_command: true`
+    lines set the limits and are not sent. The first line that isn't one of
+    them starts the prompt, so a markdown heading or any other `#` line
+    stays in it.
+    """
+    lines = text.splitlines(keepends=True)
+    n = 0
+    settings: dict[str, str] = {}
+    while n < len(lines) and lines[n].startswith("#"):
+        key, sep, value = lines[n][1:].partition(":")
+        key = key.strip().lower()
+        if not sep or key not in LIMIT_KEYS:
+            break
+        settings[key] = value.strip()
+        n += 1
+    body = "".join(lines[n:]).lstrip("\n") if n else text
+
+    max_tokens = None
+    if settings.get("max_tokens"):
+        v = settings["max_tokens"]
+        if not v.isdigit() or int(v) == 0:
+            raise ValueError(f"Profile setting 'max_tokens' must be a positive integer, got '{v}'")
+        max_tokens = int(v)
+    stop = _parse_stop(settings["stop"]) if settings.get("stop") else ()
+    single = _parse_bool("single_command", settings["single_command"]) if settings.get("single_command") else False
+    return body, GenerationLimits(max_tokens=max_tokens, stop=stop, single_command=single)
+
+
+def _profile(name: str, source, path: Optional[Path], text: str) -> Profile:
+    body, limits = parse_profile(text)
+    return Profile(name=name, source=source, path=path, text=body, limits=limits)
 
 def _looks_like_path(spec: str) -> bool:
     if spec.startswith(("~", ".", os.sep)):
@@ -93,12 +187,12 @@ def load_profile(profile_spec: str, profile_dir: Path | None = None) -> Profile:
         # Don't resolve() aggressively (can fail on non-existent segments), but normalize.
         p = p if p.is_absolute() else (Path.cwd() / p)
         text = _read_text_file(p)
-        return Profile(name=p.name, source="path", path=p, text=text)
+        return _profile(p.name, "path", p, text)
 
     for cand in _candidate_paths_in_dir(pd, spec):
         if cand.exists():
             text = _read_text_file(cand)
-            return Profile(name=spec, source="user", path=cand, text=text)
+            return _profile(spec, "user", cand, text)
 
     builtin_candidates = [spec, f"{spec}.txt"]
     try:
@@ -111,7 +205,7 @@ def load_profile(profile_spec: str, profile_dir: Path | None = None) -> Profile:
                 if len(data) > 256 * 1024:
                     raise ValueError(f"Built-in profile too large: {fname}")
                 text = data.decode("utf-8", errors="replace")
-                return Profile(name=spec, source="builtin", path=None, text=text)
+                return _profile(spec, "builtin", None, text)
     except ModuleNotFoundError:
         pass
     except FileNotFoundError:
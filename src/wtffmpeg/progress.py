@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO
+
+from .capabilities import SHELL_OPS
+from .llm import command_args
+
+RENDER_INTERVAL = 0.25  # seconds between status line redraws
+
+# the program word of a shell command line, and where it ends
+_FIRST_WORD_RE = re.compile(r"\s*(\S+)")
+_TIME_RE = re.compile(r"^(-)?(?:(\d+):)?(?:(\d+):)?(\d+(?:\.\d*)?)$")
+
+
+def parse_time(value: str | None) -> float | None:
+    """ffmpeg time syntax in seconds: [-][HH:]MM:SS[.m...], S[.m...], or with an s/ms/us suffix."""
+    v = (value or "").strip()
+    for suffix, scale in (("ms", 1e-3), ("us", 1e-6), ("s", 1.0)):
+        if v.endswith(suffix) and v[: -len(suffix)].replace(".", "", 1).isdigit():
+            return float(v[: -len(suffix)]) * scale
+    m = _TIME_RE.match(v)
+    if not m:
+        return None
+    neg, a, b, secs = m.groups()
+    hours, mins = (a, b) if b is not None else (None, a)
+    t = int(hours or 0) * 3600 + int(mins or 0) * 60 + float(secs)
+    return -t if neg else t
+
+
+def format_clock(secs: float) -> str:
+    """Seconds as HH:MM:SS.ss, ffmpeg's own time format."""
+    secs = max(0.0, secs)
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:05.2f}"
+
+
+@dataclass
+class Progress:
+    """Where an ffmpeg run is, from its `-progress` key=value blocks."""
+
+    frame: int = 0
+    fps: float = 0.0
+    speed: float | None = None  # media seconds per wall second
+    out_time: float = 0.0  # seconds of output written
+    total_size: int | None = None  # bytes
+    bitrate: str | None = None  # as ffmpeg reports it, e.g. "1843.2kbits/s"
+    duration: float | None = None  # expected output length (from ffprobe), for the ETA
+    elapsed: float = 0.0  # wall seconds since start
+    done: bool = False  # ffmpeg reported progress=end
+
+    def update(self, key: str, value: str) -> bool:
+        """Apply one key=value line; True when it ends a block (time to redraw)."""
+        value = value.strip()
+        try:
+            if key == "frame":
+                self.frame = int(value)
+            elif key == "fps":
+                self.fps = float(value)
+            elif key == "speed":
+                self.speed = float(value.rstrip("x")) if value not in ("N/A", "") else None
+            elif key in ("out_time_us", "out_time_ms"):  # both are microseconds
+                self.out_time = max(0, int(value)) / 1e6
+            elif key == "total_size":
+                self.total_size = int(value)
+            elif key == "bitrate":
+                self.bitrate = None if value == "N/A" else value
+            elif key == "progress":
+                self.done = value == "end"
+                return True
+        except ValueError:
+            pass  # N/A before the first frame
+        return False
+
+    @property
+    def fraction(self) -> float | None:
+        if not self.duration:
+            return None
+        return min(1.0, self.out_time / self.duration)
+
+    @property
+    def eta(self) -> float | None:
+        """Wall seconds left at the current speed (None without a duration or speed)."""
+        if not self.duration or not self.speed:
+            return None
+        return max(0.0, self.duration - self.out_time) / self.speed
+
+    def status_line(self) -> str:
+        parts = [f"frame {self.frame}", f"fps {self.fps:.1f}"]
+        if self.speed is not None:
+            parts.append(f"speed {self.speed:.2f}x")
+        t = format_clock(self.out_time)
+        if self.duration:
+            t += f" / {format_clock(self.duration)} ({self.fraction:.0%})"
+        parts.append(f"time {t}")
+        if self.eta is not None and not self.done:
+            parts.append(f"ETA {format_clock(self.eta)[:-3]}")
+        return "  ".join(parts)
+
+    def summary(self) -> str:
+        avg = self.frame / self.elapsed if self.elapsed > 0 else 0.0
+        speed = f", {self.out_time / self.elapsed:.2f}x" if self.elapsed > 0 and self.out_time else ""
+        size = f", {self.total_size / 1e6:.1f} MB" if self.total_size else ""
+        return (
+            f"{self.frame} frames, {format_clock(self.out_time)} written in {self.elapsed:.1f}s "
+            f"(avg {avg:.1f} fps{speed}){size}"
+        )
+
+    def to_record(self) -> dict:
+        rec = {
+            "frames": self.frame,
+            "out_time": round(self.out_time, 3),
+            "wall": round(self.elapsed, 3),
+            "complete": self.done,
+        }
+        if self.elapsed > 0:
+            rec["avg_fps"] = round(self.frame / self.elapsed, 2)
+            rec["speed"] = round(self.out_time / self.elapsed, 3)
+        if self.total_size is not None:
+            rec["size"] = self.total_size
+        if self.bitrate:
+            rec["bitrate"] = self.bitrate
+        if self.duration:
+            rec["duration"] = round(self.duration, 3)
+        return rec
+
+
+def ffmpeg_word(command: str) -> str | None:
+    """The program word if `command` starts with ffmpeg, else None."""
+    m = _FIRST_WORD_RE.match(command)
+    if not m or Path(m.group(1)).name != "ffmpeg":
+        return None
+    return m.group(1)
+
+
+def progress_command(command: str, fd: int) -> str | None:
+    """`command` with `-progress pipe:<fd> -nostats` after the ffmpeg word.
+
+    Inserted as text, so the rest of the line (quoting, globs, pipes) reaches
+    the shell unchanged. None if `command` doesn't start with ffmpeg.
+    """
+    if ffmpeg_word(command) is None:
+        return None
+    m = _FIRST_WORD_RE.match(command)
+    return f"{command[: m.end()]} -progress pipe:{fd} -nostats{command[m.end():]}"
+
+
+def expected_duration(command: str, probes) -> float | None:
+    """Roughly how long the output of `command` will be: the longest input, after -ss/-t/-to.
+
+    `probes` is a probe.ProbeCache (or anything with get(path) -> ffprobe
+    JSON). None if no input's duration is known.
+    """
+    if probes is None:
+        return None
+    args = command_args(command)
+    inputs: list[str] = []
+    opts: dict[str, float] = {}
+    for i, tok in enumerate(args[1:-1], 1):
+        if tok in SHELL_OPS:
+            break
+        if tok == "-i":
+            inputs.append(os.path.expanduser(args[i + 1]))
+        elif tok in ("-ss", "-t", "-to"):
+            t = parse_time(args[i + 1])
+            if t is not None:
+                opts[tok[1:]] = t
+    durations = []
+    for path in inputs:
+        info = probes.get(path) if os.path.isfile(path) else None
+        d = parse_time(str(((info or {}).get("format") or {}).get("duration", "")))
+        if d:
+            durations.append(d)
+    if not durations:
+        return None
+    length = max(durations) - opts.get("ss", 0.0)
+    if "to" in opts:
+        length = min(length, opts["to"] - opts.get("ss", 0.0))
+    if "t" in opts:
+        length = min(length, opts["t"])
+    return length if length > 0 else None
+
+
+class StatusLine:
+    """One line redrawn in place below the command's output (only on a terminal).
+
+    Output written through write() scrolls above it; while it ends in a
+    partial line the status line stays hidden rather than drawing over it.
+    Redraws are rate limited to one per `interval`.
+    """
+
+    def __init__(self, out: IO[str] | None = None, interval: float = RENDER_INTERVAL):
+        self.out = out or sys.stdout
+        self.interval = interval
+        try:
+            self.live = self.out.isatty()
+        except (AttributeError, ValueError):
+            self.live = False
+        self.text = ""
+        self._shown = False
+        self._partial = False  # the last output written didn't end a line
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def _draw(self) -> None:
+        width = shutil.get_terminal_size().columns
+        self.out.write("\r\x1b[K" + self.text[: max(1, width - 1)])
+        self._shown = True
+
+    def _erase(self) -> None:
+        if self._shown:
+            self.out.write("\r\x1b[K")
+            self._shown = False
+
+    def show(self, text: str, *, force: bool = False) -> None:
+        with self._lock:
+            self.text = text
+            now = time.monotonic()
+            if not self.live or self._partial or (not force and now - self._last < self.interval):
+                return
+            self._last = now
+            self._draw()
+            self.out.flush()
+
+    def write(self, s: str) -> None:
+        with self._lock:
+            if not s:
+                return
+            self._erase()
+            self.out.write(s)
+            self._partial = not s.endswith("\n")
+            if self.live and self.text and not self._partial:
+                self._draw()
+            self.out.flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._erase()
+            self.out.flush()
+
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import codecs
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import IO, Callable, Iterator
+
+from .progress import Progress, StatusLine, progress_command
+
+CHUNK = 64 * 1024  # bytes per read
+FLUSH_INTERVAL = 0.05  # seconds between terminal writes
+TAIL_CHARS = 16 * 1024  # output kept for the transcript and error reports
+# Output waiting for a slow terminal; past this the oldest is dropped (and
+# counted) rather than letting the child block on a full pipe.
+MAX_PENDING = 1024 * 1024
+
+
+class TailBuffer:
+    """The last `limit` characters appended, in bounded memory."""
+
+    def __init__(self, limit: int = TAIL_CHARS):
+        self.limit = limit
+        self._chunks: deque[str] = deque()
+        self._size = 0
+
+    def append(self, text: str) -> None:
+        if len(text) >= self.limit:
+            self._chunks.clear()
+            text = text[-self.limit :]
+            self._size = 0
+        self._chunks.append(text)
+        self._size += len(text)
+        while self._size - len(self._chunks[0]) >= self.limit:
+            self._size -= len(self._chunks.popleft())
+
+    def text(self) -> str:
+        return "".join(self._chunks)[-self.limit :]
+
+
+class OutputPump:
+    """Drains a child's output on a thread of its own and hands it over in batches.
+
+    The reader does unbuffered chunked reads and incremental UTF-8 decoding
+    (a character split across reads is kept for the next one), so it keeps
+    up however fast the child writes. The consumer gets what has piled up at
+    most every `interval` seconds from batches(). Memory is bounded: only
+    the last TAIL_CHARS are kept, and if the consumer falls MAX_PENDING
+    behind, the oldest pending output is dropped.
+    """
+
+    def __init__(self, stream: IO[bytes], *, tail: int = TAIL_CHARS, max_pending: int = MAX_PENDING):
+        self.stream = stream
+        self.tail = TailBuffer(tail)
+        self.max_pending = max_pending
+        self.skipped = 0  # characters dropped in total
+        self._pending: deque[str] = deque()
+        self._pending_size = 0
+        self._dropped = 0  # not yet reported by batches()
+        self._eof = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+
+    def start(self) -> "OutputPump":
+        self._thread.start()
+        return self
+
+    def _read(self) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        fd = self.stream.fileno()
+        try:
+            while True:
+                data = os.read(fd, CHUNK)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    self._push(text)
+                if not data:
+                    break
+        except OSError:
+            pass
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+
+    def _push(self, text: str) -> None:
+        with self._cond:
+            self.tail.append(text)
+            self._pending.append(text)
+            self._pending_size += len(text)
+            excess = self._pending_size - self.max_pending
+            while excess > 0:
+                first = self._pending[0]
+                if len(first) <= excess:
+                    self._pending.popleft()
+                    dropped = len(first)
+                else:
+                    self._pending[0] = first[excess:]
+                    dropped = excess
+                excess -= dropped
+                self._pending_size -= dropped
+                self._dropped += dropped
+                self.skipped += dropped
+            self._cond.notify_all()
+
+    def batches(self, interval: float = FLUSH_INTERVAL) -> Iterator[str]:
+        """Output as it arrives, joined into one string per `interval`, until EOF."""
+        last = 0.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._eof)
+                delay = last + interval - time.monotonic()
+                if delay > 0:
+                    self._cond.wait_for(lambda: self._eof, timeout=delay)
+                if not self._pending:
+                    return
+                batch = "".join(self._pending)
+                dropped, self._dropped = self._dropped, 0
+                self._pending.clear()
+                self._pending_size = 0
+            last = time.monotonic()
+            if dropped:
+                yield f"\n[... {dropped} characters of output not shown ...]\n"
+            yield batch
+
+    def join(self, timeout: float | None = None) -> None:
+        self._thread.join(timeout)
+
+
+@dataclass
+class ExecResult:
+    exit_code: int
+    output: str = ""  # the last TAIL_CHARS of what the command printed
+    progress: Progress | None = None  # ffmpeg commands run with a progress pipe
+
+
+def run_shell(
+    command: str,
+    *,
+    progress: Progress | None = None,
+    out: IO[str] | None = None,
+    background: bool = False,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+) -> ExecResult:
+    """Run a shell command, copying its stdout and stderr to `out` (the terminal).
+
+    With `progress`, an ffmpeg command gets `-progress pipe:N -nostats`
+    (see progress.progress_command). Its blocks are parsed into `progress`
+    and shown on a live status line. That needs pass_fds, so POSIX only.
+    A `background` command gets no stdin and a session of its own, so the
+    terminal's ctrl-c doesn't reach it. `on_start` gets the Popen.
+    """
+    status = StatusLine(out)
+    r = w = None
+    if progress is not None:
+        r, w = os.pipe()
+        command = progress_command(command, w) or command
+    t0 = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0,
+            pass_fds=(w,) if w is not None else (),
+            stdin=subprocess.DEVNULL if background else None,
+            start_new_session=background and os.name == "posix",
+        )
+    except BaseException:
+        if r is not None:
+            os.close(r)
+        raise
+    finally:
+        if w is not None:
+            os.close(w)  # the child has its own copy; EOF once it exits
+
+    reader = None
+    if progress is not None:
+
+        def read_progress() -> None:
+            with os.fdopen(r, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    key, sep, value = line.partition("=")
+                    if sep and progress.update(key.strip(), value):
+                        progress.elapsed = time.monotonic() - t0
+                        status.show(progress.status_line(), force=progress.done)
+
+        reader = threading.Thread(target=read_progress, daemon=True)
+        reader.start()
+
+    if on_start is not None:
+        on_start(proc)
+    pump = OutputPump(proc.stdout).start()
+    try:
+        with proc:
+            for batch in pump.batches():
+                status.write(batch)
+            rc = proc.wait()
+        pump.join(timeout=5)
+        if reader is not None:
+            reader.join(timeout=5)
+    finally:
+        status.clear()
+    if progress is not None:
+        progress.elapsed = time.monotonic() - t0
+    return ExecResult(rc, pump.tail.text(), progress)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
+import os
 import sys
-import subprocess
 import shlex
 from pathlib import Path
 
@@ -19,13 +19,37 @@ from prompt_toolkit import print_formatted_text as print
 from pygments.lexers.shell import BashLexer
 from pypager.pager import Pager
 from pypager.source import StringSource
-from .runtime import RuntimeState, reconcile_runtime, client_fingerprint
+from .runtime import (
+    RuntimeState,
+    reconcile_runtime,
+    client_fingerprint,
+    build_cache,
+)
+from .hedge import HedgedGeneration, hedge_backends, hedge_config
+from .candidates import CandidateGeneration
+from .pool import EndpointPool
+from .context import fit_messages, messages_tokens
+from .compaction import compact_messages, condense_reply, summary_suffix
+from .telemetry import format_stats
+from .capabilities import check_command, load_index
+from .probe import ProbeCache, with_media_info
+from .preflight import DryRun, reads_only_files
+from .progress import Progress, expected_duration, ffmpeg_word
+from .pump import ExecResult, run_shell
+from .jobs import follow
+from .fanout import MapItem, expand_globs, map_template, plan_map, run_map
+from .segments import encode_parallel, split_problem
 
 from .history import DedupFileHistory, history_move, matches
-from .transcript import Transcript, build_pane_lines, format_exchange
+from .transcript import Exchange, Transcript, build_pane_lines, format_exchange
 from .llm import (
+    StreamedGeneration,
+    build_client,
+    cache_generation,
     extract_commands,
     generate_ffmpeg_command,
+    paths_in_command,
+    report_generation_error,
     verify_connection,
     list_models,
     print_models,
@@ -62,6 +86,22 @@ CMD_HISTFILE = Path.home() / ".wtff_history"
 # transcript pane: content rows shown below a one-row header
 PANE_BODY = 3
 
+# Seconds a prefill waits for the capability index still loading in the background.
+INDEX_WAIT = 2.0
+
+
+def report_problems(problems: list[str]) -> None:
+    if problems:
+        print(f"Check before running: the local ffmpeg has no {'; '.join(problems)}", file=sys.stderr)
+
+
+def report_dry_run(result: DryRun) -> None:
+    out = sys.stderr if result.failed else sys.stdout
+    print(f"Dry run {result.describe()}", file=out)
+    if result.failed and "\n" in result.error:
+        for ln in result.error.splitlines():
+            print(f"  {ln}", file=out)
+
 
 class _UiState:
     """Mutable REPL UI state read by key bindings and the toolbar callable."""
@@ -71,6 +111,11 @@ class _UiState:
         self.pane_visible = False
         self.pane_offset = 0  # viewport top, clamped at render time
         self.pane_follow = True  # pinned to newest content
+        self.last_tokens_in: int | None = None  # estimated prompt size of the last request
+        self.check_cmd: str | None = None  # command whose dry run the toolbar shows
+        self.exit_warned = False  # told that exiting stops the background jobs
+        self.last_command = ""  # latest command generated or run with !, for /map
+        self.job_exchanges: dict[int, Exchange | None] = {}  # background job id -> latest exchange at submit
 
     def scroll(self, delta: int) -> None:
         if delta < 0:
@@ -153,11 +198,38 @@ def _sanitize_cfg(cfg: AppConfig) -> dict:
         "openai_api_key": ("(set)" if cfg.openai_api_key else "(unset)"),
         "bearer_token": ("(set)" if cfg.bearer_token else "(unset)"),
         "context_turns": cfg.context_turns,
+        "context_tokens": cfg.context_tokens,
+        "compact": cfg.compact,
+        "compact_keep": cfg.compact_keep,
+        "context_replies": cfg.context_replies,
+        "candidates": cfg.candidates,
+        "structured": cfg.structured,
+        "validate": cfg.validate,
+        "probe": cfg.probe,
+        "preflight": cfg.preflight,
+        "background": cfg.background,
+        "max_jobs": cfg.max_jobs,
+        "parallel": cfg.parallel,
         "profile": cfg.profile_name,
         "copy": cfg.copy,
         "no_nag": cfg.no_nag,
         "history": cfg.history,
         "transcript": cfg.transcript,
+        "stream": cfg.stream,
+        "cache": cfg.cache,
+        "cache_ttl": cfg.cache_ttl,
+        "cache_max_mb": cfg.cache_max_mb,
+        "cache_templates": cfg.cache_templates,
+        "hedge_model": cfg.hedge_model,
+        "hedge_url": cfg.hedge_url,
+        "hedge_delay": cfg.hedge_delay,
+        "pool": ",".join(cfg.pool),
+        "pool_check_interval": cfg.pool_check_interval,
+        "timeout": cfg.timeout,
+        "deadline": cfg.deadline,
+        "retries": cfg.retries,
+        "breaker_threshold": cfg.breaker_threshold,
+        "breaker_cooldown": cfg.breaker_cooldown,
     }
 
 
@@ -269,7 +341,15 @@ USAGE
                 # keep profile always valid; interpret unset as default
                 load_profile(DEFAULT_PROFILE_NAME, cfg.profile_dir)  # validate
                 updates["profile_name"] = DEFAULT_PROFILE_NAME
-            elif k in ("model", "provider", "context_turns", "copy", "no_nag", "history", "transcript"):
+            elif k in (
+                "model", "provider", "context_turns", "context_tokens", "compact", "compact_keep",
+                "context_replies", "candidates", "structured", "validate", "probe",
+                "preflight", "background", "max_jobs", "parallel", "copy", "no_nag", "history",
+                "transcript",
+                "stream", "cache", "cache_ttl", "cache_max_mb", "cache_templates",
+                "hedge_delay", "pool_check_interval", "timeout", "deadline", "retries",
+                "breaker_threshold", "breaker_cooldown",
+            ):
                 print(f"Cannot unset required key: {k}", file=sys.stderr)
             else:
                 updates[k] = None
@@ -311,25 +391,23 @@ USAGE
     return cfg, client
 
 
-def execute_command(command: str) -> int:
-    """Execute a shell command, streaming output. Returns exit code."""
+def execute_command(command: str, *, probes: ProbeCache | None = None) -> ExecResult:
+    """Execute a shell command, streaming output (see pump.run_shell).
+
+    ffmpeg commands run with a live progress line (ETA from the inputs'
+    probed durations when `probes` is given).
+    """
+    progress = None
+    if ffmpeg_word(command) is not None and os.name == "posix":
+        progress = Progress(duration=expected_duration(command, probes))
     try:
-        with subprocess.Popen(
-            command,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
-        ) as proc:
-            if proc.stdout:
-                for line in proc.stdout:
-                    print(line, end="")
-            return proc.wait()
+        result = run_shell(command, progress=progress)
     except Exception as e:
         print(f"Error executing command: {e}", file=sys.stderr)
-        return 1
+        return ExecResult(1)
+    if progress is not None and (progress.frame or progress.out_time):
+        print(("Done: " if result.exit_code == 0 else "Stopped after ") + progress.summary())
+    return result
 
 
 def nag():
@@ -347,17 +425,58 @@ def single_shot(*, client, cfg: AppConfig) -> int:
         print("single_shot called without cfg.prompt_once", file=sys.stderr)
         return 2
 
+    probes = ProbeCache() if cfg.probe else None
     messages = [
         {"role": "system", "content": resolve_profile(cfg).text},
-        {"role": "user", "content": cfg.prompt_once},
+        {"role": "user", "content": with_media_info(cfg.prompt_once, probes)},
     ]
 
-    raw, cmd = generate_ffmpeg_command(messages, client, cfg)
+    cache = build_cache(cfg)
+    hcfg = None if cfg.candidates > 1 else hedge_config(cfg)
+    cached = None
+    if (cfg.stream or hcfg is not None or cfg.candidates > 1) and cache is not None:
+        # streaming stops early below, so only lookups happen on this path
+        cached = cache.lookup(cfg, messages, verify=paths_in_command)
+
+    if cached is not None:
+        raw = cached
+        cands = extract_commands(raw)
+        cmd = cands[0] if cands else ""
+    elif cfg.candidates > 1:
+        gen = CandidateGeneration(messages, client, cfg, n=cfg.candidates, prompt=cfg.prompt_once).start()
+        gen.wait()
+        raw, cmd = gen.raw, gen.first_command
+        if gen.error is not None:
+            report_generation_error(gen.error, cfg)
+        elif cache is not None and cmd:
+            cache.store(cfg, messages, raw, model=cfg.model)
+    elif cfg.stream or hcfg is not None:
+        # Only the first command is printed, so stop reading once it closes.
+        if hcfg is not None:
+            same = client_fingerprint(hcfg) == client_fingerprint(cfg)
+            backends = hedge_backends(cfg, client, client if same else build_client(hcfg))
+            gen = HedgedGeneration(messages, backends, delay=cfg.hedge_delay).start()
+        else:
+            gen = StreamedGeneration(messages, client, cfg).start()
+        cmd = gen.wait_first()
+        gen.cancel()
+        raw = gen.raw
+        if gen.error is not None:
+            report_generation_error(gen.error, gen.cfg)
+        elif gen.ttfc is not None:
+            print(f"First command in {gen.ttfc:.2f}s", file=sys.stderr)
+        if hcfg is not None and gen.backend not in (None, backends[0][0]):
+            print(f"Answered by the hedge: {gen.backend}", file=sys.stderr)
+    else:
+        raw, cmd = generate_ffmpeg_command(messages, client, cfg, cache=cache)
     if not cmd:
         print("Failed to generate a command.", file=sys.stderr)
         print(raw)
         return 1
 
+    index = load_index() if cfg.validate else None
+    if index is not None:
+        report_problems(check_command(cmd, index))
     print(cmd)
 
     if cfg.copy:
@@ -412,6 +531,52 @@ def repl(*, cfg: AppConfig, client=None):
         key_bindings=build_key_bindings(ui),
     )
 
+    def refresh(_cmd: str = "") -> None:
+        try:
+            session.app.invalidate()
+        except Exception:
+            pass
+
+    rt.preflight.on_done = refresh  # the toolbar's dry-run badge
+
+    rt.jobs.on_change = refresh
+
+    def report_jobs() -> None:
+        """Say which background jobs ended since the last prompt, and log their runs.
+
+        Logged here, on the REPL's thread, against the exchange that was
+        latest when each job was started, not whichever is latest now.
+        """
+        for job in rt.jobs.take_finished():
+            exchange = ui.job_exchanges.pop(job.id, None)
+            if job.result is not None:  # not a queued job that was dropped
+                transcript.log_exec(
+                    job.command,
+                    job.exit_code,
+                    persist=cfg.transcript,
+                    progress=job.progress.to_record() if job.progress else None,
+                    output=job.result.output,
+                    exchange=exchange,
+                )
+            print(job.describe(), file=sys.stderr if job.state == "failed" else sys.stdout)
+            if job.state == "failed" and job.result.output.strip():
+                for ln in job.result.output.strip().splitlines()[-3:]:
+                    print(f"    {ln}", file=sys.stderr)
+
+    def leaving() -> bool:
+        """True to exit now; with background jobs left, the first attempt only warns."""
+        active = rt.jobs.running() + rt.jobs.queued()
+        if active and not ui.exit_warned:
+            ui.exit_warned = True
+            print(
+                f"{len(active)} background job(s) still running or queued (/jobs). Exit again to stop them.",
+                file=sys.stderr,
+            )
+            return False
+        for job in active:
+            rt.jobs.kill(job)
+        return True
+
     def get_toolbar():
         try:
             width = get_app().output.get_size().columns
@@ -443,6 +608,29 @@ def repl(*, cfg: AppConfig, client=None):
 
         bind_txt = "Vi" if session.editing_mode == EditingMode.VI else "Emacs"
         copy_txt = f"Copy: {'ON' if cfg.copy else 'OFF'}"
+        last = next((e.stats for e in reversed(transcript.entries) if e.stats and e.stats.wall), None)
+        if last is not None:
+            tps = last.tokens_per_s
+            copy_txt = f"Last: {last.wall:.1f}s" + (f" {tps:.0f} tok/s" if tps else "") + f"  {copy_txt}"
+        if ui.check_cmd is not None and rt.preflight is not None:
+            finished, result = rt.preflight.peek(ui.check_cmd)
+            if not finished:
+                copy_txt = f"Dry run: ...  {copy_txt}"
+            elif result is not None:
+                badge = {"pass": "ok", "fail": "FAILED"}.get(result.status, "?")
+                copy_txt = f"Dry run: {badge}  {copy_txt}"
+        if transcript.entries and transcript.entries[-1].problems:
+            copy_txt = f"Check: {len(transcript.entries[-1].problems)} unknown  {copy_txt}"
+        jobs_txt = rt.jobs.summary()
+        if jobs_txt:
+            copy_txt = f"{jobs_txt}  {copy_txt}"
+        if isinstance(client, EndpointPool):
+            copy_txt = f"Pool: {client.healthy_count()}/{len(client.nodes)} up  {copy_txt}"
+        breaker_state = rt.breaker.state if rt.breaker is not None else "closed"
+        if breaker_state == "open":
+            copy_txt = f"LLM: down ({rt.breaker.retry_in():.0f}s)  {copy_txt}"
+        elif breaker_state != "closed":
+            copy_txt = f"LLM: {breaker_state}  {copy_txt}"
         padding = width - len(bind_txt) - len(copy_txt) - 12
         if padding < 1:
             padding = 1
@@ -451,21 +639,121 @@ def repl(*, cfg: AppConfig, client=None):
         frags.append(("bold", copy_txt))
         return frags
 
+    def get_rprompt() -> str:
+        parts = [rt.profile.name if rt.profile else cfg.profile_name, cfg.model]
+        if ui.last_tokens_in is not None:
+            parts.append(f"~{ui.last_tokens_in} tok in")
+        return " | ".join(parts) + " |"
+
     messages = [{"role": "system", "content": rt.profile.text if rt.profile else resolve_profile(cfg).text}]
 
+    def trim(msgs: list[dict], *, force_compact: bool = False) -> list[dict]:
+        """Compact (if enabled) and then trim the conversation to cfg's limits."""
+        if (cfg.compact or force_compact) and cfg.context_turns > 0:
+            msgs = compact_messages(
+                msgs,
+                transcript.entries,
+                keep_turns=cfg.compact_keep,
+                max_turns=cfg.context_turns,
+                max_tokens=cfg.context_tokens,
+                force=force_compact,
+            )
+        return trim_messages(msgs, cfg.context_turns, cfg.context_tokens)
+
+    def check_prefill(cmd: str) -> list[str]:
+        """What the local ffmpeg doesn't know in `cmd`, reported before it is prefilled."""
+        index = rt.capabilities.get(INDEX_WAIT) if rt.capabilities is not None else None
+        problems = check_command(cmd, index) if index is not None else []
+        report_problems(problems)
+        ui.check_cmd = None
+        if cfg.preflight != "off" and rt.preflight is not None and reads_only_files(cmd):
+            # dry-run in the background while the user looks the command over;
+            # anything else waits until it is run or /check'ed
+            ui.check_cmd = " ".join(cmd.splitlines()).strip()
+            rt.preflight.start(ui.check_cmd)
+        return problems
+
+    def check(cmd: str) -> DryRun | None:
+        """Dry-run `cmd` (waiting for one already started), report and record it."""
+        ui.check_cmd = cmd
+        result = rt.preflight.get(cmd)
+        if result is not None:
+            transcript.log_check(cmd, result, persist=cfg.transcript)
+        return result
+
+    def preflight_ok(cmd: str) -> bool:
+        """False if `cmd` shouldn't run: its dry run failed and preflight says refuse (or the user does)."""
+        if cfg.preflight == "off" or rt.preflight is None:
+            return True
+        try:
+            result = check(cmd)
+        except KeyboardInterrupt:
+            print("Cancelled.")
+            return False
+        if result is None or not result.failed:
+            return True
+        report_dry_run(result)
+        if cfg.preflight == "refuse":
+            print("Not running it (preflight=refuse; /check to try again after editing).", file=sys.stderr)
+            return False
+        try:
+            answer = input("Run it anyway? [y/N] ")
+        except (KeyboardInterrupt, EOFError):
+            return False
+        return answer.strip().lower() in ("y", "yes")
+
+    def run_parallel(cmd: str, jobs: int) -> bool:
+        """Encode `cmd` in up to `jobs` segments at once and log it; False if it should just run as is."""
+        print(f"Encoding in up to {jobs} segments at once (ctrl-c stops).")
+        try:
+            result = encode_parallel(cmd, jobs)
+        except KeyboardInterrupt:
+            print("\nStopped; the segments were removed.")
+            return True
+        if result.status == "skipped":
+            print(result.describe())
+            return False
+        print(result.describe(), file=sys.stdout if result.status == "done" else sys.stderr)
+        transcript.log_exec(
+            cmd,
+            0 if result.status == "done" else 1,
+            persist=cfg.transcript,
+            output=result.describe(),
+            parallel=result.to_record(),
+        )
+        return True
+
     # Generated commands the user hasn't accepted yet: appended to history at
     # the next prompt unless accepted verbatim (auto-append covers that case).
     pending_hist: list[str] = []
 
-    def record_generation(prompt_text: str, raw: str) -> str:
+    def record_generation(
+        prompt_text: str, raw: str, ex: Exchange | None = None, cands: list[str] | None = None
+    ) -> str:
         """Log the exchange, stash all command candidates into history.
 
         Returns the prefill string for the primary command ('' if none).
         Alternatives go into history immediately; the primary is deferred via
         pending_hist so it survives even if the user discards the prefill.
+        `ex` is an exchange begun while the response was generating; `cands`
+        overrides the commands extracted from `raw` (already ranked).
         """
-        cands = extract_commands(raw)
-        transcript.add_exchange(prompt_text, raw, cands, persist=cfg.transcript)
+        if cands is None:
+            cands = extract_commands(raw)
+        problems = check_prefill(cands[0]) if cands else []
+        if ex is None:
+            transcript.add_exchange(
+                prompt_text,
+                raw,
+                cands,
+                persist=cfg.transcript,
+                model=cfg.model,
+                profile=cfg.profile_name,
+                problems=problems,
+            )
+        else:
+            ex.problems = problems
+            transcript.finish_exchange(ex, raw, cands, persist=cfg.transcript)
         ui.pane_follow = True
         if not cands:
             return ""
@@ -475,19 +763,172 @@ def repl(*, cfg: AppConfig, client=None):
         pending_hist.append(primary)
         return primary
 
+    def accept(
+        prompt_text: str, raw: str, ex: Exchange | None = None, cands: list[str] | None = None
+    ) -> str:
+        """Record a complete response and add it to the conversation; returns the prefill."""
+        nonlocal messages
+        if raw:
+            prefill = record_generation(prompt_text, raw, ex, cands)
+        else:
+            prefill = ""
+            if ex is not None:
+                transcript.discard_exchange(ex)
+        if not prefill:
+            print("Failed to generate a command.", file=sys.stderr)
+            print(raw)
+            messages.pop()
+            return ""
+        messages.append({"role": "assistant", "content": condense_reply(raw, cfg.context_replies)})
+        messages = trim(messages)
+        if cfg.copy:
+            pyperclip.copy(prefill[1:])
+        return prefill
+
+    # Streamed response whose first command is already prefilled while the
+    # rest is still arriving: (generation, exchange, assistant message).
+    streaming = None
+
+    def note_result(gen, ex: Exchange) -> None:
+        """Record the request's timing/usage and, if hedged, which backend answered."""
+        ex.stats, ex.model = gen.stats, gen.cfg.model
+        if isinstance(gen, HedgedGeneration):
+            ex.backend, ex.latencies = gen.backend, gen.latencies
+
+    def finish_stream(*, wait: bool = True, cancel: bool = False) -> None:
+        """Log a streamed response once complete (or cut it short with cancel)."""
+        nonlocal streaming
+        if streaming is None:
+            return
+        gen, ex, reply = streaming
+        if cancel:
+            gen.cancel()
+        elif not wait and not gen.done:
+            return
+        else:
+            gen.wait()
+        streaming = None
+        cands = gen.commands
+        note_result(gen, ex)
+        transcript.finish_exchange(
+            ex, gen.raw, cands, persist=cfg.transcript, cancelled=gen.cancelled
+        )
+        reply["content"] = condense_reply(gen.raw, cfg.context_replies)
+        for alt in reversed([c for c in cands if c != gen.first_command]):
+            session.history.append_string("!" + alt)
+        if gen.error is not None:
+            report_generation_error(gen.error, gen.cfg)
+        elif rt.cache is not None and cands and not gen.cancelled:
+            cache_generation(rt.cache, gen)
+
+    def generate(prompt_text: str) -> str:
+        """Generate for the pending user message on a worker thread.
+
+        ctrl-c while waiting cancels the request (closing the HTTP response so
+        the server stops too), drops the pending user message and keeps any
+        partial text in the transcript. With cfg.stream the prefill is
+        returned as soon as the first command closes and the rest of the
+        response is logged later by finish_stream(). Returns the prefill ('' on
+        failure or cancel).
+        """
+        nonlocal streaming, messages
+        ex = transcript.begin_exchange(prompt_text, model=cfg.model, profile=cfg.profile_name)
+        ex.tokens_in = ui.last_tokens_in = messages_tokens(messages)
+        ui.pane_follow = True
+
+        def on_update(gen) -> None:
+            ex.raw, ex.commands = gen.raw, gen.commands
+            try:
+                session.app.invalidate()
+            except Exception:
+                pass
+
+        backends = [] if cfg.candidates > 1 else hedge_backends(cfg, client, rt.hedge_client)
+        if cfg.candidates > 1:
+            gen = CandidateGeneration(
+                messages, client, cfg, n=cfg.candidates, prompt=prompt_text, breaker=rt.breaker
+            ).start()
+        elif backends:
+            gen = HedgedGeneration(
+                messages,
+                backends,
+                delay=cfg.hedge_delay,
+                on_update=on_update,
+                breakers=[rt.breaker, rt.hedge_breaker],
+            ).start()
+        else:
+            gen = StreamedGeneration(
+                messages, client, cfg, on_update=on_update, breaker=rt.breaker
+            ).start()
+        try:
+            if cfg.stream:
+                while not gen.wait_first(0.05) and not gen.done:
+                    pass
+            else:
+                while not gen.wait(0.05):
+                    pass
+        except KeyboardInterrupt:
+            gen.cancel()
+            note_result(gen, ex)
+            if gen.raw:
+                transcript.finish_exchange(
+                    ex, gen.raw, gen.commands, persist=cfg.transcript, cancelled=True
+                )
+            else:
+                transcript.discard_exchange(ex)
+            messages.pop()
+            print("Generation cancelled.")
+            return ""
+
+        note_result(gen, ex)
+        if backends and gen.backend not in (None, backends[0][0]):
+            print(f"Answered by the hedge: {gen.backend}")
+        if cfg.stream:
+            ex.ttfc = gen.ttfc
+            if gen.ttfc is not None:
+                still = "" if gen.done else " (rest of the response still streaming; see /raw)"
+                print(f"First command in {gen.ttfc:.2f}s{still}")
+        if cfg.stream and gen.first_command and not gen.done:
+            reply = {"role": "assistant", "content": condense_reply(gen.raw, cfg.context_replies)}
+            messages.append(reply)
+            messages = trim(messages)
+            streaming = (gen, ex, reply)
+            ex.problems = check_prefill(gen.first_command)
+            if cfg.copy:
+                pyperclip.copy(gen.first_command)
+            primary = "!" + " ".join(gen.first_command.splitlines()).strip()
+            pending_hist.append(primary)
+            return primary
+
+        if gen.error is not None:
+            report_generation_error(gen.error, gen.cfg)
+        elif rt.cache is not None and gen.commands:
+            cache_generation(rt.cache, gen)
+        if isinstance(gen, CandidateGeneration):
+            ex.samples = len(gen.samples)
+            if len(gen.commands) > 1:
+                print(
+                    f"Best of {len(gen.commands)} commands from {len(gen.samples)} responses; "
+                    f"the others are in history (up arrow)."
+                )
+            return accept(prompt_text, gen.raw, ex, gen.commands)
+        return accept(prompt_text, gen.raw, ex)
+
+    def respond(prompt_text: str) -> str:
+        """Answer the pending user message from the cache or the model; returns the prefill."""
+        cache = rt.cache
+        raw = cache.lookup(cfg, messages, verify=paths_in_command) if cache is not None else None
+        if raw is None:
+            return generate(prompt_text)
+        print("(cached response; /cache clear or --no-cache to ask the model again)")
+        return accept(prompt_text, raw)
+
     # preload: run once, then drop into repl with prefilled !cmd
     prefill = ""
     if cfg.preload_prompt:
-        messages.append({"role": "user", "content": cfg.preload_prompt})
-        messages = trim_messages(messages, keep_last_turns=cfg.context_turns)
-        raw, cmd = generate_ffmpeg_command(messages, client, cfg)
-        if raw:
-            prefill = record_generation(cfg.preload_prompt, raw)
-        if cmd:
-            messages.append({"role": "assistant", "content": raw})
-            messages = trim_messages(messages, keep_last_turns=cfg.context_turns)
-            if cfg.copy:
-                pyperclip.copy(cmd)
+        messages.append({"role": "user", "content": with_media_info(cfg.preload_prompt, rt.probes)})
+        messages = trim(messages)
+        prefill = respond(cfg.preload_prompt)
 
     print("Entering interactive mode. Type 'exit'/'quit' to leave. Use !<cmd> to run shell commands.")
     if not cfg.no_nag:
@@ -495,18 +936,36 @@ def repl(*, cfg: AppConfig, client=None):
 
     while True:
         ui.history_mode = cfg.history
+        report_jobs()
+        if prefill:
+            ui.last_command = prefill.removeprefix("!")
         try:
             line = session.prompt(
                 "wtff> ",
                 default=prefill,
                 lexer=PygmentsLexer(BashLexer),
                 bottom_toolbar=get_toolbar,
-                rprompt=lambda: f"{(rt.profile.name if rt.profile else cfg.profile_name)} | {cfg.model} |",
+                rprompt=get_rprompt,
                 style=matrix_style,
             )
-        except (EOFError, KeyboardInterrupt):
+        except KeyboardInterrupt:
+            if streaming is not None:
+                # first ctrl-c stops a response still streaming in the background
+                finish_stream(cancel=True)
+                print("Stopped the streaming response.")
+                continue
+            if not leaving():
+                continue
             print("\nExiting interactive mode.")
             return
+        except EOFError:
+            if not leaving():
+                continue
+            finish_stream(cancel=True)
+            print("\nExiting interactive mode.")
+            return
+
+        finish_stream(wait=False)
 
         # Preserve generated-but-not-accepted commands in history (accepting
         # the prefill verbatim already stored it via the normal accept path).
@@ -521,6 +980,9 @@ def repl(*, cfg: AppConfig, client=None):
 
         # explicit exits
         if line.strip().lower() in ("exit", "quit", "logout", ":q", ":q!"):
+            if not leaving():
+                continue
+            finish_stream(cancel=True)
             print("\nExiting interactive mode.")
             return
 
@@ -529,6 +991,9 @@ def repl(*, cfg: AppConfig, client=None):
             cmd = line[1:].strip().lower()
 
             if cmd in ("exit", "quit", "logout", ":q", ":q!"):
+                if not leaving():
+                    continue
+                finish_stream(cancel=True)
                 print("\nExiting interactive mode.")
                 return
 
@@ -537,6 +1002,8 @@ def repl(*, cfg: AppConfig, client=None):
                 print("  /help, /h, /? - Show this help message")
                 print("  /ping - Check LLM connectivity")
                 print("  /reset - Clear conversation history (keep system prompt)")
+                print("  /compact - Fold older turns into a summary now (keeps the newest compact_keep)")
+                print("  /stats - Latency and token usage of this session's requests (p50/p95)")
                 print("  /profile - Show current profile")
                 print("  /profiles - List available profiles")
                 print("  /models - List models available from the current provider")
@@ -545,19 +1012,41 @@ def repl(*, cfg: AppConfig, client=None):
                 print("  /bindings [vi|emacs] - Switch keybindings")
                 print("  /raw [n] - Show the full model response for exchange n (default: latest)")
                 print("  /pane - Toggle the transcript pane (also ctrl-t)")
+                print("  /cache [stats|clear] - Show or clear the on-disk response cache")
+                print("  /check [command] - Dry-run a command (default: the latest generated) to the null muxer")
+                print("  /jobs - List background jobs (start one with !&<command>)")
+                print("  /fg [n] - Follow a background job's output and progress (ctrl-c stops following)")
+                print("  /kill <n|all> - Stop a background job (or drop it from the queue)")
+                print("  /map <glob> [-j N] - Run the latest command on every matching file, N at a time")
+                print("  /parallel [-j N] [command] - Encode the latest command in N segments at once, then join them")
                 print("  /q|/quit|/exit|/logout - Exit the REPL")
-                print("- Use !<command> to execute shell commands")
+                print("- Use !<command> to execute shell commands, !&<command> to run one in the background")
                 print("- History: up/down follow /config history (prompt|command|all);")
                 print("  shift+up/down = prompts only (scrolls the pane when open);")
                 print("  ctrl+up/down = commands only")
                 continue
 
             if cmd == "ping":
+                if isinstance(client, EndpointPool):
+                    for node in client.check_all():
+                        state = "up" if node.healthy else "DOWN"
+                        lat = "-" if node.ewma is None else f"{node.ewma:.2f}s"
+                        row = f"  {state:<4} {node.url}  avg {lat}  in flight {node.outstanding}"
+                        print(row + (f"  ({node.last_error})" if node.last_error else ""))
+                    print(f"LLM pool: {client.healthy_count()}/{len(client.nodes)} nodes up")
+                    if client.healthy_count():
+                        rt.breaker.record_success()
+                    print(f"Endpoint status: {rt.breaker.describe()}")
+                    continue
                 try:
                     verify_connection(client, base_url=_client_base_url(client))
                     print("LLM connectivity: OK")
+                    rt.breaker.record_success()  # reachable again: stop failing fast
                 except RuntimeError as e:
                     print(str(e), file=sys.stderr)
+                    print(f"Endpoint status: {rt.breaker.describe()}")
+                    if rt.breaker.last_error:
+                        print(f"  Last request error: {rt.breaker.last_error}")
                 continue
 
             elif cmd == "reset":
@@ -565,11 +1054,23 @@ def repl(*, cfg: AppConfig, client=None):
                 print("Conversation history cleared.")
                 continue
 
+            elif cmd == "compact":
+                before = messages_tokens(messages)
+                messages = trim(messages, force_compact=True)
+                print(f"Context: ~{before} -> ~{messages_tokens(messages)} tokens.")
+                continue
+
+            elif cmd == "stats":
+                done = [e.stats for e in transcript.entries if e.stats and e.stats.wall and not e.cancelled]
+                print(format_stats(done))
+                continue
+
             elif cmd == "profile":
                 if rt.profile is None:
                     reconcile_runtime(cfg, rt)
                 if rt.profile is not None:
                     print(f"Current profile: {rt.profile.name}")
+                    print(f"Generation limits: {rt.profile.limits.describe()}")
                     print(rt.profile.text)
                 continue
 
@@ -626,7 +1127,7 @@ def repl(*, cfg: AppConfig, client=None):
                             messages = [{"role": "system", "content": rt.profile.text}]
                             print("Profile changed; conversation history cleared.")
                         else:
-                            messages[0] = {"role": "system", "content": rt.profile.text}
+                            messages[0] = {"role": "system", "content": rt.profile.text + summary_suffix(messages[0])}
                 except Exception as e:
                     print(f"/config error: {e}", file=sys.stderr)
                 continue
@@ -654,6 +1155,189 @@ def repl(*, cfg: AppConfig, client=None):
                 pager.run()
                 continue
 
+            elif cmd == "cache" or cmd.startswith("cache "):
+                sub = cmd.split(None, 1)[1].strip() if " " in cmd else "stats"
+                if rt.cache is None:
+                    print("Response cache is off (/config set cache=true to enable).")
+                elif sub == "stats":
+                    st = rt.cache.stats()
+                    print(f"Response cache: {rt.cache.root}")
+                    print(f"  {st.entries} entries, {st.bytes / 1024:.1f} KiB (limit {cfg.cache_max_mb} MiB)")
+                    ttl = f"{cfg.cache_ttl}s" if cfg.cache_ttl else "never"
+                    print(
+                        f"  this session: {st.hits} hits ({st.template_hits} via filename templates), "
+                        f"{st.misses} misses; entries expire after {ttl}"
+                    )
+                elif sub == "clear":
+                    print(f"Removed {rt.cache.clear()} cached responses.")
+                else:
+                    print("Usage: /cache [stats|clear]", file=sys.stderr)
+                continue
+
+            elif cmd == "check" or cmd.startswith("check "):
+                target = line.strip()[len("/check") :].strip()
+                if target.startswith("!"):
+                    target = target[1:].strip()
+                if not target:
+                    latest = next((e for e in reversed(transcript.entries) if e.commands), None)
+                    if latest is None:
+                        print("Nothing to check yet. Usage: /check [command]", file=sys.stderr)
+                        continue
+                    target = " ".join(latest.commands[0].splitlines()).strip()
+                try:
+                    result = check(target)
+                except KeyboardInterrupt:
+                    print("Cancelled.")
+                    continue
+                if result is None:
+                    print("Only a plain ffmpeg command with an output file can be dry-run.", file=sys.stderr)
+                else:
+                    report_dry_run(result)
+                continue
+
+            elif cmd == "jobs":
+                if not rt.jobs.jobs:
+                    print("No background jobs. Start one with !&<command>.")
+                for job in rt.jobs.jobs:
+                    print(job.describe())
+                print(f"At most {rt.jobs.max_jobs} run at once (/config set max_jobs=N).")
+                continue
+
+            elif cmd == "fg" or cmd.startswith("fg "):
+                arg = cmd[2:].strip().lstrip("%")
+                job = rt.jobs.get(int(arg)) if arg.isdigit() else rt.jobs.get() if not arg else None
+                if job is None:
+                    print("No such job. Usage: /fg [n] (see /jobs)", file=sys.stderr)
+                    continue
+                if job.state == "queued":
+                    print(f"[{job.id}] is still queued; waiting for it to start.")
+                try:
+                    follow(job)
+                except KeyboardInterrupt:
+                    print(f"\n[{job.id}] still running in the background.")
+                continue
+
+            elif cmd == "kill" or cmd.startswith("kill "):
+                arg = cmd[4:].strip().lstrip("%")
+                if arg == "all":
+                    targets = rt.jobs.running() + rt.jobs.queued()
+                else:
+                    job = rt.jobs.get(int(arg)) if arg.isdigit() else None
+                    targets = [job] if job is not None else []
+                    if not targets:
+                        print("Usage: /kill <n|all> (see /jobs)", file=sys.stderr)
+                        continue
+                for job in targets:
+                    if rt.jobs.kill(job):
+                        print(f"[{job.id}] stopping: {job.command}")
+                    else:
+                        print(f"[{job.id}] already {job.state}.")
+                continue
+
+            elif cmd == "map" or cmd.startswith("map "):
+                try:
+                    words = shlex.split(line.strip()[len("/map") :])
+                except ValueError as e:
+                    print(f"/map: {e}", file=sys.stderr)
+                    continue
+                max_jobs, patterns = rt.jobs.max_jobs, []
+                while words:
+                    word = words.pop(0)
+                    if word.startswith("-j"):
+                        n = word[2:] or (words.pop(0) if words else "")
+                        if not n.isdigit() or int(n) < 1:
+                            patterns = []
+                            break
+                        max_jobs = int(n)
+                    else:
+                        patterns.append(word)
+                if not patterns:
+                    print("Usage: /map <glob> [-j N]  (e.g. /map 'clips/*.mov' -j 4)", file=sys.stderr)
+                    continue
+                if not ui.last_command:
+                    print("Nothing to map yet: get a command working on one file first.", file=sys.stderr)
+                    continue
+                template = map_template(ui.last_command)
+                if template is None:
+                    print(
+                        f"/map needs a plain ffmpeg command with an input file and an output file, not: {ui.last_command}",
+                        file=sys.stderr,
+                    )
+                    continue
+                files = expand_globs(patterns)
+                if not files:
+                    print(f"No files match {' '.join(patterns)}.", file=sys.stderr)
+                    continue
+                plan = plan_map(template, files)
+                todo = plan.to_run
+                print(f"{len(todo)} of {len(plan.items)} files to run, {max_jobs} at a time. The first:")
+                print(f"  {todo[0].command}" if todo else "  (none)")
+                skipped = [it for it in plan.items if it.skip]
+                for it in skipped[:5]:
+                    print(f"  skipping {it.input}: {it.skip}")
+                if len(skipped) > 5:
+                    print(f"  ... and {len(skipped) - 5} more skipped")
+                for it in skipped:
+                    transcript.log_map(it.command, it.input, it.outputs, "skipped", reason=it.skip, persist=cfg.transcript)
+                if not todo or not preflight_ok(todo[0].command):
+                    continue
+                try:
+                    if input("Run them? [Y/n] ").strip().lower() not in ("", "y", "yes"):
+                        continue
+                except (KeyboardInterrupt, EOFError):
+                    continue
+
+                def map_result(item: MapItem) -> None:
+                    job = item.job
+                    transcript.log_map(
+                        item.command,
+                        item.input,
+                        item.outputs,
+                        job.state,
+                        persist=cfg.transcript,
+                        exit_code=job.exit_code,
+                        seconds=job.finished - job.started if job.started and job.finished else None,
+                        progress=job.progress.to_record() if job.progress else None,
+                        output=job.result.output if job.result else "",
+                    )
+
+                try:
+                    run_map(plan, max_jobs, probes=rt.probes, on_result=map_result)
+                except KeyboardInterrupt:
+                    print("\nStopped; unfinished outputs were removed, so /map again picks up where this left off.")
+                print("Map: " + plan.summary())
+                continue
+
+            elif cmd == "parallel" or cmd.startswith("parallel "):
+                target = line.strip()[len("/parallel") :].strip()
+                jobs = cfg.parallel or rt.jobs.max_jobs
+                if target.startswith("-j"):
+                    n, _, target = target[2:].strip().partition(" ")
+                    if not n.isdigit() or int(n) < 2:
+                        print("Usage: /parallel [-j N] [command]  (N of 2 or more)", file=sys.stderr)
+                        continue
+                    jobs, target = int(n), target.strip()
+                target = target.removeprefix("!").strip() or ui.last_command
+                if not target:
+                    print("Nothing to encode yet. Usage: /parallel [-j N] [command]", file=sys.stderr)
+                    continue
+                problem = split_problem(target)
+                if problem:
+                    print(f"Can't encode this one in segments: {problem}.", file=sys.stderr)
+                    continue
+                ui.last_command = target
+                if preflight_ok(target) and not run_parallel(target, jobs):
+                    print("Running it as is.")
+                    result = execute_command(target, probes=rt.probes)
+                    transcript.log_exec(
+                        target,
+                        result.exit_code,
+                        persist=cfg.transcript,
+                        progress=result.progress.to_record() if result.progress else None,
+                        output=result.output,
+                    )
+                continue
+
             elif cmd == "pane":
                 ui.pane_visible = not ui.pane_visible
                 continue
@@ -677,40 +1361,39 @@ def repl(*, cfg: AppConfig, client=None):
         # !shell commands
         elif line.startswith("!"):
             shell_cmd = line[1:].strip()
+            background = shell_cmd.startswith("&") or (cfg.background and ffmpeg_word(shell_cmd) is not None)
+            shell_cmd = shell_cmd.removeprefix("&").strip()
             if shell_cmd:
-                rc = execute_command(shell_cmd)
-                transcript.log_exec(shell_cmd, rc, persist=cfg.transcript)
+                ui.last_command = shell_cmd
+            if background and shell_cmd and preflight_ok(shell_cmd):
+                job = rt.jobs.submit(shell_cmd)
+                ui.job_exchanges[job.id] = transcript.entries[-1] if transcript.entries else None
+                ui.exit_warned = False
+                print(job.describe())
+            elif shell_cmd and preflight_ok(shell_cmd):
+                if cfg.parallel > 1 and not split_problem(shell_cmd) and run_parallel(shell_cmd, cfg.parallel):
+                    continue
+                result = execute_command(shell_cmd, probes=rt.probes)
+                rc = result.exit_code
+                transcript.log_exec(
+                    shell_cmd,
+                    rc,
+                    persist=cfg.transcript,
+                    progress=result.progress.to_record() if result.progress else None,
+                    output=result.output,
+                )
                 if rc != 0:
                     print(f"Shell command exited {rc}", file=sys.stderr)
             continue
 
         # LLM request
-        messages.append({"role": "user", "content": line})
-        messages = trim_messages(messages, keep_last_turns=cfg.context_turns)
-
-        raw, cmd = generate_ffmpeg_command(messages, client, cfg)
-        if raw:
-            prefill = record_generation(line, raw)
-        if not cmd:
-            print("Failed to generate a command.", file=sys.stderr)
-            print(raw)
-            messages.pop()
-            continue
-
-        messages.append({"role": "assistant", "content": raw})
-        messages = trim_messages(messages, keep_last_turns=cfg.context_turns)
-
-        if cfg.copy:
-            pyperclip.copy(cmd)
+        finish_stream()  # the previous reply must be complete before it is resent
+        messages.append({"role": "user", "content": with_media_info(line, rt.probes)})
+        messages = trim(messages)
 
+        prefill = respond(line)
 
-def trim_messages(messages: list[dict], keep_last_turns: int = 12) -> list[dict]:
-    if keep_last_turns <= 0:
-        return messages[:1]  # keep only system
 
-    system = messages[0:1]
-    rest = messages[1:]
-    max_msgs = keep_last_turns * 2
-    if len(rest) <= max_msgs:
-        return messages
-    return system + rest[-max_msgs:]
+def trim_messages(messages: list[dict], keep_last_turns: int = 12, max_tokens: int = 0) -> list[dict]:
+    """Keep the system message plus the newest turns that fit both limits (see fit_messages)."""
+    return fit_messages(messages, max_turns=keep_last_turns, max_tokens=max_tokens)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+
+import openai
+
+DEFAULT_TIMEOUT = 60.0  # seconds per attempt (connect, and between bytes of a stream)
+DEFAULT_DEADLINE = 180.0  # seconds for the whole request, retries included
+DEFAULT_RETRIES = 2
+DEFAULT_BREAKER_THRESHOLD = 5  # consecutive failures before failing fast
+DEFAULT_BREAKER_COOLDOWN = 30.0  # seconds before letting a trial request through
+
+# Exponential backoff: attempt n waits uniform(0, min(cap, base * 2**n)).
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint that has been failing repeatedly."""
+
+    def __init__(self, retry_in: float, failures: int):
+        self.retry_in = retry_in
+        self.failures = failures
+        super().__init__(
+            f"Endpoint marked down after {failures} consecutive failures; "
+            f"not retrying for another {retry_in:.0f}s (check with /ping)."
+        )
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request (all attempts included) ran past its overall deadline."""
+
+
+def is_transient(e: BaseException) -> bool:
+    """Errors worth retrying: connection problems, timeouts, 429 and 5xx."""
+    if isinstance(e, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(e, openai.APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, *, rng: Callable[[], float] = random.random) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+    return rng() * min(BACKOFF_CAP, BACKOFF_BASE * (2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one endpoint.
+
+    Closed: calls go through; transient failures are counted and any success
+    resets the count. After `threshold` failures in a row the breaker opens
+    and check() raises CircuitOpenError for `cooldown` seconds. After that it
+    is half-open: calls go through again, a success closes it and another
+    failure reopens it straight away. threshold=0 disables it.
+    """
+
+    def __init__(
+        self,
+        threshold: int = DEFAULT_BREAKER_THRESHOLD,
+        cooldown: float = DEFAULT_BREAKER_COOLDOWN,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.last_error = ""
+        self._opened_at: float | None = None
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'degraded' (recent failures), 'open' or 'half-open'."""
+        if self._opened_at is not None:
+            if self._clock() - self._opened_at < self.cooldown:
+                return "open"
+            return "half-open"
+        return "degraded" if self.failures else "closed"
+
+    def retry_in(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (self._clock() - self._opened_at))
+
+    def check(self) -> None:
+        if self.state == "open":
+            raise CircuitOpenError(self.retry_in(), self.failures)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.last_error = ""
+            self._opened_at = None
+
+    def record_failure(self, e: BaseException) -> None:
+        """Count `e` if it says the endpoint is unhealthy; other errors are ignored."""
+        if not (is_transient(e) or isinstance(e, DeadlineExceeded)):
+            return
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            if self.threshold and (self.failures >= self.threshold or self._opened_at is not None):
+                self._opened_at = self._clock()
+
+    def describe(self) -> str:
+        st = self.state
+        if st == "closed":
+            return "ok"
+        if st == "degraded":
+            return f"degraded ({self.failures} recent failure{'s' if self.failures != 1 else ''})"
+        if st == "open":
+            return f"down, failing fast for {self.retry_in():.0f}s ({self.failures} failures in a row)"
+        return "recovering (next request is a trial)"
+
+
+class Attempts:
+    """Retry bookkeeping for one request under cfg's timeout/deadline/retries."""
+
+    def __init__(self, cfg, *, clock: Callable[[], float] = time.monotonic):
+        self.retries = max(0, int(cfg.retries))
+        self.timeout = float(cfg.timeout) or None
+        self._clock = clock
+        self.deadline_at = clock() + cfg.deadline if cfg.deadline else None
+        self.attempt = 0
+
+    def remaining(self) -> float | None:
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - self._clock()
+
+    def expired(self) -> bool:
+        rem = self.remaining()
+        return rem is not None and rem <= 0
+
+    def request_kwargs(self) -> dict:
+        """`timeout=` for the next attempt: the per-attempt timeout, capped by the deadline."""
+        limits = [t for t in (self.timeout, self.remaining()) if t is not None]
+        if not limits:
+            return {}
+        return {"timeout": max(0.1, min(limits))}
+
+    def next_delay(self, e: BaseException) -> float | None:
+        """Seconds to wait before retrying after `e`, or None to give up."""
+        if not is_transient(e) or self.attempt >= self.retries:
+            return None
+        self.attempt += 1
+        delay = backoff_delay(self.attempt)
+        rem = self.remaining()
+        if rem is not None and rem <= delay:
+            return None
+        return delay
+
+
+def call_with_retries(
+    fn: Callable[[dict], T],
+    cfg,
+    *,
+    breaker: CircuitBreaker | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """Call fn(request_kwargs) under cfg's retry policy, reporting to `breaker`."""
+    att = Attempts(cfg)
+    while True:
+        if breaker is not None:
+            breaker.check()
+        try:
+            result = fn(att.request_kwargs())
+        except Exception as e:
+            if breaker is not None:
+                breaker.record_failure(e)
+            delay = att.next_delay(e)
+            if delay is None:
+                raise
+            sleep(delay)
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -4,15 +4,38 @@ from dataclasses import dataclass
 from typing import Optional, Any, Tuple
 from .profiles import load_profile
 from .llm import build_client
+from .cache import ResponseCache
+from .hedge import hedge_config
+from .pool import EndpointPool
+from .resilience import CircuitBreaker
+from .capabilities import IndexLoader
+from .probe import ProbeCache
+from .preflight import Preflight
+from .jobs import JobManager
 
 @dataclass
 class RuntimeState:
     client: Optional[Any] = None
     profile: Optional[Any] = None
+    cache: Optional[ResponseCache] = None
+    hedge_client: Optional[Any] = None
+    # one circuit breaker per client; replaced whenever its client is rebuilt
+    breaker: Optional[CircuitBreaker] = None
+    hedge_breaker: Optional[CircuitBreaker] = None
+    # local ffmpeg capability index, loaded in the background (cfg.validate)
+    capabilities: Optional[IndexLoader] = None
+    # ffprobe results for files named in prompts (cfg.probe)
+    probes: Optional[ProbeCache] = None
+    # dry runs of ffmpeg commands (/check always; automatic unless preflight=off)
+    preflight: Optional[Preflight] = None
+    # background !commands (!&cmd, or cfg.background)
+    jobs: Optional[JobManager] = None
 
     # fingerprints for deterministic rebuilds
     _client_fp: Optional[Tuple] = None
     _profile_fp: Optional[Tuple] = None
+    _cache_fp: Optional[Tuple] = None
+    _hedge_fp: Optional[Tuple] = None
 
     # tools_registry: Optional[Tools] = None
     # _tools_fp: Optional[Tuple] = None
@@ -24,18 +47,39 @@ def client_fingerprint(cfg) -> tuple:
         cfg.base_url,
         cfg.openai_api_key,
         cfg.bearer_token,
+        cfg.pool,
+        cfg.pool_check_interval,
+        cfg.timeout,
     )
 
 def profile_fingerprint(cfg) -> tuple:
     # add anything else that changes load semantics
     return (cfg.profile_name, cfg.profile_dir)
 
+def cache_fingerprint(cfg) -> tuple:
+    return (cfg.cache, cfg.cache_ttl, cfg.cache_max_mb, cfg.cache_templates)
+
+def build_cache(cfg) -> Optional[ResponseCache]:
+    if not cfg.cache:
+        return None
+    return ResponseCache(
+        ttl=cfg.cache_ttl,
+        max_bytes=cfg.cache_max_mb * 1024 * 1024,
+        templates=cfg.cache_templates,
+    )
+
 def reconcile_runtime(cfg, rt: RuntimeState, *, force: bool = False) -> RuntimeState:
     # client
     cfp = client_fingerprint(cfg)
     if force or rt.client is None or rt._client_fp != cfp:
+        if isinstance(rt.client, EndpointPool):
+            rt.client.close()  # stop its health checks
         rt.client = build_client(cfg)
         rt._client_fp = cfp
+        rt.breaker = None
+    if rt.breaker is None:
+        rt.breaker = CircuitBreaker()
+    rt.breaker.threshold, rt.breaker.cooldown = cfg.breaker_threshold, cfg.breaker_cooldown
 
     # profile
     pfp = profile_fingerprint(cfg)
@@ -43,4 +87,42 @@ def reconcile_runtime(cfg, rt: RuntimeState, *, force: bool = False) -> RuntimeS
         rt.profile = load_profile(cfg.profile_name, cfg.profile_dir)  
         rt._profile_fp = pfp
 
+    # response cache
+    kfp = cache_fingerprint(cfg)
+    if force or rt._cache_fp != kfp:
+        rt.cache = build_cache(cfg)
+        rt._cache_fp = kfp
+
+    # hedge endpoint (shares the main client when only the model differs)
+    hcfg = hedge_config(cfg)
+    hfp = client_fingerprint(hcfg) if hcfg is not None else None
+    if hfp is None:
+        rt.hedge_client, rt.hedge_breaker = None, None
+    elif hfp == cfp:
+        rt.hedge_client, rt.hedge_breaker = rt.client, rt.breaker
+    elif force or rt.hedge_client is None or rt._hedge_fp != hfp or rt.hedge_breaker is rt.breaker:
+        rt.hedge_client = build_client(hcfg)
+        rt.hedge_breaker = CircuitBreaker()
+    if rt.hedge_breaker is not None:
+        rt.hedge_breaker.threshold = cfg.breaker_threshold
+        rt.hedge_breaker.cooldown = cfg.breaker_cooldown
+    rt._hedge_fp = hfp
+
+    # capability index: built once per ffmpeg binary, so only loaded once
+    if not cfg.validate:
+        rt.capabilities = None
+    elif rt.capabilities is None:
+        rt.capabilities = IndexLoader().start()
+    if not cfg.probe:
+        rt.probes = None
+    elif rt.probes is None:
+        rt.probes = ProbeCache()
+    if rt.preflight is None:
+        rt.preflight = Preflight()
+    if rt.jobs is None:
+        rt.jobs = JobManager(cfg.max_jobs)
+    else:
+        rt.jobs.set_limit(cfg.max_jobs)
+    rt.jobs.probes = rt.probes
+
     return rt
@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import glob
+import os
+import re
+import shlex
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Callable
+
+from .capabilities import option_name
+from .fanout import MapItem, MapRun, map_template, run_map
+from .preflight import FLAG_OPTIONS, run_ffmpeg
+from .probe import run_ffprobe
+from .progress import format_clock, parse_time
+
+# Input per segment at least: shorter segments cost more in process
+# startup and forced keyframes than running them side by side saves.
+MIN_SEGMENT = 30.0
+# How far the joined output's duration may be from the input's (plus 0.1%).
+DURATION_TOLERANCE = 0.5
+# Options a split run can't honour: trimming and seeking (each segment has a
+# timeline of its own), frame limits, two-pass encodes, and filtergraphs
+# that can tie video to audio or to other inputs.
+UNSPLITTABLE = frozenset(
+    {
+        "ss", "sseof", "t", "to", "itsoffset", "frames", "vframes", "pass", "passlogfile",
+        "filter_complex", "lavfi", "shortest",
+    }
+)
+# Filters that work on each frame (or audio frame) alone, whatever its
+# timestamp. -vf/-af/-filter chains may only use these: anything else
+# (subtitles, fade, setpts, trim, select, drawtext, temporal denoisers)
+# would start over at t=0 in every segment.
+STATELESS_FILTERS = frozenset(
+    {
+        "scale", "crop", "pad", "format", "transpose", "hflip", "vflip", "setsar", "setdar", "null", "copy",
+        "colorspace", "zscale", "lut3d", "lutrgb", "lutyuv", "curves", "colorchannelmixer", "colorbalance",
+        "unsharp", "gblur", "boxblur", "setparams", "hwupload", "hwdownload", "hwupload_cuda",
+        "scale_cuda", "scale_vaapi", "scale_qsv", "scale_npp",
+        "anull", "aformat", "aresample", "pan", "channelmap", "volume", "highpass", "lowpass",
+    }
+)
+FILTER_OPTIONS = frozenset({"vf", "af", "filter"})
+_LABEL_RE = re.compile(r"\[[^\]]*\]")
+# Output options for the muxer rather than the encoder: kept off the
+# per-segment encodes and passed to the final join.
+MUXER_OPTIONS = frozenset({"f", "movflags", "metadata"})
+_QUIET = ("-hide_banner", "-nostdin", "-v", "error")
+
+
+def _groups(args: list[str]) -> list[list[str]]:
+    """Options with their values, one list each (['-c:v', 'libx264'], ['-y'])."""
+    out, i = [], 0
+    while i < len(args):
+        name = option_name(args[i]) if args[i].startswith("-") else None
+        takes_value = name is not None and name not in FLAG_OPTIONS and i + 1 < len(args)
+        out.append(args[i : i + 2] if takes_value else [args[i]])
+        i += 2 if takes_value else 1
+    return out
+
+
+def _name(group: list[str]) -> str | None:
+    return option_name(group[0]) if group[0].startswith("-") else None
+
+
+def _flat(groups: list[list[str]]) -> list[str]:
+    return [a for g in groups for a in g]
+
+
+def filter_names(graph: str) -> list[str]:
+    """Names of the filters in a -vf/-af chain ('scale=-2:720,fade=t=in' -> ['scale', 'fade'])."""
+    parts, depth, quote, start = [], 0, "", 0
+    i = 0
+    while i < len(graph):
+        ch = graph[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if quote:
+            quote = "" if ch == quote else quote
+        elif ch in "'\"":
+            quote = ch
+        elif ch in ",;" and depth == 0:
+            parts.append(graph[start:i])
+            start = i + 1
+        elif ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth = max(0, depth - 1)
+        i += 1
+    parts.append(graph[start:])
+    names = (_LABEL_RE.sub("", p).split("=", 1)[0].split("@", 1)[0].strip() for p in parts)
+    return [n for n in names if n]
+
+
+def split_problem(command: str) -> str:
+    """Why `command` can't be encoded in segments ('' if it can).
+
+    It has to be a plain ffmpeg command with one input file and one output
+    file at the end, none of the UNSPLITTABLE options, and only
+    STATELESS_FILTERS in its filter chains.
+    """
+    t = map_template(command)
+    if t is None:
+        return "not a plain ffmpeg command with an input file and an output file"
+    groups = _groups(list(t.args[1:]))
+    names = [_name(g) for g in groups]
+    if names.count("i") != 1:
+        return "more than one input"
+    if len(t.outputs) != 1 or t.outputs[0] != len(t.args) - 1:
+        return "more than one output, or options after the output"
+    used = sorted(UNSPLITTABLE.intersection(names))
+    if used:
+        return "uses " + ", ".join("-" + n for n in used)
+    for g in groups:
+        if _name(g) not in FILTER_OPTIONS or len(g) < 2:
+            continue
+        if g[0].startswith("-/"):
+            return f"reads its filters from a file ({g[0]})"
+        timed = [f for f in filter_names(g[1]) if f not in STATELESS_FILTERS]
+        if timed:
+            return f"{g[0]} uses {', '.join(timed)}, which may depend on the time in the file"
+    return ""
+
+
+def split_points(duration: float, segments: int) -> list[float]:
+    """Where to cut `duration` seconds into equal parts; the segment muxer moves each cut to the next keyframe."""
+    return [round(duration * k / segments, 3) for k in range(1, segments)]
+
+
+def segment_count(duration: float, jobs: int) -> int:
+    return max(1, min(jobs, int(duration // MIN_SEGMENT)))
+
+
+def _duration(info: dict | None) -> float | None:
+    return parse_time(str(((info or {}).get("format") or {}).get("duration", "")))
+
+
+def _stream_types(info: dict | None) -> list[str]:
+    return sorted(str(s.get("codec_type")) for s in (info or {}).get("streams") or [])
+
+
+def verify(source: dict | None, output: dict | None, expected_types: list[str]) -> list[str]:
+    """What's wrong with the joined output, going by ffprobe (empty if nothing)."""
+    if not output or "error" in output:
+        return [f"ffprobe can't read the output: {(output or {}).get('error', 'no result')}"]
+    problems = []
+    want, got = _duration(source), _duration(output)
+    if want and got is None:
+        problems.append("the output has no duration")
+    elif want and abs(got - want) > DURATION_TOLERANCE + want / 1000:
+        problems.append(f"duration {format_clock(got)} but the input is {format_clock(want)}")
+    if _stream_types(output) != sorted(expected_types):
+        got_types, want_types = ", ".join(_stream_types(output)), ", ".join(sorted(expected_types))
+        problems.append(f"streams {got_types}; expected {want_types}")
+    return problems
+
+
+@dataclass
+class ParallelResult:
+    """Outcome of encode_parallel: done, unverified (joined, but ffprobe disagrees), failed or skipped."""
+
+    status: str
+    segments: int = 0
+    seconds: float = 0.0
+    error: str = ""
+    problems: list[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        if self.status == "done":
+            took = format_clock(self.seconds)[:-3]
+            return f"Encoded in {self.segments} segments in {took}; duration and streams match the input."
+        if self.status == "unverified":
+            problems = "; ".join(self.problems)
+            return f"Joined {self.segments} segments, but the output doesn't match the input: {problems}"
+        return self.error
+
+    def to_record(self) -> dict:
+        rec = {"status": self.status, "segments": self.segments, "seconds": round(self.seconds, 3)}
+        if self.problems:
+            rec["problems"] = self.problems
+        return rec
+
+
+def _probe(path: str) -> dict:
+    return run_ffprobe(shutil.which("ffprobe") or "ffprobe", path)
+
+
+def encode_parallel(
+    command: str,
+    jobs: int,
+    *,
+    run: Callable[[list[str], float | None], tuple[int, str]] = run_ffmpeg,
+    probe: Callable[[str], dict] = _probe,
+    out: IO[str] | None = None,
+) -> ParallelResult:
+    """Run an ffmpeg encode as up to `jobs` segments side by side, then join and check it.
+
+    1. The input's first video stream is cut at keyframes near equal split
+       points into segments (the segment muxer, stream copy, so it is fast
+       and lossless).
+    2. Each segment is encoded with the command's own output options, video
+       only, as a job of its own (fanout.run_map); everything else (audio,
+       subtitles) is encoded once from the whole input alongside.
+    3. The encoded segments are joined with the concat demuxer, stream
+       copy, and muxed with the rest.
+    4. The output is checked with ffprobe against the input: same duration
+       (within DURATION_TOLERANCE) and the streams expected.
+
+    Intermediate files live in a temporary directory next to the output and
+    are removed at the end. Check split_problem() first; a file too short
+    for two segments comes back 'skipped' (run it as is). ctrl-c stops the
+    jobs and is re-raised.
+    """
+    t = map_template(command)
+    args = list(t.args)
+    source, output = t.input_path, args[-1]
+    input_opts = _groups(args[1 : t.input - 1])
+    output_opts = _groups(args[t.input + 1 : -1])
+    t0 = time.monotonic()
+
+    info = probe(source)
+    duration = _duration(info)
+    if not duration:
+        why = (info or {}).get("error", "no duration")
+        return ParallelResult("failed", error=f"Can't tell how long {source} is: {why}")
+    n = segment_count(duration, jobs)
+    if n < 2:
+        return ParallelResult("skipped", error=f"{source} is too short to split (under {2 * MIN_SEGMENT:.0f}s).")
+    if os.path.exists(output) and "-y" not in args:
+        return ParallelResult("failed", error=f"{output} exists (add -y to overwrite it).")
+
+    work = tempfile.mkdtemp(prefix=".wtff-parallel-", dir=os.path.dirname(output) or ".")
+    try:
+        rc, err = run(
+            [args[0], *_QUIET, *_flat(input_opts), "-i", source, "-map", "0:v:0", "-c", "copy",
+             "-f", "segment", "-segment_times", ",".join(map(str, split_points(duration, n))),
+             "-reset_timestamps", "1", os.path.join(work, "in%04d.mkv")],
+            None,
+        )
+        parts = sorted(glob.glob(os.path.join(work, "in*.mkv")))
+        if rc != 0 or not parts:
+            return ParallelResult("failed", error=f"Splitting {source} failed: {err.strip() or f'exit {rc}'}")
+
+        seg_opts = [g for g in output_opts if _name(g) not in MUXER_OPTIONS and _name(g) != "map"]
+        seg_input_opts = [g for g in input_opts if _name(g) != "f"]  # the segments are Matroska
+        items = []
+        # Expected lengths for the progress line, in the shape probe.ProbeCache.get returns.
+        durations = {}
+        cuts = [0.0, *split_points(duration, n), duration]
+        for i, part in enumerate(parts):
+            encoded = os.path.join(work, f"out{i:04d}.mkv")
+            cmd = [args[0], "-nostdin", *_flat(seg_input_opts), "-i", part, *_flat(seg_opts)]
+            cmd += ["-an", "-sn", "-dn", encoded]
+            items.append(MapItem(part, [encoded], shlex.join(cmd)))
+            durations[part] = {"format": {"duration": str(cuts[min(i + 1, n)] - cuts[min(i, n)])}}
+        rest, rest_item = None, None
+        if any(ty != "video" for ty in _stream_types(info)):
+            rest = os.path.join(work, "rest" + Path(output).suffix)
+            cmd = [args[0], "-nostdin", *_flat(input_opts), "-i", source, *_flat(output_opts), "-vn", rest]
+            rest_item = MapItem(source, [rest], shlex.join(cmd))
+            items.append(rest_item)
+            durations[source] = {"format": {"duration": str(duration)}}
+
+        plan = MapRun(t, items, label="Parallel")
+        run_map(plan, jobs, probes=durations, out=out)
+        for item in plan.items:
+            if item.status == "done":
+                continue
+            tail = (item.job.result.output if item.job and item.job.result else "").strip()
+            if item is rest_item and "does not contain any stream" in tail:
+                rest = None  # the command's maps leave nothing but video
+                continue
+            what = "the audio and other streams" if item is rest_item else os.path.basename(item.input)
+            why = tail.splitlines()[-1] if tail else item.status
+            return ParallelResult("failed", n, time.monotonic() - t0, f"Encoding {what} failed: {why}")
+
+        listing = os.path.join(work, "list.txt")
+        with open(listing, "w", encoding="utf-8") as f:
+            for item in items:
+                if item is not rest_item:
+                    f.write(f"file '{os.path.basename(item.outputs[0])}'\n")
+        muxer_opts = [g for g in output_opts if _name(g) in MUXER_OPTIONS]
+        cmd = [args[0], *_QUIET, "-y", "-f", "concat", "-safe", "0", "-i", listing]
+        cmd += ["-i", rest, "-map", "0:v", "-map", "1"] if rest else []
+        rc, err = run([*cmd, "-c", "copy", *_flat(muxer_opts), output], None)
+        if rc != 0:
+            why = err.strip() or f"exit {rc}"
+            return ParallelResult("failed", n, time.monotonic() - t0, f"Joining the segments failed: {why}")
+
+        expected = ["video", *(_stream_types(probe(rest)) if rest else [])]
+        problems = verify(info, probe(output), expected)
+        return ParallelResult("unverified" if problems else "done", n, time.monotonic() - t0, problems=problems)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import re
+
+import openai
+
+from .config import AppConfig
+
+# What the model is asked to return in structured mode.
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "commands": {"type": "array", "items": {"type": "string"}},
+        "notes": {"type": "string"},
+    },
+    "required": ["commands", "notes"],
+    "additionalProperties": False,
+}
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "ffmpeg_commands", "strict": True, "schema": SCHEMA},
+}
+INSTRUCTION = (
+    "\n\nReply only with a JSON object: "
+    '{"commands": ["ffmpeg ..."], "notes": "..."}. '
+    "Each command is complete on one line, best first; keep notes to a sentence or leave them empty."
+)
+
+_COMMANDS_RE = re.compile(r'"commands"\s*:\s*\[')
+# The start of a "commands" key whose ': [' hasn't fully arrived yet.
+_COMMANDS_PREFIX_RE = re.compile(r'"commands"\s*(?::\s*)?')
+_KEY = '"commands"'
+_CONTINUATION_RE = re.compile(r"\s*\\?\s*\n\s*")
+_DECODER = json.JSONDecoder()
+# What a refusal of the schema itself mentions, as opposed to any other bad request.
+_SCHEMA_ERROR_RE = re.compile(r"response_format|json_schema|json schema|structured output", re.IGNORECASE)
+
+# (base_url, model) pairs whose server rejected the schema this session.
+_rejected: set[tuple[str | None, str]] = set()
+
+
+def structured_enabled(cfg: AppConfig) -> bool:
+    return cfg.structured and (cfg.base_url, cfg.model) not in _rejected
+
+
+def mark_rejected(cfg: AppConfig) -> None:
+    _rejected.add((cfg.base_url, cfg.model))
+
+
+def is_rejection(e: BaseException) -> bool:
+    """A 400/422 about the response format, which is how servers without json_schema support refuse the request.
+
+    Other bad requests (context too long, an unknown model) aren't, and
+    shouldn't turn structured mode off.
+    """
+    if not isinstance(e, (openai.BadRequestError, openai.UnprocessableEntityError)):
+        return False
+    return bool(_SCHEMA_ERROR_RE.search(f"{e} {getattr(e, 'body', '') or ''}"))
+
+
+def with_instruction(messages: list[dict]) -> list[dict]:
+    """`messages` with the JSON reply format spelled out in the system message."""
+    if not messages or messages[0].get("role") != "system":
+        return [{"role": "system", "content": INSTRUCTION.strip()}] + list(messages)
+    first = {**messages[0], "content": (messages[0].get("content") or "") + INSTRUCTION}
+    return [first] + list(messages[1:])
+
+
+def _clean(cmd) -> str:
+    c = _CONTINUATION_RE.sub(" ", str(cmd)).strip()
+    return c[2:] if c.startswith("$ ") else c
+
+
+def keep_commands(commands: list[str]) -> list[str]:
+    """The ffmpeg commands in `commands`, each once, in order."""
+    out: list[str] = []
+    seen: set[str] = set()
+    for c in commands:
+        if c.lower().startswith("ffmpeg") and c not in seen:
+            seen.add(c)
+            out.append(c)
+    return out
+
+
+def parse_response(text: str) -> tuple[list[str], str] | None:
+    """(commands, notes) from a structured reply, or None if `text` isn't one."""
+    s = (text or "").strip()
+    if s.startswith("```"):  # fenced anyway by a server that ignored the format
+        s = s.strip("`").strip()
+        if s[:4].lower() == "json":
+            s = s[4:].lstrip()
+    if not s.startswith("{"):
+        return None
+    try:
+        obj = json.loads(s)
+    except ValueError:
+        return None
+    if not isinstance(obj, dict) or not isinstance(obj.get("commands"), list):
+        return None
+    notes = obj.get("notes")
+    return keep_commands([_clean(c) for c in obj["commands"]]), notes if isinstance(notes, str) else ""
+
+
+class CommandScanner:
+    """Strings of the "commands" array of a structured reply, as the reply arrives in chunks.
+
+    Work is linear in the reply: only text that can still matter is held,
+    either the tail where '"commands": [' may be starting or the array item
+    still arriving, and an incomplete item is decoded again only once a
+    chunk brings a quote that may close it.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._in_array = False
+        self._waiting = False  # _pending starts with an incomplete string
+        self._done = False
+
+    def feed(self, chunk: str) -> list[str]:
+        """Array items (cleaned, unfiltered) completed by `chunk`."""
+        if self._done:
+            return []
+        text = self._pending + chunk
+        if not self._in_array:
+            m = _COMMANDS_RE.search(text)
+            if m is None:
+                k = text.rfind(_KEY)
+                if k >= 0 and _COMMANDS_PREFIX_RE.fullmatch(text, k):
+                    self._pending = text[k:]
+                else:
+                    self._pending = text[-(len(_KEY) - 1) :]
+                return []
+            self._in_array = True
+            text = text[m.end() :]
+        elif self._waiting and '"' not in chunk:
+            self._pending = text
+            return []
+        out: list[str] = []
+        i, end = 0, len(text)
+        while True:
+            while i < end and text[i] in " \t\r\n,":
+                i += 1
+            if i >= end:
+                self._pending, self._waiting = "", False
+                return out
+            if text[i] != '"':  # end of the array
+                self._pending, self._done = "", True
+                return out
+            try:
+                item, i = _DECODER.raw_decode(text, i)
+            except ValueError:  # string still arriving
+                self._pending, self._waiting = text[i:], True
+                return out
+            out.append(_clean(item))
+
+
+def partial_commands(text: str) -> list[str]:
+    """Commands whose JSON strings are complete in a structured reply still streaming in."""
+    return keep_commands(CommandScanner().feed(text))
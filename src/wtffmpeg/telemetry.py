@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+
+@dataclass
+class RequestStats:
+    """Timing and token usage of one completion request.
+
+    Times are seconds from sending the request (retries included). Token
+    counts come from the server's `usage`; when it sends none (older compat
+    servers, or a cancelled stream) they are estimated locally and
+    `estimated` is set.
+    """
+
+    wall: float | None = None  # until the response was complete
+    ttft: float | None = None  # until the first token of text (streaming)
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    estimated: bool = False
+
+    @property
+    def tokens_per_s(self) -> float | None:
+        """Decode rate: completion tokens over the time spent generating them."""
+        if not self.completion_tokens or self.wall is None:
+            return None
+        span = self.wall - (self.ttft or 0.0)
+        return self.completion_tokens / span if span > 0 else None
+
+    @property
+    def prefill_per_s(self) -> float | None:
+        """Prompt tokens over time to first token (network latency included)."""
+        if not self.prompt_tokens or not self.ttft:
+            return None
+        return self.prompt_tokens / self.ttft
+
+    def shifted(self, offset: float) -> "RequestStats":
+        """The same stats with times measured from `offset` seconds earlier."""
+        return RequestStats(
+            wall=None if self.wall is None else self.wall + offset,
+            ttft=None if self.ttft is None else self.ttft + offset,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            estimated=self.estimated,
+        )
+
+    def to_record(self) -> dict:
+        """Fields for a JSONL record (absent values left out)."""
+        rec: dict[str, Any] = {}
+        if self.wall is not None:
+            rec["wall"] = round(self.wall, 3)
+        if self.ttft is not None:
+            rec["ttft"] = round(self.ttft, 3)
+        if self.prompt_tokens is not None:
+            rec["prompt_tokens"] = self.prompt_tokens
+        if self.completion_tokens is not None:
+            rec["completion_tokens"] = self.completion_tokens
+        tps = self.tokens_per_s
+        if tps is not None:
+            rec["tok_s"] = round(tps, 1)
+        if self.estimated:
+            rec["usage_estimated"] = True
+        return rec
+
+    def describe(self) -> str:
+        """One line for /raw, e.g. '2.31s total, first token 0.42s, 312 in / 87 out, 46.0 tok/s'."""
+        parts = []
+        if self.wall is not None:
+            parts.append(f"{self.wall:.2f}s total")
+        if self.ttft is not None:
+            parts.append(f"first token {self.ttft:.2f}s")
+        if self.prompt_tokens is not None or self.completion_tokens is not None:
+            tokens = f"{_n(self.prompt_tokens)} in / {_n(self.completion_tokens)} out"
+            parts.append(tokens + (" (estimated)" if self.estimated else ""))
+        tps = self.tokens_per_s
+        if tps is not None:
+            parts.append(f"{tps:.1f} tok/s")
+        return ", ".join(parts) or "-"
+
+
+def _n(v: int | None) -> str:
+    return "?" if v is None else str(v)
+
+
+def usage_counts(usage: Any) -> tuple[int | None, int | None]:
+    """(prompt, completion) token counts from an OpenAI-style `usage` object."""
+    if usage is None:
+        return None, None
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """q-th percentile (0-100) with linear interpolation between ranks."""
+    if not values:
+        raise ValueError("percentile of no values")
+    xs = sorted(values)
+    k = (len(xs) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+# (label, getter, format) for each row of the /stats table.
+METRICS = (
+    ("wall (s)", lambda s: s.wall, "{:.2f}"),
+    ("first token (s)", lambda s: s.ttft, "{:.2f}"),
+    ("prompt tokens", lambda s: s.prompt_tokens, "{:.0f}"),
+    ("completion tokens", lambda s: s.completion_tokens, "{:.0f}"),
+    ("decode tok/s", lambda s: s.tokens_per_s, "{:.1f}"),
+    ("prefill tok/s", lambda s: s.prefill_per_s, "{:.0f}"),
+)
+
+
+def summarize(stats: Iterable[RequestStats]) -> list[tuple[str, int, str, str]]:
+    """(metric, samples, p50, p95) for every metric with at least one sample."""
+    stats = list(stats)
+    rows = []
+    for label, get, fmt in METRICS:
+        values = [v for v in (get(s) for s in stats) if v is not None]
+        if values:
+            rows.append(
+                (label, len(values), fmt.format(percentile(values, 50)), fmt.format(percentile(values, 95)))
+            )
+    return rows
+
+
+def format_stats(stats: Iterable[RequestStats]) -> str:
+    """Plain-text p50/p95 table for /stats."""
+    stats = list(stats)
+    if not stats:
+        return "No completed requests yet."
+    rows = summarize(stats)
+    width = max(len(r[0]) for r in rows)
+    lines = [f"{len(stats)} requests"]
+    if any(s.estimated for s in stats):
+        lines[0] += " (some token counts estimated; the server sent no usage)"
+    lines.append(f"  {'':<{width}}  {'n':>4}  {'p50':>8}  {'p95':>8}")
+    lines.extend(f"  {label:<{width}}  {n:>4}  {p50:>8}  {p95:>8}" for label, n, p50, p95 in rows)
+    total_in = sum(s.prompt_tokens or 0 for s in stats)
+    total_out = sum(s.completion_tokens or 0 for s in stats)
+    lines.append(f"Total tokens: {total_in} in, {total_out} out")
+    return "\n".join(lines)
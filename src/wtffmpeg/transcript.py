@@ -2,14 +2,20 @@ from __future__ import annotations
 
 import json
 import textwrap
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
 
+from .preflight import DryRun
+from .telemetry import RequestStats
+
 DEFAULT_TRANSCRIPT_PATH = Path.home() / ".wtffmpeg" / "transcript.jsonl"
 
 # Rotate the on-disk log when it grows past this, keeping the newest lines.
 MAX_BYTES = 512_000
 KEEP_LINES = 200
+# Output kept on the exec record of a command that failed (its last characters).
+EXEC_OUTPUT_CHARS = 4000
 
 
 @dataclass
@@ -17,8 +23,25 @@ class Exchange:
     prompt: str
     raw: str
     commands: list[str] = field(default_factory=list)
+    model: str | None = None  # model that answered
+    profile: str | None = None  # system prompt profile in use
+    ts: float = field(default_factory=time.time)
     executed: bool = False
     exit_code: int | None = None
+    streaming: bool = False  # response still arriving
+    cancelled: bool = False  # generation stopped early (ctrl-c); raw is partial
+    ttfc: float | None = None  # seconds to the first complete command (streaming)
+    backend: str | None = None  # hedged requests: which model/endpoint answered
+    latencies: dict[str, float | None] | None = None  # hedged: per-backend ttfc
+    tokens_in: int | None = None  # estimated prompt tokens sent (context.estimate_tokens)
+    samples: int | None = None  # responses sampled and ranked (candidates mode)
+    stats: RequestStats | None = None  # timing and token usage of the request
+    # what the local ffmpeg doesn't know in the primary command (capabilities.check_command)
+    problems: list[str] = field(default_factory=list)
+    # dry run of the primary command against the null muxer (preflight.dry_run)
+    check: DryRun | None = None
+    # every !command run after this exchange (until the next): (command, exit code)
+    runs: list[tuple[str, int]] = field(default_factory=list)
 
 
 class Transcript:
@@ -51,25 +74,160 @@ class Transcript:
             pass
 
     def add_exchange(
-        self, prompt: str, raw: str, commands: list[str], *, persist: bool = True
+        self,
+        prompt: str,
+        raw: str,
+        commands: list[str],
+        *,
+        persist: bool = True,
+        model: str | None = None,
+        profile: str | None = None,
+        problems: list[str] | None = None,
     ) -> Exchange:
-        ex = Exchange(prompt=prompt, raw=raw, commands=list(commands))
-        self.entries.append(ex)
-        self._write(
-            {"t": "exchange", "prompt": prompt, "raw": raw, "commands": ex.commands},
-            persist,
+        ex = Exchange(
+            prompt=prompt, raw=raw, commands=list(commands), model=model, profile=profile, problems=list(problems or [])
         )
+        self.entries.append(ex)
+        self._write_exchange(ex, persist)
         return ex
 
-    def log_exec(self, command: str, exit_code: int, *, persist: bool = True) -> None:
-        """Record a !command execution; marks the latest exchange it came from."""
+    def begin_exchange(
+        self, prompt: str, *, model: str | None = None, profile: str | None = None
+    ) -> Exchange:
+        """Start an in-memory exchange whose response is still streaming in.
+
+        The caller updates `raw`/`commands` as text arrives and calls
+        finish_exchange() once the response is complete; only then is it logged.
+        """
+        ex = Exchange(prompt=prompt, raw="", streaming=True, model=model, profile=profile)
+        self.entries.append(ex)
+        return ex
+
+    def finish_exchange(
+        self,
+        ex: Exchange,
+        raw: str,
+        commands: list[str],
+        *,
+        persist: bool = True,
+        cancelled: bool = False,
+    ) -> None:
+        ex.raw = raw
+        ex.commands = list(commands)
+        ex.streaming = False
+        ex.cancelled = cancelled
+        self._write_exchange(ex, persist)
+
+    def discard_exchange(self, ex: Exchange) -> None:
+        """Drop an unfinished exchange that produced no response at all."""
+        self.entries = [e for e in self.entries if e is not ex]
+
+    def _write_exchange(self, ex: Exchange, persist: bool) -> None:
+        rec = {"t": "exchange", "ts": round(ex.ts, 3), "prompt": ex.prompt, "raw": ex.raw, "commands": ex.commands}
+        if ex.model is not None:
+            rec["model"] = ex.model
+        if ex.profile is not None:
+            rec["profile"] = ex.profile
+        if ex.ttfc is not None:
+            rec["ttfc"] = round(ex.ttfc, 3)
+        if ex.cancelled:
+            rec["cancelled"] = True
+        if ex.tokens_in is not None:
+            rec["tokens_in"] = ex.tokens_in
+        if ex.samples is not None:
+            rec["samples"] = ex.samples
+        if ex.backend is not None:
+            rec["backend"] = ex.backend
+        if ex.latencies:
+            rec["latencies"] = ex.latencies
+        if ex.stats is not None:
+            rec.update(ex.stats.to_record())
+        if ex.problems:
+            rec["problems"] = ex.problems
+        self._write(rec, persist)
+
+    def log_check(self, command: str, result: DryRun, *, persist: bool = True) -> None:
+        """Record a dry run; attached to the latest exchange if it produced `command`."""
+        cmd = command.strip()
+        if self.entries and cmd in (c.strip() for c in self.entries[-1].commands):
+            self.entries[-1].check = result
+        self._write({"t": "check", "ts": round(time.time(), 3), "command": cmd, **result.to_record()}, persist)
+
+    def log_exec(
+        self,
+        command: str,
+        exit_code: int,
+        *,
+        persist: bool = True,
+        progress: dict | None = None,
+        output: str = "",
+        parallel: dict | None = None,
+        exchange: Exchange | None = None,
+    ) -> None:
+        """Record a !command execution; marks the exchange it came from.
+
+        That is `exchange` if given (a background job's, as of when it was
+        started), else the latest. `progress` is an ffmpeg run's final stats
+        (progress.Progress.to_record()); `parallel` a segment-parallel run's
+        (segments.ParallelResult.to_record()); the tail of `output` is kept
+        only if the command failed.
+        """
         cmd = command.strip()
-        if self.entries:
-            last = self.entries[-1]
+        last = exchange if exchange is not None else (self.entries[-1] if self.entries else None)
+        if last is not None:
+            last.runs.append((cmd, exit_code))
             if not last.executed and cmd in (c.strip() for c in last.commands):
                 last.executed = True
                 last.exit_code = exit_code
-        self._write({"t": "exec", "command": cmd, "exit_code": exit_code}, persist)
+        rec = {"t": "exec", "ts": round(time.time(), 3), "command": cmd, "exit_code": exit_code}
+        if last is not None:
+            rec["exchange"] = round(last.ts, 3)  # the ts of that exchange's record
+        if progress:
+            rec["progress"] = progress
+        if parallel:
+            rec["parallel"] = parallel
+        if exit_code != 0 and output.strip():
+            rec["output"] = output[-EXEC_OUTPUT_CHARS:]
+        self._write(rec, persist)
+
+    def log_map(
+        self,
+        command: str,
+        source: str,
+        outputs: list[str],
+        status: str,
+        *,
+        persist: bool = True,
+        exit_code: int | None = None,
+        seconds: float | None = None,
+        reason: str = "",
+        progress: dict | None = None,
+        output: str = "",
+    ) -> None:
+        """Record one file of a /map: the command run on `source` and how it went.
+
+        `status` is done, failed, killed or skipped (with the `reason`); as
+        with log_exec, the tail of `output` is kept only if it failed.
+        """
+        rec = {
+            "t": "map",
+            "ts": round(time.time(), 3),
+            "command": command.strip(),
+            "input": source,
+            "outputs": list(outputs),
+            "status": status,
+        }
+        if exit_code is not None:
+            rec["exit_code"] = exit_code
+        if seconds is not None:
+            rec["seconds"] = round(seconds, 3)
+        if reason:
+            rec["reason"] = reason
+        if progress:
+            rec["progress"] = progress
+        if status == "failed" and output.strip():
+            rec["output"] = output[-EXEC_OUTPUT_CHARS:]
+        self._write(rec, persist)
 
 
 def build_pane_lines(entries: list[Exchange], width: int) -> list[str]:
@@ -81,7 +239,11 @@ def build_pane_lines(entries: list[Exchange], width: int) -> list[str]:
     width = max(20, width)
     lines: list[str] = []
     for i, ex in enumerate(entries, 1):
-        if ex.executed:
+        if ex.streaming:
+            status = "streaming"
+        elif ex.cancelled:
+            status = "cancelled"
+        elif ex.executed:
             status = "ran" if ex.exit_code is None else f"ran, exit {ex.exit_code}"
         else:
             status = "not run"
@@ -106,7 +268,9 @@ def format_exchange(ex: Exchange, n: int) -> str:
         f"Exchange #{n}",
         f"Prompt: {ex.prompt}",
         "",
-        "Response:",
+        "Response:"
+        + (" (still streaming)" if ex.streaming else "")
+        + (" (cancelled; partial)" if ex.cancelled else ""),
         ex.raw or "(empty)",
         "",
     ]
@@ -115,5 +279,24 @@ def format_exchange(ex: Exchange, n: int) -> str:
         parts.extend(f"  {i}. {c}" for i, c in enumerate(ex.commands, 1))
     else:
         parts.append("Extracted commands: (none)")
+    if ex.problems:
+        parts.append(f"Unknown to the local ffmpeg: {'; '.join(ex.problems)}")
+    if ex.check is not None:
+        parts.append(f"Dry run: {ex.check.describe()}")
     parts.append(f"Executed: {status}")
+    if ex.ttfc is not None:
+        parts.append(f"First command after: {ex.ttfc:.2f}s")
+    if ex.tokens_in is not None:
+        parts.append(f"Prompt size: ~{ex.tokens_in} tokens")
+    if ex.stats is not None:
+        parts.append(f"Timing: {ex.stats.describe()}")
+    if ex.samples is not None:
+        parts.append(f"Ranked from: {ex.samples} sampled responses (commands above, best first)")
+    if ex.backend is not None:
+        parts.append(f"Answered by: {ex.backend}")
+    if ex.latencies:
+        raced = ", ".join(
+            f"{label} {'-' if t is None else f'{t:.2f}s'}" for label, t in ex.latencies.items()
+        )
+        parts.append(f"Raced: {raced}")
     return "\n".join(parts) + "\n"
@@ -0,0 +1,92 @@
+import gzip
+import json
+
+from wtffmpeg import analytics
+from wtffmpeg.cli import stats_main
+from wtffmpeg.transcript import Transcript
+from wtffmpeg.telemetry import RequestStats
+
+
+def _ex(commands, model="m1", profile="minimal", wall=None, **kw):
+    rec = {"t": "exchange", "prompt": "p", "raw": "r", "commands": commands, "model": model, "profile": profile}
+    if wall is not None:
+        rec["wall"] = wall
+    rec.update(kw)
+    return json.dumps(rec)
+
+
+def _exec(cmd, code):
+    return json.dumps({"t": "exec", "command": cmd, "exit_code": code})
+
+
+LINES = [
+    _ex(["ffmpeg -i a b"], wall=1.0, ttft=0.2),
+    _exec("ffmpeg -i a b", 1),
+    _exec("ffmpeg -i a b ", 0),  # a later run that worked
+    _ex(["ffmpeg -i c d", "ffmpeg -i c e"], model="m2", wall=3.0),
+    _exec("ls", 0),  # not a suggested command
+    "{not json",
+    _ex(["ffmpeg -i x y"], cancelled=True),
+    _exec("ffmpeg -i x y", 0),  # belongs to a cancelled exchange: ignored
+    _ex([], model=None, ttfc=0.5),
+]
+
+
+def test_read_matches_runs_to_exchanges():
+    cols = analytics.Columns()
+    cols.read(LINES)
+    assert len(cols) == 3 and cols.skipped == 1
+    assert list(cols.executed) == [1, 0, 0] and list(cols.ok) == [1, 0, 0]
+    assert cols.labels["model"] == ["m1", "m2", analytics.UNKNOWN]
+    assert list(cols.ncmd) == [1, 2, 0]
+    assert cols.ttft[2] == 0.5  # falls back to ttfc
+
+
+def test_exec_records_name_their_exchange(tmp_path):
+    lines = [
+        _ex(["ffmpeg -i a.mov a.mp4"], ts=1.0),
+        _ex(["ffmpeg -i b.mov b.mp4"], ts=2.0),
+        json.dumps({"t": "exec", "command": "ffmpeg -i a.mov a.mp4", "exit_code": 0, "exchange": 1.0}),  # background
+        _exec("ffmpeg -i b.mov b.mp4", 1),  # an older record: the latest exchange
+    ]
+    cols = analytics.Columns()
+    cols.read(lines)
+    assert list(cols.executed) == [1, 1] and list(cols.ok) == [1, 0]
+
+    tr = Transcript(path=tmp_path / "t.jsonl")
+    first = tr.add_exchange("a", "r", ["ffmpeg -i a.mov a.mp4"])
+    tr.add_exchange("b", "r", ["ffmpeg -i b.mov b.mp4"])
+    tr.log_exec("ffmpeg -i a.mov a.mp4", 0, exchange=first)
+    rec = json.loads((tmp_path / "t.jsonl").read_text().splitlines()[-1])
+    assert rec["exchange"] == round(first.ts, 3)
+
+
+def test_summarize_groups_and_histogram():
+    cols = analytics.Columns()
+    cols.read(LINES)
+    s = analytics.summarize(cols)
+    assert (s["exchanges"], s["executed"], s["succeeded"]) == (3, 1, 1)
+    assert s["success_pct"] == 33.3 and s["success_of_executed_pct"] == 100.0
+    assert s["by_model"]["m1"]["wall"] == {"n": 1, "p50": 1.0, "p95": 1.0}
+    assert s["by_model"]["m2"]["ttft"] is None
+    assert s["by_profile"]["minimal"]["exchanges"] == 3
+    assert s["by_profile"]["minimal"]["wall"]["p95"] == 2.9
+    assert s["commands_per_exchange"] == {"mean": 1.0, "histogram": {"0": 1, "1": 1, "2": 1, "3": 0, "4+": 0}}
+    out = analytics.format_summary(s)
+    assert out.startswith("3 exchanges in 1 file(s) (1 unreadable lines skipped)")
+    assert "Succeeded (exit 0): 1 (33.3%" in out
+
+
+def test_stats_reads_directories_and_gzip(tmp_path, capsys):
+    tr = Transcript(path=tmp_path / "a.jsonl")
+    ex = tr.begin_exchange("convert", model="qwen", profile="minimal")
+    ex.stats = RequestStats(wall=2.0, ttft=0.5)
+    tr.finish_exchange(ex, "ffmpeg -i a b", ["ffmpeg -i a b"])
+    tr.log_exec("ffmpeg -i a b", 0)
+    with gzip.open(tmp_path / "old.jsonl.gz", "wt", encoding="utf-8") as f:
+        f.write("\n".join(LINES) + "\n")
+
+    assert stats_main([str(tmp_path), "--json"]) == 0
+    s = json.loads(capsys.readouterr().out)
+    assert s["files"] == 2 and s["exchanges"] == 4 and s["succeeded"] == 2
+    assert s["by_model"]["qwen"]["wall"]["p50"] == 2.0
@@ -0,0 +1,88 @@
+import io
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from wtffmpeg.batch import read_prompts, run_batch
+from wtffmpeg.cli import build_parser
+from wtffmpeg.config import resolve_config
+
+CFG = resolve_config(SimpleNamespace(), config_path=Path("/nonexistent-wtffmpeg-config"))
+
+
+class SlowCompletions:
+    """Answers after `delay(prompt)` seconds; tracks peak concurrency."""
+
+    def __init__(self, delay=lambda p: 0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay(prompt))
+            if prompt == "fail":
+                raise ValueError("boom")
+            content = "Sorry." if prompt == "nothing" else f"ffmpeg -i {prompt}.mov {prompt}.mp4"
+            msg = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=msg)])
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _client(completions):
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def _records(out):
+    return [json.loads(l) for l in out.getvalue().splitlines()]
+
+
+def test_read_prompts_skips_blanks_and_comments():
+    assert read_prompts(["a\n", "\n", "# note\n", "  b  \n"]) == ["a", "b"]
+
+
+def test_batch_runs_concurrently_in_input_order():
+    comp = SlowCompletions(delay=lambda p: 0.2 if p == "p0" else 0.02)
+    out = io.StringIO()
+    prompts = [f"p{i}" for i in range(8)]
+    rc = run_batch(prompts, _client(comp), CFG, out=out, jobs=4)
+    recs = _records(out)
+    assert rc == 0
+    assert [r["prompt"] for r in recs] == prompts
+    assert recs[0]["commands"] == ["ffmpeg -i p0.mov p0.mp4"]
+    assert all(r["error"] is None and r["latency"] >= 0 for r in recs)
+    assert comp.peak == 4
+
+
+def test_batch_completion_order_and_errors():
+    comp = SlowCompletions(delay=lambda p: 0.2 if p == "slow" else 0.0)
+    out = io.StringIO()
+    rc = run_batch(["slow", "fail", "nothing", "ok"], _client(comp), CFG, out=out, jobs=4, order="completion")
+    recs = _records(out)
+    assert rc == 1
+    assert recs[-1]["prompt"] == "slow"
+    by_prompt = {r["prompt"]: r for r in recs}
+    assert by_prompt["fail"]["error"] == "ValueError: boom"
+    assert by_prompt["nothing"]["error"] == "no ffmpeg command in response"
+    assert by_prompt["nothing"]["raw"] == "Sorry."
+
+
+def test_batch_rejects_unknown_order():
+    with pytest.raises(ValueError, match="batch order"):
+        run_batch([], _client(SlowCompletions()), CFG, out=io.StringIO(), order="random")
+
+
+def test_batch_flags():
+    ns = build_parser().parse_args(["--batch", "-", "-j", "8", "--order", "completion"])
+    assert (ns.batch, ns.jobs, ns.order) == ("-", 8, "completion")
+    assert build_parser().parse_args([]).batch is None
@@ -0,0 +1,191 @@
+import os
+import time
+from types import SimpleNamespace
+
+from wtffmpeg import cache as cache_mod
+from wtffmpeg.cache import (
+    ResponseCache,
+    cache_key,
+    fill_template,
+    find_paths,
+    template_text,
+)
+from wtffmpeg.llm import generate_ffmpeg_command, paths_in_command
+
+CFG = SimpleNamespace(
+    model="m", provider="compat", base_url="http://h:1/v1", timeout=60.0, deadline=180.0, retries=0, structured=False,
+    profile_name="null", profile_dir="/nonexistent",
+)
+MSGS = [
+    {"role": "system", "content": "profile text"},
+    {"role": "user", "content": "convert to webm"},
+]
+
+
+def test_cache_key_covers_endpoint_model_profile_and_messages():
+    k = cache_key(CFG, MSGS)
+    assert k == cache_key(CFG, [dict(m) for m in MSGS])
+    assert k != cache_key(SimpleNamespace(**{**vars(CFG), "model": "other"}), MSGS)
+    assert k != cache_key(SimpleNamespace(**{**vars(CFG), "base_url": "http://x/v1"}), MSGS)
+    assert k != cache_key(CFG, [{"role": "system", "content": "edited"}] + MSGS[1:])
+    assert k != cache_key(CFG, MSGS + [{"role": "assistant", "content": "x"}])
+
+
+def test_put_get_roundtrip(tmp_path):
+    c = ResponseCache(tmp_path)
+    assert c.get("ab" * 32) is None
+    c.put("ab" * 32, "ffmpeg -i a b")
+    assert c.get("ab" * 32) == "ffmpeg -i a b"
+    assert c.stats().entries == 1
+    assert ResponseCache(tmp_path).get("ab" * 32) == "ffmpeg -i a b"  # persisted
+
+
+def test_lookup_counts_hits_and_misses(tmp_path):
+    c = ResponseCache(tmp_path)
+    assert c.lookup(CFG, MSGS) is None
+    c.store(CFG, MSGS, "ffmpeg -i a.mp4 a.webm")
+    assert c.lookup(CFG, MSGS) == "ffmpeg -i a.mp4 a.webm"
+    st = c.stats()
+    assert (st.hits, st.misses, st.template_hits) == (1, 1, 0)
+
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    c = ResponseCache(tmp_path, ttl=10)
+    c.put("cd" * 32, "ffmpeg x")
+    now = time.time()
+    monkeypatch.setattr(cache_mod.time, "time", lambda: now + 11)
+    assert c.get("cd" * 32) is None
+    assert c.stats().entries == 0
+
+
+def test_ttl_counts_from_creation_not_last_use(tmp_path, monkeypatch):
+    c = ResponseCache(tmp_path, ttl=10, max_bytes=60)
+    c.put("cd" * 32, "ffmpeg x")
+    now = time.time()
+    monkeypatch.setattr(cache_mod.time, "time", lambda: now + 8)
+    assert c.get("cd" * 32) == "ffmpeg x"  # still 2s to go
+    os.utime(c._path("cd" * 32), (now + 9, now + 9))  # and used again since
+    monkeypatch.setattr(cache_mod.time, "time", lambda: now + 11)
+    c.put("ef" * 32, "x" * 10)  # evicts: the first entry is expired though recently used
+    assert not c._path("cd" * 32).exists()
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    c = ResponseCache(tmp_path, ttl=0, max_bytes=100_000)
+    keys = [f"{i:02x}" * 32 for i in range(6)]
+    for i, k in enumerate(keys):
+        c.put(k, "x" * 300)
+        os.utime(c._path(k), (1000 + i, 1000 + i))
+    os.utime(c._path(keys[0]), (5000, 5000))  # recently used
+    c.max_bytes = 2000
+    c.put("ff" * 32, "x" * 300)
+    left = {p.stem for p in tmp_path.glob("*/*.json")}
+    assert keys[0] in left and "ff" * 32 in left
+    assert keys[1] not in left
+    assert c.stats().bytes <= 2000
+
+
+def test_clear(tmp_path):
+    c = ResponseCache(tmp_path)
+    c.put("aa" * 32, "a")
+    c.put("bb" * 32, "b")
+    assert c.clear() == 2
+    assert c.stats().entries == 0
+
+
+def test_generate_uses_cache(tmp_path):
+    calls = []
+
+    class Completions:
+        def create(self, **kwargs):
+            calls.append(kwargs)
+            msg = SimpleNamespace(content="ffmpeg -i in.mp4 out.webm")
+            return SimpleNamespace(choices=[SimpleNamespace(message=msg)])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=Completions()))
+    c = ResponseCache(tmp_path)
+    first = generate_ffmpeg_command(MSGS, client, CFG, cache=c)
+    second = generate_ffmpeg_command(MSGS, client, CFG, cache=c)
+    assert first == second == ("ffmpeg -i in.mp4 out.webm", "ffmpeg -i in.mp4 out.webm")
+    assert len(calls) == 1 and c.hits == 1
+
+
+def test_responses_without_commands_are_not_cached(tmp_path):
+    class Completions:
+        def create(self, **kwargs):
+            msg = SimpleNamespace(content="I cannot help with that.")
+            return SimpleNamespace(choices=[SimpleNamespace(message=msg)])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=Completions()))
+    c = ResponseCache(tmp_path)
+    generate_ffmpeg_command(MSGS, client, CFG, cache=c)
+    assert c.stats().entries == 0
+
+
+# --- filename templates -----------------------------------------------------
+
+def _proxy_msgs(path):
+    return [MSGS[0], {"role": "user", "content": f"make a 720p proxy of {path}"}]
+
+
+def test_find_paths():
+    text = 'proxy of clips/A001.mov and "my take.wav" in h.264, e.g. at 1.5x, to ~/out.mp4.'
+    assert find_paths([text]) == ["clips/A001.mov", "my take.wav", "~/out.mp4"]
+    assert find_paths(["convert to webm"]) == []
+
+
+def test_template_roundtrip_includes_derived_names():
+    raw = "ffmpeg -i clips/A001.mov -vf scale=-2:720 clips/A001_proxy.mov"
+    t = template_text(raw, ["clips/A001.mov"], stems=True)
+    assert "A001" not in t
+    assert fill_template(t, ["clips/A002.mov"]) == raw.replace("A001", "A002")
+
+
+def test_templated_hit_substitutes_new_paths(tmp_path):
+    c = ResponseCache(tmp_path)
+    raw = "```\nffmpeg -i A001.mov -vf scale=-2:720 A001_proxy.mov\n```"
+    c.store(CFG, _proxy_msgs("A001.mov"), raw)
+    got = c.lookup(CFG, _proxy_msgs("A002.mov"), verify=paths_in_command)
+    assert got == raw.replace("A001", "A002")
+    assert c.template_hits == 1
+    # a different extension is a different task
+    assert c.lookup(CFG, _proxy_msgs("A002.mp4"), verify=paths_in_command) is None
+
+
+def test_media_info_stays_out_of_the_key(tmp_path):
+    def with_info(name, codec):
+        msgs = _proxy_msgs(name)
+        info = f"\n\nMedia info (ffprobe):\n{name}: mov,mp4,m4a,3gp,3g2,mj2, 00:00:{len(codec)}\n  video: {codec}"
+        return msgs[:-1] + [{**msgs[-1], "content": msgs[-1]["content"] + info}]
+
+    c = ResponseCache(tmp_path)
+    c.store(CFG, with_info("A001.mov", "prores"), "ffmpeg -i A001.mov -vf scale=-2:720 A001_proxy.mov")
+    got = c.lookup(CFG, with_info("A002.mov", "h264"), verify=paths_in_command)
+    assert got == "ffmpeg -i A002.mov -vf scale=-2:720 A002_proxy.mov" and c.template_hits == 1
+    assert cache_key(CFG, with_info("A001.mov", "h264")) == cache_key(CFG, _proxy_msgs("A001.mov"))
+
+
+def test_templated_hit_rejected_when_verification_fails(tmp_path):
+    c = ResponseCache(tmp_path)
+    c.store(CFG, _proxy_msgs("A001.mov"), "ffmpeg -i A001.mov out.mp4")
+    assert c.lookup(CFG, _proxy_msgs("A002.mov"), verify=lambda raw, paths: False) is None
+    assert c.misses == 1
+
+
+def test_no_template_when_response_ignores_a_path(tmp_path):
+    c = ResponseCache(tmp_path)
+    c.store(CFG, _proxy_msgs("A001.mov"), "ffmpeg -i input.mov out.mp4")
+    assert c.lookup(CFG, _proxy_msgs("A002.mov")) is None
+
+
+def test_templates_off(tmp_path):
+    c = ResponseCache(tmp_path, templates=False)
+    c.store(CFG, _proxy_msgs("A001.mov"), "ffmpeg -i A001.mov out.mp4")
+    assert c.lookup(CFG, _proxy_msgs("A002.mov")) is None
+
+
+def test_paths_in_command_uses_extracted_args():
+    raw = 'Run:\n```\nffmpeg -i "my take.wav" -c:a libopus take.opus\n```'
+    assert paths_in_command(raw, ["my take.wav"])
+    assert not paths_in_command(raw, ["other.wav"])
+    assert not paths_in_command("no command here A.wav", ["A.wav"])
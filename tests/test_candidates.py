@@ -0,0 +1,137 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from wtffmpeg.candidates import CandidateGeneration, rank_commands, sample_responses, syntax_problems
+from wtffmpeg.telemetry import RequestStats
+
+CFG = SimpleNamespace(model="m", provider="compat", base_url="http://h:1/v1", timeout=60.0, deadline=180.0, retries=0, structured=False, profile_name="null", profile_dir="/nonexistent")
+
+
+def test_syntax_problems():
+    assert syntax_problems("ffmpeg -i in.mov -c:v libx264 out.mp4") == []
+    assert syntax_problems("ffmpeg -i in.mov -f null -") == []
+    assert syntax_problems("ffmpeg -i 'in .mov out.mp4") == ["unbalanced quotes"]
+    assert syntax_problems("ffmpeg -c:v libx264 out.mp4") == ["no -i input"]
+    assert syntax_problems("ffmpeg -i -c:v libx264 out.mp4") == ["-i without a file"]
+    assert syntax_problems("ffmpeg -i in.mov") == ["no output"]
+    assert syntax_problems("ffmpeg -i <input> out.mp4") == ["placeholder left in"]
+
+
+def test_rank_prefers_valid_then_paths_then_agreement():
+    good = "ffmpeg -i clip.mov -vf scale=-2:720 clip_720.mp4"
+    close = "ffmpeg -i clip.mov -vf scale=-2:720 -c:a copy clip_720.mp4"
+    wrong_file = "ffmpeg -i input.mov -vf scale=-2:720 out.mp4"
+    broken = "ffmpeg -i <file> -vf scale=-2:720 clip.mp4"
+    prompt = "make a 720p copy of clip.mov"
+    ranked = rank_commands([[broken], [wrong_file], [good], [close]], prompt)
+    assert ranked == [good, close, wrong_file, broken]
+    # a command two samples agree on beats one that appeared first
+    assert rank_commands([[broken], [close], [good], [good]], prompt)[0] == good
+
+
+class _Stream:
+    """A streamed response: each choice in two chunks (interleaved), then usage."""
+
+    def __init__(self, texts, usage=None):
+        halves = [(k, t[: len(t) // 2]) for k, t in enumerate(texts)]
+        halves += [(k, t[len(t) // 2 :]) for k, t in enumerate(texts)]
+        self.chunks = [
+            SimpleNamespace(choices=[SimpleNamespace(index=k, delta=SimpleNamespace(content=part))], usage=None)
+            for k, part in halves
+        ] + [SimpleNamespace(choices=[], usage=usage)]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def _resp(texts, usage=None):
+    return _Stream(texts, usage)
+
+
+class Completions:
+    """n_mode: 'native' honours n, 'ignore' answers once, 'reject' 400s on n."""
+
+    def __init__(self, n_mode):
+        self.n_mode, self.calls, self.lock = n_mode, [], threading.Lock()
+
+    def create(self, **kw):
+        with self.lock:
+            self.calls.append(kw)
+            i = len(self.calls)
+        n = kw.get("n", 1)
+        if n > 1 and self.n_mode == "reject":
+            resp = httpx.Response(400, request=httpx.Request("POST", "http://x"))
+            raise openai.BadRequestError("n not supported", response=resp, body=None)
+        count = n if self.n_mode == "native" else 1
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5 * count)
+        return _resp([f"ffmpeg -i a.mov out{i}_{k}.mp4" for k in range(count)], usage)
+
+
+def _client(comp):
+    return SimpleNamespace(chat=SimpleNamespace(completions=comp))
+
+
+def test_sample_responses_uses_n_then_falls_back():
+    for mode, calls in (("native", 1), ("ignore", 3), ("reject", 4)):
+        comp = Completions(mode)
+        stats = RequestStats()
+        raws = sample_responses([], _client(comp), CFG, 3, stats=stats)
+        assert len(raws) == 3 and len(comp.calls) == calls, mode
+        assert comp.calls[0]["n"] == 3 and comp.calls[0]["temperature"] > 0
+        assert all("n" not in kw for kw in comp.calls[1:])
+        assert stats.completion_tokens == 15 and not stats.estimated
+
+
+def test_candidate_generation_ranks_and_keeps_best_raw():
+    class Comp:
+        def create(self, **kw):
+            return _resp(
+                [
+                    "Try:\nffmpeg -i <in> out.mp4",
+                    "ffmpeg -i clip.mov clip.mp4\nor\nffmpeg -i clip.mov -c copy clip.mp4",
+                    "ffmpeg -i clip.mov -c copy clip.mp4",
+                ]
+            )
+
+    gen = CandidateGeneration([], _client(Comp()), CFG, n=3, prompt="remux clip.mov to mp4").start()
+    assert gen.wait(5) and gen.error is None
+    assert gen.first_command == "ffmpeg -i clip.mov -c copy clip.mp4"
+    assert gen.commands[-1] == "ffmpeg -i <in> out.mp4"
+    assert gen.raw.startswith("ffmpeg -i clip.mov clip.mp4")  # first response with the winner
+    assert len(gen.samples) == 3 and gen.stats.estimated
+
+
+def test_cancel_closes_the_requests_in_flight():
+    streams, started = [], threading.Barrier(4)
+
+    class Hanging(_Stream):
+        def __iter__(self):
+            started.wait(5)
+            while not self.closed:  # like a socket read that fails once the response is closed
+                threading.Event().wait(0.01)
+            raise openai.APIConnectionError(request=httpx.Request("POST", "http://x"))
+
+    class Comp:
+        def create(self, **kw):
+            assert kw["stream"] is True
+            if kw.get("n", 1) > 1:
+                resp = httpx.Response(400, request=httpx.Request("POST", "http://x"))
+                raise openai.BadRequestError("n not supported", response=resp, body=None)
+            streams.append(Hanging([]))
+            return streams[-1]
+
+    cfg = SimpleNamespace(**{**vars(CFG), "retries": 3})
+    gen = CandidateGeneration([], _client(Comp()), cfg, n=3, prompt="x").start()
+    started.wait(5)
+    gen.cancel()
+    gen._thread.join(5)
+    assert len(streams) == 3 and all(s.closed for s in streams)  # closed, and not retried
+    assert gen.error is None and gen.commands == []
+
@@ -0,0 +1,170 @@
+import json
+import os
+
+from wtffmpeg.capabilities import (
+    CapabilityIndex,
+    build_index,
+    check_command,
+    filter_names,
+    load_index,
+    parse_filters,
+    parse_listing,
+    parse_options,
+)
+from wtffmpeg.transcript import Transcript
+
+HELP = """Hyper fast Audio and Video encoder
+usage: ffmpeg [options] [[infile options] -i infile]... {[outfile options] -o outfile}...
+
+Main options:
+-L                  show license
+-y                  overwrite output files
+-c codec            codec name
+-f fmt              force container format (auto-detected otherwise)
+-i url              input file url
+-map [-]input_file_id[:stream_specifier][,sync_file_id[:stream_s  set input stream mapping
+-accurate_seek      enable/disable accurate seeking with -ss
+-ss time_off        start transcoding at specified time
+-vf filter_graph    alias for -filter:v (apply filters to video streams)
+-af filter_graph    alias for -filter:a (apply filters to audio streams)
+-filter_complex graph_description  create a complex filtergraph
+-pix_fmt format     set pixel format
+
+AVCodecContext AVOptions:
+  -b                 <int64>      E..VA...... set bitrate (in bits/s) (from 0 to I64_MAX) (default 200000)
+  -flags             <flags>      ED.VAS..... (default 0)
+     unaligned                    .D.V....... allow decoders to produce unaligned output
+libx264 AVOptions:
+  -preset            <string>     E..V....... Set the encoding preset (cf. x264 --fullhelp) (default "medium")
+  -crf               <float>      E..V....... Select the quality for constant quality mode (from -1 to FLT_MAX) (default -1)
+  -x264-params       <dictionary> E..V....... Override the x264 configuration using a :-separated list of key=value parameters
+"""
+
+FILTERS = """Filters:
+  T.. = Timeline support
+  .S. = Slice threading
+  A = Audio input/output
+  V = Video input/output
+  | = Source or sink filter
+ ... acompressor       A->A       Audio compressor.
+ TSC scale             V->V       Scale the input video size and/or convert the image format.
+ ... fps               V->V       Force constant framerate.
+ ... concat            N->N       Concatenate audio and video streams.
+ ... testsrc           |->V       Generate test pattern.
+"""
+
+ENCODERS = """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10 (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+"""
+
+DECODERS = """Decoders:
+ V..... = Video
+ ------
+ VFS..D h264                 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10
+"""
+
+MUXERS = """ File formats:
+ D. = Demuxing supported
+ .E = Muxing supported
+ --
+  E mp4             MP4 (MPEG-4 Part 14)
+  E null            raw null video
+ DE matroska,webm   Matroska / WebM
+"""
+
+DEMUXERS = """ File formats:
+ D. = Demuxing supported
+ --
+ D  lavfi           Libavfilter virtual input device
+"""
+
+PIX_FMTS = """Pixel formats:
+I.... = Supported Input  format for conversion
+FLAGS NAME            NB_COMPONENTS BITS_PER_PIXEL BIT_DEPTHS
+-----
+IO... yuv420p                3             12      8-8-8
+IO... yuv444p                3             24      8-8-8
+"""
+
+OUTPUTS = {
+    "-h full": HELP,
+    "-filters": FILTERS,
+    "-encoders": ENCODERS,
+    "-decoders": DECODERS,
+    "-muxers": MUXERS,
+    "-demuxers": DEMUXERS,
+    "-pix_fmts": PIX_FMTS,
+}
+
+
+def fake_run(binary, args):
+    return OUTPUTS[" ".join(args)]
+
+
+def test_parsers():
+    opts = parse_options(HELP)
+    assert {"y", "c", "map", "accurate_seek", "b", "flags", "crf", "x264-params"} <= opts
+    assert "unaligned" not in opts and "I64_MAX" not in opts
+    assert parse_filters(FILTERS) == {"acompressor", "scale", "fps", "concat", "testsrc"}
+    assert parse_listing(ENCODERS) == {"libx264", "aac"}
+    assert parse_listing(MUXERS) == {"mp4", "null", "matroska", "webm"}
+    assert parse_listing(PIX_FMTS) == {"yuv420p", "yuv444p"}
+
+
+def test_filter_names():
+    assert filter_names("scale=-2:720,fps=30") == ["scale", "fps"]
+    assert filter_names("[0:v][1:v]concat=n=2:v=1[v];[v]scale@s=w='min(1280\\,iw)':h=-2[out]") == [
+        "concat",
+        "scale",
+    ]
+    assert filter_names("drawtext=text='a, b; c',fps=10") == ["drawtext", "fps"]
+
+
+def test_check_command_flags_unknown_names():
+    index = build_index("ffmpeg", run=fake_run)
+    good = "ffmpeg -y -i in.mov -vf scale=-2:720 -c:v libx264 -crf 20 -b:a 128k -c:a aac -pix_fmt yuv420p out.mp4"
+    assert check_command(good, index) == []
+    assert check_command("ffmpeg -ss -5 -i a.mp4 -map -0:s -noaccurate_seek -f null -", index) == []
+    bad = (
+        "ffmpeg -i in.mov -vf 'scale=-2:720,sharpenx' -c:v libfdk_x264 -turbo 1 "
+        "-pix_fmt yuv999p -f mkv out.mkv | grep -zzz"
+    )
+    assert check_command(bad, index) == [
+        "filter 'sharpenx'",
+        "codec 'libfdk_x264'",
+        "option -turbo",
+        "pixel format 'yuv999p'",
+        "format 'mkv'",
+    ]
+    assert check_command("ls -zzz", index) == []
+    # a category ffmpeg didn't answer for isn't checked
+    assert check_command("ffmpeg -i a -vf sharpenx b", CapabilityIndex({"options": index.get("options")})) == []
+
+
+def test_index_is_cached_per_binary(tmp_path):
+    binary = tmp_path / "ffmpeg"
+    binary.write_text("v1")
+    path = tmp_path / "capabilities.json"
+    builds = []
+
+    def build(b):
+        builds.append(b)
+        return build_index(b, run=fake_run)
+
+    first = load_index(str(binary), path, build=build)
+    assert load_index(str(binary), path, build=build) == first
+    assert len(builds) == 1 and json.loads(path.read_text())["key"]["size"] == 2
+    os.utime(binary, ns=(0, 10**9))  # upgraded in place
+    assert load_index(str(binary), path, build=build).get("filters") == first.get("filters")
+    assert len(builds) == 2
+    assert load_index(str(tmp_path / "missing"), path, build=build) is None
+
+
+def test_problems_are_recorded(tmp_path):
+    tr = Transcript(path=tmp_path / "t.jsonl")
+    tr.add_exchange("p", "ffmpeg -i a -turbo b", ["ffmpeg -i a -turbo b"], problems=["option -turbo"])
+    assert json.loads((tmp_path / "t.jsonl").read_text())["problems"] == ["option -turbo"]
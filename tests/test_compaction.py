@@ -0,0 +1,108 @@
+from wtffmpeg.compaction import MAX_SUMMARY_ITEMS, compact_messages, condense_reply, has_summary
+from wtffmpeg.context import estimate_tokens, fit_messages
+from wtffmpeg.transcript import Transcript
+
+SYSTEM = {"role": "system", "content": "You write ffmpeg commands."}
+
+
+def _session(n):
+    """n answered turns, with the first command of each run (exit i)."""
+    tr = Transcript(path=None)
+    msgs = [SYSTEM]
+    for i in range(n):
+        cmd = f"ffmpeg -i in{i}.mov out{i}.mp4"
+        msgs += [
+            {"role": "user", "content": f"convert in{i}.mov"},
+            {"role": "assistant", "content": f"Sure:\n{cmd}\nThis converts it."},
+        ]
+        tr.add_exchange(f"convert in{i}.mov", msgs[-1]["content"], [cmd], persist=False)
+        tr.log_exec(cmd + " -y", i, persist=False)
+    return msgs, tr
+
+
+def test_no_compaction_under_limits():
+    msgs, tr = _session(3)
+    assert compact_messages(msgs, tr.entries, keep_turns=2, max_turns=12) is msgs
+
+
+def test_compaction_folds_older_turns_with_runs():
+    msgs, tr = _session(6)
+    out = compact_messages(msgs, tr.entries, keep_turns=2, max_turns=4)
+    assert [m["role"] for m in out].count("system") == 1
+    assert out[0]["content"].startswith(SYSTEM["content"] + "\n\n") and has_summary(out[0])
+    assert out[1:] == msgs[-4:]
+    summary = out[0]["content"]
+    for i in range(4):
+        assert f"Asked: convert in{i}.mov" in summary
+        assert f"Suggested: ffmpeg -i in{i}.mov out{i}.mp4" in summary
+        assert f"Ran: ffmpeg -i in{i}.mov out{i}.mp4 -y -> exit {i}" in summary
+    assert "in4.mov" not in summary
+    # the summary rides in the system message, which trimming always keeps
+    assert fit_messages(out, max_turns=2)[0] == out[0]
+
+
+def test_compaction_extends_existing_summary_and_stays_bounded():
+    msgs, tr = _session(60)
+    out = msgs[:1]
+    for k in range(1, 61):
+        out = compact_messages(out + msgs[2 * k - 1 : 2 * k + 1], tr.entries, keep_turns=2, max_turns=4)
+    assert sum(has_summary(m) for m in out) == 1 and out[0]["content"].count("Summary of earlier") == 1
+    assert out[0]["content"].startswith(SYSTEM["content"])
+    summary = out[0]["content"]
+    assert summary.count("\n- Asked:") == MAX_SUMMARY_ITEMS
+    first_kept = int(out[1]["content"].removeprefix("convert in").removesuffix(".mov"))
+    assert f"convert in{first_kept - 1}.mov" in summary and "convert in0.mov" not in summary
+    assert out[1:] == msgs[2 * first_kept + 1 :]
+
+
+def test_compaction_without_transcript_uses_reply_commands():
+    msgs, _ = _session(3)
+    out = compact_messages(msgs, [], keep_turns=1, max_turns=12, force=True)
+    assert "Suggested: ffmpeg -i in0.mov out0.mp4" in out[0]["content"]
+    assert "Ran:" not in out[0]["content"]
+
+
+def test_repeated_prompts_match_their_own_exchange():
+    tr = Transcript(path=None)
+    msgs = [SYSTEM]
+    for i in range(3):
+        msgs += [{"role": "user", "content": "again"}, {"role": "assistant", "content": f"ffmpeg -i {i}.mov x.mp4"}]
+        tr.add_exchange("again", msgs[-1]["content"], [f"ffmpeg -i {i}.mov x.mp4"], persist=False)
+        tr.log_exec(f"ffmpeg -i {i}.mov x.mp4", 10 + i, persist=False)
+    out = compact_messages(msgs, tr.entries, keep_turns=1, max_turns=12, force=True)
+    assert "exit 10" in out[0]["content"] and "exit 11" in out[0]["content"]
+    assert "exit 12" not in out[0]["content"]
+
+
+def test_media_info_in_the_prompt_still_matches_its_exchange():
+    msgs, tr = _session(3)
+    msgs[1] = {**msgs[1], "content": msgs[1]["content"] + "\n\nMedia info (ffprobe):\nin0.mov: mov, 00:01:00"}
+    out = compact_messages(msgs, tr.entries, keep_turns=1, max_turns=12, force=True)
+    assert "Asked: convert in0.mov\n" in out[0]["content"] and "ffprobe" not in out[0]["content"]
+    assert "Ran: ffmpeg -i in0.mov out0.mp4 -y -> exit 0" in out[0]["content"]
+
+
+CHATTY = """**Sure!** Here's how to convert the file while keeping quality high:
+
+```bash
+ffmpeg -i in.mov -c:v libx264 -crf 20 -c:a aac out.mp4
+```
+
+- `-crf 20` keeps quality close to the source; lower is better.
+- `-c:a aac` re-encodes audio for MP4 compatibility.
+
+If you want it smaller, raise the CRF to 23 or 28. Let me know if you need
+hardware encoding or a different container!
+"""
+
+
+def test_condense_reply_modes():
+    cmd = "ffmpeg -i in.mov -c:v libx264 -crf 20 -c:a aac out.mp4"
+    assert condense_reply(CHATTY, "full") is CHATTY
+    assert condense_reply(CHATTY, "commands") == cmd
+    brief = condense_reply(CHATTY, "brief")
+    assert brief == "# Sure! Here's how to convert the file while keeping quality high\n" + cmd
+    # replies without a command (clarifying questions) are kept whole
+    question = "Which container do you want, MP4 or MKV?"
+    assert condense_reply(question, "commands") == question
+    assert estimate_tokens(CHATTY) > 3 * estimate_tokens(brief)
@@ -229,3 +229,26 @@ def test_save_load_roundtrip_excludes_secrets(tmp_path):
     assert data["model"] == "m1"
     assert data["provider"] == "openai"
     assert "openai_api_key" not in data
+
+
+def test_cache_defaults_off_and_cache_flag(tmp_path):
+    cfg = resolve_config(make_args(), config_path=NOPATH)
+    assert cfg.cache is False and cfg.cache_ttl > 0 and cfg.cache_max_mb > 0
+
+    pa = build_parser().parse_args
+    assert pa([]).cache is None
+    cfg = resolve_config(make_args(cache=pa(["--cache"]).cache), config_path=NOPATH)
+    assert cfg.cache is True
+
+    cf = tmp_path / "config.env"
+    cf.write_text("cache=true\ncache_ttl=60\ncache_max_mb=5\n")
+    cfg = resolve_config(make_args(), config_path=cf)
+    assert (cfg.cache, cfg.cache_ttl, cfg.cache_max_mb) == (True, 60, 5)
+
+
+def test_candidates_clamped():
+    assert resolve_config(make_args(), config_path=NOPATH).candidates == 1
+    cfg = resolve_config(make_args(candidates=99), config_path=NOPATH)
+    assert cfg.candidates == config_mod.MAX_CANDIDATES
+    assert config_mod.apply_overrides(cfg, {"candidates": 0}).candidates == 1
+    assert _coerce_value("candidates", "3") == 3
@@ -0,0 +1,64 @@
+from wtffmpeg.context import (
+    TRUNCATION_MARK,
+    estimate_tokens,
+    fit_messages,
+    messages_tokens,
+    truncate_to_tokens,
+)
+
+SYSTEM = {"role": "system", "content": "You write ffmpeg commands."}
+
+
+def _turn(i, reply="ok"):
+    return [{"role": "user", "content": f"u{i}"}, {"role": "assistant", "content": reply}]
+
+
+def test_estimate_tokens_is_plausible():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("hello world") == 4
+    cmd = "ffmpeg -i in.mov -vf scale=1280:-2 -c:v libx264 -crf 23 out.mp4"
+    # real BPE tokenizers put this around 30 tokens
+    assert 20 <= estimate_tokens(cmd) <= 45
+
+
+def test_fit_messages_respects_turn_limit_and_keeps_pending_user():
+    msgs = [SYSTEM] + _turn(0) + _turn(1) + _turn(2) + [{"role": "user", "content": "next"}]
+    out = fit_messages(msgs, max_turns=2)
+    assert out == [SYSTEM] + _turn(2) + [{"role": "user", "content": "next"}]
+    assert fit_messages(msgs, max_turns=0) == [SYSTEM]
+
+
+def test_fit_messages_drops_oldest_turns_over_budget():
+    msgs = [SYSTEM]
+    for i in range(10):
+        msgs += _turn(i, reply="ffmpeg -i a.mov b.mp4 " * 5)
+    budget = messages_tokens([SYSTEM]) + 3 * messages_tokens(_turn(0, reply="ffmpeg -i a.mov b.mp4 " * 5))
+    out = fit_messages(msgs, max_turns=100, max_tokens=budget)
+    assert out[0] is SYSTEM
+    assert out[1:] == msgs[-6:]
+    assert all(a is b for a, b in zip(out[1:], msgs[-6:]))  # untouched messages are not copied
+    assert messages_tokens(out) <= budget
+
+
+def test_fit_messages_truncates_the_boundary_reply():
+    long_reply = "word " * 2000
+    msgs = [SYSTEM] + _turn(0, reply=long_reply) + _turn(1)
+    budget = messages_tokens([SYSTEM] + _turn(1)) + 200
+    out = fit_messages(msgs, max_turns=100, max_tokens=budget)
+    assert [m["role"] for m in out] == ["system", "user", "assistant", "user", "assistant"]
+    assert out[2]["content"].endswith(TRUNCATION_MARK)
+    assert messages_tokens(out) <= budget
+    assert msgs[2]["content"] == long_reply  # original not modified
+
+
+def test_fit_messages_always_keeps_newest_turn():
+    huge = {"role": "user", "content": "x " * 50000}
+    msgs = [SYSTEM] + _turn(0) + [huge]
+    assert fit_messages(msgs, max_turns=12, max_tokens=100) == [SYSTEM, huge]
+
+
+def test_truncate_to_tokens_bounds():
+    text = "alpha beta gamma delta " * 100
+    out = truncate_to_tokens(text, 50)
+    assert out.startswith("alpha beta") and out.endswith(TRUNCATION_MARK)
+    assert estimate_tokens(out) <= 50
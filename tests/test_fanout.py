@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import sys
+import textwrap
+
+import pytest
+
+from wtffmpeg.fanout import expand_globs, map_output, map_template, plan_map, run_map
+from wtffmpeg.transcript import Transcript
+
+
+def test_map_template_finds_input_and_outputs():
+    t = map_template("ffmpeg -y -i A001.mov -i logo.png -filter_complex overlay -c:v libx264 -crf 23 A001_proxy.mp4")
+    assert t.input_path == "A001.mov" and [t.args[i] for i in t.outputs] == ["A001_proxy.mp4"]
+    t = map_template("ffmpeg -f lavfi -i anullsrc -i 'my clip.mov' -shortest out.mkv -map 0 out.wav")
+    assert t.input_path == "my clip.mov" and [t.args[i] for i in t.outputs] == ["out.mkv", "out.wav"]
+    assert map_template("ffmpeg -i - out.mp4") is None
+    assert map_template("ffmpeg -i a.mov -f null -") is None
+    assert map_template("ffmpeg -i a.mov out.mp4 && ls") is None
+    assert map_template("ffprobe a.mov") is None
+
+
+def test_map_output_names():
+    assert map_output("A001_proxy.mp4", "A001.mov", "clips/B002.mov") == "clips/B002_proxy.mp4"
+    assert map_output("clips/A001.mp4", "clips/A001.mov", "clips/B002.mov") == "clips/B002.mp4"
+    assert map_output("proxies/A001.mp4", "clips/A001.mov", "clips/B002.mov") == "proxies/B002.mp4"
+    assert map_output("out.mp4", "input.mov", "B002.mov") == "B002_out.mp4"
+    assert map_output("frames/A001_%04d.png", "A001.mov", "B002.mov") == "frames/B002_%04d.png"
+
+
+def test_plan_skips_done_clashing_and_own_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("a.mp4", "b.mp4", "b_small.mp4", "c.mp4", "c.mov", "sub/d.mp4"):
+        os.makedirs(os.path.dirname(name) or ".", exist_ok=True)
+        open(name, "w").close()
+    files = expand_globs(["*.mp4", "*.mov", "**/*.mp4"])
+    assert files == ["a.mp4", "b.mp4", "b_small.mp4", "c.mov", "c.mp4", "sub/d.mp4"]
+    run = plan_map(map_template("ffmpeg -i x.mp4 -vf scale=-2:480 x_small.mp4"), files)
+    status = {it.input: it.skip for it in run.items}
+    assert status == {
+        "a.mp4": "",
+        "b.mp4": "output exists",
+        "c.mov": "",
+        "c.mp4": "another file maps to the same output",
+        "sub/d.mp4": "",
+    }
+    assert run.to_run[0].command == "ffmpeg -i a.mp4 -vf scale=-2:480 a_small.mp4"
+    assert run.to_run[-1].outputs == ["sub/d_small.mp4"]
+    run = plan_map(map_template("ffmpeg -i x.mp4 -c copy x.mp4"), ["a.mp4"])
+    assert run.items[0].skip == "output would overwrite the input"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs a POSIX shell and process groups")
+def test_run_map_runs_logs_and_cleans_up_failures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        + textwrap.dedent(
+            """
+            import sys
+            args = sys.argv[1:]
+            src, out = args[args.index("-i") + 1], args[-1]
+            open(out, "w").write(open(src).read().upper())
+            if "bad" in src:
+                print("Invalid data found when processing input", file=sys.stderr)
+                sys.exit(1)
+            """
+        )
+    )
+    ffmpeg.chmod(0o755)
+    for name in ("one", "two", "bad"):
+        (tmp_path / f"{name}.txt").write_text(name)
+    run = plan_map(map_template(f"{ffmpeg} -i one.txt one.out"), expand_globs(["*.txt"]))
+
+    tr = Transcript(path=tmp_path / "t.jsonl")
+
+    def logged(item):
+        job = item.job
+        tr.log_map(item.command, item.input, item.outputs, job.state, exit_code=job.exit_code, output=job.result.output)
+
+    out = io.StringIO()
+    run_map(run, 2, on_result=logged, out=out)
+    assert {it.input: it.status for it in run.items} == {"bad.txt": "failed", "one.txt": "done", "two.txt": "done"}
+    assert (tmp_path / "two.out").read_text() == "TWO" and not (tmp_path / "bad.out").exists()
+    assert out.getvalue() == "failed (1): bad.txt: Invalid data found when processing input\n"
+    assert run.summary().startswith("3 files: 2 done, 1 failed in ")
+
+    recs = {r["input"]: r for r in map(json.loads, (tmp_path / "t.jsonl").read_text().splitlines())}
+    assert recs["bad.txt"]["t"] == "map" and recs["bad.txt"]["status"] == "failed"
+    assert recs["bad.txt"]["exit_code"] == 1 and "Invalid data" in recs["bad.txt"]["output"]
+    assert recs["one.txt"]["outputs"] == ["one.out"] and "output" not in recs["one.txt"]
+
+    again = plan_map(run.template, expand_globs(["*.txt"]))
+    assert [it.input for it in again.to_run] == ["bad.txt"]
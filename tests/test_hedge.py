@@ -0,0 +1,162 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from wtffmpeg.cache import ResponseCache
+from wtffmpeg.config import AppConfig, apply_overrides
+from wtffmpeg.hedge import HedgedGeneration, hedge_backends, hedge_config
+from wtffmpeg.llm import cache_generation
+
+CMD1 = "ffmpeg -i in.mov -c:v libx264 out.mp4"
+CMD2 = "ffmpeg -i in.mov -c:v libx265 out.mkv"
+
+
+def _cfg(**kw):
+    base = dict(
+        model="primary",
+        provider="compat",
+        base_url="http://a:1/v1",
+        openai_api_key=None,
+        bearer_token=None,
+        profile_name="minimal",
+        profile_dir=".",
+        context_turns=12,
+        preload_prompt=None,
+        prompt_once=None,
+        no_nag=True,
+        copy=False,
+    )
+    base.update(kw)
+    return AppConfig(**base)
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class SlowStream:
+    """Yields `pieces` after waiting `delay` seconds (or until closed)."""
+
+    def __init__(self, pieces, delay=0.0):
+        self.pieces, self.delay, self.closed = pieces, delay, False
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        if self._closed.wait(self.delay):
+            return
+        for p in self.pieces:
+            if self.closed:
+                return
+            yield _chunk(p)
+
+    def close(self):
+        self.closed = True
+        self._closed.set()
+
+
+def _client(stream):
+    calls = []
+
+    class Completions:
+        def create(self, **kwargs):
+            calls.append(kwargs["model"])
+            return stream
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=Completions()), calls=calls)
+
+
+def test_hedge_config_off_by_default():
+    assert hedge_config(_cfg()) is None
+    assert hedge_backends(_cfg(), object(), object()) == []
+
+
+def test_hedge_config_model_and_url():
+    h = hedge_config(_cfg(hedge_model="fast"))
+    assert (h.model, h.base_url) == ("fast", "http://a:1/v1")
+    h = hedge_config(_cfg(provider="openai", base_url=None, hedge_url="http://b:2/v1"))
+    assert (h.model, h.provider, h.base_url) == ("primary", "compat", "http://b:2/v1")
+
+
+def test_apply_overrides_normalizes_hedge_url():
+    assert apply_overrides(_cfg(), {"hedge_url": "b:2"}).hedge_url == "http://b:2/v1"
+
+
+def test_hedge_backends_labels_are_distinct():
+    cfg = _cfg(hedge_delay=0.5, hedge_model="primary")
+    labels = [b[0] for b in hedge_backends(cfg, object(), object())]
+    assert labels == ["primary@http://a:1/v1", "primary@http://a:1/v1 (hedge)"]
+
+
+def test_fast_primary_never_starts_hedge():
+    cfg = _cfg(hedge_model="fast")
+    primary, hedge = _client(SlowStream([f"{CMD1}\n"])), _client(SlowStream([f"{CMD2}\n"]))
+    gen = HedgedGeneration([], hedge_backends(cfg, primary, hedge), delay=1.0).start()
+    assert gen.wait(5)
+    assert gen.first_command == CMD1 and gen.backend.startswith("primary")
+    assert hedge.calls == []
+    assert list(gen.latencies) == [gen.backend]
+
+
+def test_hedge_wins_when_primary_stalls():
+    cfg = _cfg(hedge_model="fast")
+    stalled = SlowStream([f"{CMD1}\n"], delay=10)
+    primary, hedge = _client(stalled), _client(SlowStream([f"{CMD2}\n"]))
+    t0 = time.monotonic()
+    gen = HedgedGeneration([], hedge_backends(cfg, primary, hedge), delay=0.1).start()
+    assert gen.wait_first(5) == CMD2
+    assert gen.wait(5)
+    assert time.monotonic() - t0 < 5
+    assert gen.backend.startswith("fast") and gen.cfg.model == "fast"
+    assert stalled.closed  # the loser was cancelled
+    assert gen.commands == [CMD2] and gen.ttfc >= 0.1
+    lat = gen.latencies
+    assert lat[gen.backend] is not None and lat[[k for k in lat if k != gen.backend][0]] is None
+
+
+def test_hedge_answer_is_cached_as_the_hedge_model(tmp_path):
+    cfg = _cfg(hedge_model="fast")
+    primary, hedge = _client(SlowStream([f"{CMD1}\n"], delay=10)), _client(SlowStream([f"{CMD2}\n"]))
+    msgs = [{"role": "user", "content": "convert it"}]
+    gen = HedgedGeneration(msgs, hedge_backends(cfg, primary, hedge), delay=0.1).start()
+    assert gen.wait(5) and gen.backend.startswith("fast")
+    cache = ResponseCache(tmp_path)
+    cache_generation(cache, gen)
+    assert cache.lookup(cfg, msgs) is None
+    assert cache.lookup(gen.cfg, msgs) == gen.raw
+
+
+def test_hedge_starts_early_when_primary_fails():
+    cfg = _cfg(hedge_model="fast")
+
+    class Failing:
+        def create(self, **kwargs):
+            raise RuntimeError("boom")
+
+    primary = SimpleNamespace(chat=SimpleNamespace(completions=Failing()))
+    hedge = _client(SlowStream([f"{CMD2}\n"]))
+    gen = HedgedGeneration([], hedge_backends(cfg, primary, hedge), delay=30).start()
+    assert gen.wait(5)
+    assert gen.first_command == CMD2 and gen.error is None
+
+
+def test_no_command_anywhere_reports_clean_answer():
+    cfg = _cfg(hedge_model="fast")
+    primary, hedge = _client(SlowStream(["no idea"])), _client(SlowStream(["sorry"]))
+    gen = HedgedGeneration([], hedge_backends(cfg, primary, hedge), delay=0).start()
+    assert gen.wait(5)
+    assert gen.first_command == "" and gen.raw in ("no idea", "sorry")
+    assert gen.error is None
+
+
+def test_cancel_stops_every_backend():
+    cfg = _cfg(hedge_model="fast")
+    s1, s2 = SlowStream([f"{CMD1}\n"], delay=10), SlowStream([f"{CMD2}\n"], delay=10)
+    updates = []
+    gen = HedgedGeneration(
+        [], hedge_backends(cfg, _client(s1), _client(s2)), delay=0, on_update=updates.append
+    ).start()
+    time.sleep(0.1)
+    gen.cancel()
+    assert gen.wait(5)
+    assert gen.cancelled and s1.closed and s2.closed
+    assert gen.first_command == "" and updates == []
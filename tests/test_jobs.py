@@ -0,0 +1,92 @@
+import io
+import os
+import sys
+import textwrap
+import threading
+
+import pytest
+
+from wtffmpeg.jobs import JobManager, follow
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="needs a POSIX shell and process groups")
+
+
+def wait(job, timeout=10):
+    assert job.done.wait(timeout), job.describe()
+    return job
+
+
+def test_limit_queues_the_rest_and_reports_exit_codes():
+    finished = []
+    jobs = JobManager(1, on_finish=finished.append)
+    first = jobs.submit("sleep 0.3; echo one")
+    second = jobs.submit("echo two; exit 3")
+    assert (first.state, second.state) == ("running", "queued")
+    assert jobs.summary() == "Jobs: [1] running, 1 queued"
+
+    wait(second)
+    assert first.started < first.finished <= second.started
+    assert [j.id for j in finished] == [1, 2]
+    assert (first.state, first.exit_code, first.result.output) == ("done", 0, "one\n")
+    assert (second.state, second.exit_code) == ("failed", 3)
+    assert second.describe().startswith("[2] failed, exit 3")
+    assert jobs.take_finished() == [first, second] and jobs.take_finished() == []
+    assert jobs.summary() == ""
+
+
+def test_raising_the_limit_starts_queued_jobs():
+    jobs = JobManager(1)
+    a, b = jobs.submit("sleep 5"), jobs.submit("sleep 5")
+    assert b.state == "queued"
+    jobs.set_limit(2)
+    assert b.state == "running"
+    jobs.kill(a), jobs.kill(b)
+    wait(a), wait(b)
+
+
+def test_kill_running_and_queued():
+    jobs = JobManager(1)
+    running = jobs.submit("sleep 30 & wait")  # the whole process group goes
+    queued = jobs.submit("echo never")
+    assert jobs.kill(queued) and queued.state == "killed" and queued.result is None
+    assert jobs.kill(running)
+    wait(running)
+    assert running.state == "killed" and running.finished - running.started < 5
+    assert not jobs.kill(running)
+    assert jobs.running() == [] and jobs.queued() == []
+
+
+def test_background_jobs_get_no_stdin():
+    jobs = JobManager(1)
+    job = wait(jobs.submit("cat; echo eof"))
+    assert job.result.output == "eof\n"
+
+
+def test_ffmpeg_jobs_report_progress_and_can_be_followed(tmp_path):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        + textwrap.dedent(
+            """
+            import os, sys, time
+            args = sys.argv[1:]
+            fd = int(args[args.index("-progress") + 1].split(":")[1])
+            for frame in range(1, 4):
+                print(f"line {frame}", file=sys.stderr, flush=True)
+                os.write(fd, f"frame={frame * 10}\\nout_time_us={frame * 400000}\\nprogress=continue\\n".encode())
+                time.sleep(0.1)
+            os.write(fd, b"progress=end\\n")
+            """
+        )
+    )
+    ffmpeg.chmod(0o755)
+    changes = threading.Event()
+    jobs = JobManager(2, on_change=changes.set)
+    job = jobs.submit(f"{ffmpeg} -i in.mov out.mp4")
+    assert changes.is_set()
+
+    out = io.StringIO()
+    follow(job, out, interval=0.05)
+    assert job.state == "done" and "line 1\n" in out.getvalue() and out.getvalue().endswith("line 3\n")
+    assert (job.progress.frame, job.progress.out_time, job.progress.done) == (30, 1.2, True)
+    assert job.output.attached is None
@@ -1,3 +1,5 @@
+import random
+import threading
 from types import SimpleNamespace
 
 import httpx
@@ -5,9 +7,12 @@ import openai
 import pytest
 
 from wtffmpeg.llm import (
+    StreamedGeneration,
+    StreamExtractor,
     build_client,
     extract_commands,
     generate_ffmpeg_command,
+    limit_kwargs,
     list_models,
     print_models,
 )
@@ -42,8 +47,10 @@ def _status_error(cls, code):
     return cls("err", response=resp, body=None)
 
 
-CFG_COMPAT = SimpleNamespace(model="b-model", provider="compat", base_url="http://h:1/v1")
-CFG_OPENAI = SimpleNamespace(model="gpt-5-mini", provider="openai", base_url=None)
+# no retries, so failure paths don't sleep through backoff
+RETRY = dict(timeout=60.0, deadline=180.0, retries=0, structured=False, profile_name="null", profile_dir="/nonexistent")
+CFG_COMPAT = SimpleNamespace(model="b-model", provider="compat", base_url="http://h:1/v1", **RETRY)
+CFG_OPENAI = SimpleNamespace(model="gpt-5-mini", provider="openai", base_url=None, **RETRY)
 
 
 def test_build_client_openai_requires_key():
@@ -168,3 +175,225 @@ def test_generate_ffmpeg_command_error_paths(capsys, cfg, exc, needle):
     _, err = capsys.readouterr()
     assert (raw, cmd) == ("", "")
     assert needle in err
+
+
+# --- streaming --------------------------------------------------------------
+
+STREAM_SAMPLES = [
+    CMD1,
+    f"Here you go:\n```bash\n{CMD1}\n```\nEnjoy!",
+    f"Option 1:\n```\n{CMD1}\n```\nOr, for H.264:\n```\n{CMD2}\n```",
+    "```\nffmpeg -i in.mp4 \\\n  -c:v libx264 \\\n  out.mp4\n```",
+    "```\nffmpeg -i in.mp4\n-c:v libx264\nout is written\n```",
+    f"assistant: {CMD1}",
+    f"{CMD1}\nAgain:\n```\n{CMD1}\n```\n{CMD2}",
+    "  Assistant:\r\n```sh\r\nffmpeg -i x \\\r\n -y o\r\n```\r\ninline ```ffmpeg -i q r``` text",
+    "I cannot help with that.",
+    "",
+]
+
+
+@pytest.mark.parametrize("raw", STREAM_SAMPLES)
+@pytest.mark.parametrize("size", [1, 2, 5, 1000])
+def test_stream_extractor_matches_extract_commands(raw, size):
+    ex = StreamExtractor()
+    emitted = []
+    for i in range(0, len(raw), size):
+        emitted += ex.feed(raw[i : i + size])
+    emitted += ex.close()
+    assert ex.commands == extract_commands(raw)
+    assert emitted == ex.commands
+
+
+def _split_extract(raw):
+    """The original fence-then-line-splitting extract_commands, as the property-test oracle."""
+    text = raw.strip()
+    if text.lower().startswith("assistant:"):
+        text = text[len("assistant:"):].strip()
+    candidates = []
+
+    def scan(chunk, fenced):
+        joined, pending = [], ""
+        for ln in chunk.splitlines():
+            ln = ln.strip()
+            if ln.endswith("\\"):
+                pending += ln[:-1].rstrip() + " "
+                continue
+            joined.append(pending + ln)
+            pending = ""
+        if pending:
+            joined.append(pending.strip())
+        for ln in joined:
+            ln = ln.strip().strip("`").strip()
+            if ln.startswith("$ "):
+                ln = ln[2:]
+            if ln.lower().startswith("ffmpeg"):
+                candidates.append(ln)
+            elif fenced and candidates and ln.startswith("-") and not ln.startswith("- "):
+                candidates[-1] += " " + ln
+
+    for idx, chunk in enumerate(text.split("```")):
+        if idx % 2 == 1:
+            first, _, rest = chunk.strip().partition("\n")
+            if first.strip().lower() in ("bash", "sh", "shell", "zsh", "console"):
+                chunk = rest
+        scan(chunk, fenced=(idx % 2 == 1))
+    return list(dict.fromkeys(candidates))
+
+
+PIECES = [
+    "ffmpeg -i a.mov b.mp4", "FFmpeg -y -i x y", "$ ffmpeg -i q r", "`ffmpeg -i c d`", "ffmpeg",
+    "-c:v libx264", "  -crf 20", "- a bullet", "-", "Some prose.", "assistant:", "Assistant: ",
+    "```", "```bash", "```sh\n", "bash", "console", "``", "`", " \\", "\\", "$ ",
+    "\n", "\n", "\n", "\r\n", "\r", "\n\n", " ", "\t", "\x85", "\u2028",
+]
+
+
+def test_extractor_matches_split_extractor_on_random_responses():
+    rng = random.Random(17)
+    for _ in range(3000):
+        raw = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 40)))
+        expected = _split_extract(raw)
+        assert extract_commands(raw) == expected, repr(raw)
+        ex, emitted, i = StreamExtractor(), [], 0
+        while i < len(raw):
+            n = rng.randint(1, 8)
+            emitted += ex.feed(raw[i : i + n])
+            i += n
+        emitted += ex.close()
+        assert ex.commands == expected, repr(raw)
+        # emitted once each; a fenced one may pick up stray option lines after it closed
+        assert len(set(emitted)) == len(emitted)
+        assert all(any(c.startswith(e) for c in ex.commands) for e in emitted), repr(raw)
+
+
+def test_stream_extractor_emits_fenced_command_when_it_closes():
+    ex = StreamExtractor()
+    assert ex.feed("Sure:\n```bash\nffmpeg -i a.mov \\\n") == []
+    assert ex.feed("  -c:v libx264\n-crf 20\n") == []  # may still take option lines
+    assert ex.feed("```\nThis re-encodes") == ["ffmpeg -i a.mov -c:v libx264 -crf 20"]
+    assert ex.close() == []
+
+
+def test_stream_extractor_unfenced_command_closes_at_newline():
+    ex = StreamExtractor()
+    assert ex.feed(f"{CMD1}") == []
+    assert ex.feed("\nThat converts it.") == [CMD1]
+
+
+def _chunk(text):
+    delta = SimpleNamespace(content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeStream:
+    def __init__(self, pieces, gate=None):
+        self.pieces, self.gate, self.closed = pieces, gate, False
+
+    def __iter__(self):
+        for i, p in enumerate(self.pieces):
+            if self.gate is not None and i == len(self.pieces) // 2:
+                self.gate.wait(5)
+            if self.closed:
+                return
+            yield _chunk(p)
+
+    def close(self):
+        self.closed = True
+
+
+def _streaming_client(stream):
+    class StreamCompletions:
+        def create(self, **kwargs):
+            assert kwargs["stream"] is True
+            return stream
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=StreamCompletions()))
+
+
+def test_streamed_generation_returns_first_command_before_stream_ends():
+    gate = threading.Event()
+    pieces = ["Try:\n", f"{CMD1}\n", "Because", " reasons.\n", f"{CMD2}\n", "Done."]
+    gen = StreamedGeneration([], _streaming_client(FakeStream(pieces, gate)), CFG_COMPAT).start()
+    assert gen.wait_first(5) == CMD1
+    assert not gen.done and gen.ttfc is not None
+    gate.set()
+    assert gen.wait(5)
+    assert gen.commands == [CMD1, CMD2]
+    assert gen.raw == "".join(pieces)
+    assert gen.error is None
+
+
+def test_streamed_generation_cancel_closes_stream():
+    gate = threading.Event()
+    stream = FakeStream([f"{CMD1}\n", "a", "b", "c"], gate)
+    gen = StreamedGeneration([], _streaming_client(stream), CFG_COMPAT).start()
+    assert gen.wait_first(5) == CMD1
+    gen.cancel()
+    gate.set()
+    assert gen.wait(5)
+    assert stream.closed and gen.cancelled and gen.error is None
+
+
+def test_streamed_generation_records_errors():
+    exc = _status_error(openai.AuthenticationError, 401)
+    gen = StreamedGeneration([], FakeClient(exc=exc), CFG_COMPAT).start()
+    assert gen.wait_first(5) == ""
+    assert gen.done and gen.error is exc
+
+
+def test_streamed_generation_cancel_before_response_arrives():
+    sent = threading.Event()
+    release = threading.Event()
+    stream = FakeStream([f"{CMD1}\n"])
+
+    class BlockingCompletions:
+        def create(self, **kwargs):
+            sent.set()
+            release.wait(5)
+            return stream
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=BlockingCompletions()))
+    updates = []
+    gen = StreamedGeneration([], client, CFG_COMPAT, on_update=updates.append).start()
+    assert sent.wait(5)
+    gen.cancel()
+    release.set()
+    assert gen.wait(5)
+    assert stream.closed and gen.raw == "" and gen.error is None
+    assert updates == []  # no callbacks once cancelled
+
+
+def _limited(tmp_path, header, provider="compat", name="tight"):
+    # profiles are cached by name, so each header gets its own
+    (tmp_path / name).write_text(header + "\nWrite ffmpeg.\n")
+    return SimpleNamespace(model="m", provider=provider, base_url="http://h:1/v1", **{
+        **RETRY, "profile_name": name, "profile_dir": str(tmp_path)})
+
+
+def test_profile_limits_become_request_kwargs(tmp_path):
+    header = '# max_tokens: 300\n# stop: "\\n```"'
+    assert limit_kwargs(_limited(tmp_path, header)) == {"max_tokens": 300, "stop": ["\n```"]}
+    assert limit_kwargs(_limited(tmp_path, header), structured=True) == {"max_tokens": 300}
+    # OpenAI reasoning models: max_completion_tokens, and no stop
+    assert limit_kwargs(_limited(tmp_path, header, "openai")) == {"max_completion_tokens": 300}
+
+    sent = []
+
+    class Completions:
+        def create(self, **kwargs):
+            sent.append(kwargs)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=CMD1))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=Completions()))
+    generate_ffmpeg_command([], client, _limited(tmp_path, "# max_tokens: 50\n# stop: END", name="tighter"))
+    assert sent[0]["max_tokens"] == 50 and sent[0]["stop"] == ["END"]
+
+
+def test_single_command_profile_closes_stream_after_first_command(tmp_path):
+    stream = FakeStream(["Sure:\n", CMD1[:10], CMD1[10:] + "\nAlso", " this:\n", f"{CMD2}\n"])
+    cfg = _limited(tmp_path, "# single_command: true")
+    gen = StreamedGeneration([], _streaming_client(stream), cfg).start()
+    assert gen.wait(5) and gen.error is None
+    assert stream.closed and gen.stopped_early and not gen.cancelled
+    assert gen.commands == [CMD1] and "this" not in gen.raw
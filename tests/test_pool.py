@@ -0,0 +1,148 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from wtffmpeg.config import parse_pool, resolve_config
+from wtffmpeg.pool import EndpointPool
+
+
+def _conn_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://x"))
+
+
+def _status_error(cls, code):
+    resp = httpx.Response(code, request=httpx.Request("POST", "http://x"))
+    return cls("err", response=resp, body=None)
+
+
+class FakeNode:
+    def __init__(self, url):
+        self.url, self.exc, self.calls = url, None, 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = SimpleNamespace(list=self.list)
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.exc:
+            raise self.exc
+        if kwargs.get("stream"):
+            return FakeStream(self.url)
+        return self.url
+
+    def list(self):
+        if self.exc:
+            raise self.exc
+        return []
+
+
+class FakeStream:
+    def __init__(self, url):
+        self.url, self.closed = url, False
+
+    def __iter__(self):
+        yield self.url
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(n=3, check=None):
+    fakes = {}
+
+    def make(url):
+        fakes[url] = FakeNode(url)
+        return fakes[url]
+
+    def default_check(client, url):
+        client.list()
+
+    urls = [f"http://n{i}:1/v1" for i in range(n)]
+    pool = EndpointPool(urls, make, check=check or default_check, interval=0)
+    return pool, [fakes[u] for u in urls]
+
+
+def test_parse_pool_normalizes_and_dedupes():
+    assert parse_pool("a:1, b:2 a:1") == ("http://a:1/v1", "http://b:2/v1")
+    assert parse_pool("") == () and parse_pool(None) == ()
+
+
+def test_resolve_config_pool_implies_compat(tmp_path):
+    args = SimpleNamespace(pool="a:1,b:2", api_key="sk-x")
+    cfg = resolve_config(args, config_path=tmp_path / "none.env")
+    assert cfg.provider == "compat"
+    assert cfg.pool == ("http://a:1/v1", "http://b:2/v1")
+    assert cfg.base_url == "http://a:1/v1"
+
+
+def test_routes_to_least_outstanding():
+    pool, fakes = _pool()
+    streams = [pool.chat.completions.create(model="m", messages=[], stream=True) for _ in range(3)]
+    assert sorted(f.calls for f in fakes) == [1, 1, 1]
+    streams[0].close()
+    first = streams[0]._node.url
+    assert pool.chat.completions.create(model="m", messages=[]) == first
+
+
+def test_ewma_breaks_ties():
+    pool, fakes = _pool(2)
+    pool.nodes[0].ewma, pool.nodes[1].ewma = 2.0, 0.5
+    assert pool.chat.completions.create(model="m", messages=[]) == fakes[1].url
+    assert pool.nodes[1].ewma is not None and pool.nodes[1].ewma < 0.5
+
+
+def test_connection_failure_ejects_and_fails_over():
+    pool, fakes = _pool(2)
+    fakes[0].exc = _conn_error()
+    assert pool.chat.completions.create(model="m", messages=[]) == fakes[1].url
+    assert not pool.nodes[0].healthy and pool.healthy_count() == 1
+    assert all(n.outstanding == 0 for n in pool.nodes)
+    # ejected node is skipped until a health check brings it back
+    pool.nodes[1].ewma = 100.0
+    assert pool.chat.completions.create(model="m", messages=[]) == fakes[1].url
+    fakes[0].exc = None
+    pool.check_all()
+    assert pool.healthy_count() == 2
+
+
+def test_client_errors_do_not_eject():
+    pool, fakes = _pool(2)
+    for f in fakes:
+        f.exc = _status_error(openai.NotFoundError, 404)
+    with pytest.raises(openai.NotFoundError):
+        pool.chat.completions.create(model="m", messages=[])
+    assert pool.healthy_count() == 2
+    assert sum(f.calls for f in fakes) == 1
+
+
+def test_all_nodes_down_raises_last_error():
+    pool, fakes = _pool(2)
+    for f in fakes:
+        f.exc = _status_error(openai.InternalServerError, 503)
+    with pytest.raises(openai.InternalServerError):
+        pool.chat.completions.create(model="m", messages=[])
+    assert pool.healthy_count() == 0
+    # still tried (rather than refused) while everything is marked down
+    with pytest.raises(openai.InternalServerError):
+        pool.chat.completions.create(model="m", messages=[])
+    assert sum(f.calls for f in fakes) == 4
+
+
+def test_stream_release_and_latency():
+    pool, _ = _pool(1)
+    stream = pool.chat.completions.create(model="m", messages=[], stream=True)
+    assert pool.nodes[0].outstanding == 1
+    assert list(stream) == [pool.nodes[0].url]
+    assert pool.nodes[0].outstanding == 0 and pool.nodes[0].ewma is not None
+    stream.close()
+    assert pool.nodes[0].outstanding == 0
+
+
+def test_health_check_records_error():
+    def check(client, url):
+        raise RuntimeError(f"Unable to reach LLM endpoint: {url}") from ConnectionRefusedError("nope")
+
+    pool, _ = _pool(1, check=check)
+    node = pool.check_all()[0]
+    assert not node.healthy and node.last_error == "ConnectionRefusedError: nope"
@@ -0,0 +1,76 @@
+import json
+import subprocess
+import threading
+
+from wtffmpeg.preflight import DryRun, Preflight, dry_run, dry_run_args, reads_only_files
+from wtffmpeg.transcript import Transcript
+
+NULL = ["-frames", "5", "-f", "null", "-"]
+HEAD = ["ffmpeg", "-hide_banner", "-nostdin", "-v", "error"]
+
+
+def test_outputs_become_null():
+    assert dry_run_args("ffmpeg -y -i in.mov -vf scale=-2:720 -c:v libx264 -crf 20 out.mp4") == [
+        *HEAD, "-y", "-i", "in.mov", "-vf", "scale=-2:720", "-c:v", "libx264", "-crf", "20", *NULL
+    ]
+    # each output keeps its own options; files written by -pass/-progress are left out
+    assert dry_run_args(
+        "ffmpeg -i a.mkv -map 0:v -c copy -pass 1 -progress p.txt v.mkv -map 0:a -f mp3 - > a.mp3"
+    ) == [*HEAD, "-i", "a.mkv", "-map", "0:v", "-c", "copy", *NULL, "-map", "0:a", "-f", "mp3", *NULL]
+
+
+def test_what_cannot_be_dry_run():
+    assert dry_run_args("cat x.ts | ffmpeg -i - out.mp4") is None
+    assert dry_run_args("ffmpeg -i - out.mp4") is None
+    assert dry_run_args("for f in *.mov; do ffmpeg -i $f x; done") is None
+    assert dry_run_args("ffmpeg -i in.mov") is None  # no output
+
+
+def test_only_file_inputs_are_dry_run_unasked(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.mov").write_text("")
+    (tmp_path / "logo.png").write_text("")
+    assert reads_only_files("ffmpeg -i a.mov -i logo.png -filter_complex overlay out.mp4")
+    assert not reads_only_files("ffmpeg -i a.mov -i missing.png -filter_complex overlay out.mp4")
+    assert not reads_only_files("ffmpeg -f avfoundation -i 0:0 out.mp4")
+    assert not reads_only_files("ffmpeg -f v4l2 -i /dev/video0 out.mkv")
+    assert not reads_only_files("ffmpeg -i rtsp://cam.local/stream -c copy out.mkv")
+    assert not reads_only_files("ffmpeg -f lavfi -i testsrc -t 5 out.mp4")
+
+
+def test_dry_run_outcomes():
+    def fails(args, timeout):
+        return 1, "[AVFilterGraph] No such filter: 'sharpenx'\nError opening output files: Filter not found\n"
+
+    def hangs(args, timeout):
+        raise subprocess.TimeoutExpired(args, timeout)
+
+    assert dry_run("ffmpeg -i a.mov b.mp4", run=lambda a, t: (0, "")).status == "pass"
+    failed = dry_run("ffmpeg -i a.mov -vf sharpenx b.mp4", run=fails)
+    assert failed.failed and failed.describe().endswith(": Error opening output files: Filter not found")
+    assert dry_run("ffmpeg -i a.mov b.mp4", run=hangs).status == "timeout"
+    assert dry_run("ls -la", run=fails) is None
+
+
+def test_preflight_runs_each_command_once_in_background(tmp_path):
+    release, calls = threading.Event(), []
+
+    def run(args, timeout):
+        calls.append(args)
+        release.wait(5)
+        return 0, ""
+
+    pf = Preflight(run=run)
+    pf.start("ffmpeg -i a.mov b.mp4")
+    assert pf.peek("ffmpeg -i a.mov b.mp4") == (False, None)
+    release.set()
+    result = pf.get("ffmpeg -i a.mov b.mp4 ")
+    assert result.status == "pass" and len(calls) == 1
+    assert pf.peek("ffmpeg -i a.mov b.mp4") == (True, result)
+
+    tr = Transcript(path=tmp_path / "t.jsonl")
+    tr.add_exchange("shrink", "ffmpeg -i a.mov b.mp4", ["ffmpeg -i a.mov b.mp4"])
+    tr.log_check("ffmpeg -i a.mov b.mp4", DryRun("fail", 0.2, "boom"))
+    assert tr.entries[-1].check.failed
+    rec = json.loads((tmp_path / "t.jsonl").read_text().splitlines()[-1])
+    assert rec["t"] == "check" and rec["status"] == "fail" and rec["error"] == "boom"
@@ -0,0 +1,64 @@
+import os
+import threading
+
+from wtffmpeg.probe import ProbeCache, describe, media_summary, with_media_info
+
+INFO = {
+    "format": {"format_name": "mov,mp4,m4a,3gp,3g2,mj2", "duration": "83.450000", "bit_rate": "45200000"},
+    "streams": [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "profile": "High", "width": 1920,
+         "height": 1080, "pix_fmt": "yuv420p", "avg_frame_rate": "30000/1001", "disposition": {"attached_pic": 0}},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "sample_rate": "48000",
+         "channel_layout": "stereo", "bit_rate": "192000", "tags": {"language": "eng"}},
+        {"index": 2, "codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}},
+    ],
+}
+
+
+class FakeProbe:
+    """Answers after every expected call has started, so serial probing would deadlock."""
+
+    def __init__(self, parallel=1):
+        self.calls, self.lock = [], threading.Lock()
+        self.barrier = threading.Barrier(parallel, timeout=5)
+
+    def __call__(self, ffprobe, path):
+        with self.lock:
+            self.calls.append(path)
+        self.barrier.wait()
+        return {"error": "Invalid data found"} if path.endswith(".txt") else INFO
+
+
+def test_describe():
+    assert describe("clip.mov", INFO).splitlines() == [
+        "clip.mov: mov,mp4,m4a,3gp,3g2,mj2, 00:01:23.45, 45200 kb/s",
+        "  #0 video h264 (High) 1920x1080 yuv420p 29.97 fps",
+        "  #1 audio aac 48000 Hz stereo 192 kb/s [eng]",
+        "  #2 video mjpeg cover art",
+    ]
+
+
+def test_probes_run_in_parallel_and_are_memoized_on_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ("a.mov", "b.mp4", "list.txt"):
+        (tmp_path / name).write_bytes(b"x")
+    run = FakeProbe(parallel=3)
+    probes = ProbeCache(tmp_path / "store", "ffprobe", run=run)
+    prompt = "join a.mov and b.mp4 using list.txt into out.mkv"
+    summary = media_summary(prompt, probes)
+    assert sorted(os.path.basename(c) for c in run.calls) == ["a.mov", "b.mp4", "list.txt"]
+    assert summary.startswith("Media info (ffprobe):\na.mov: mov,mp4")
+    assert "b.mp4: " in summary and "list.txt" not in summary and "out.mkv" not in summary
+    assert with_media_info(prompt, probes) == f"{prompt}\n\n{summary}"
+
+    again = ProbeCache(tmp_path / "store", "ffprobe", run=FakeProbe())  # a new session
+    assert media_summary(prompt, again) == summary and again.run.calls == []
+    os.utime(tmp_path / "a.mov", ns=(0, 10**9))  # changed: probed again
+    media_summary(prompt, again)
+    assert [os.path.basename(c) for c in again.run.calls] == ["a.mov"]
+
+
+def test_no_files_no_summary(tmp_path):
+    probes = ProbeCache(tmp_path, "ffprobe", run=FakeProbe())
+    assert with_media_info("convert missing.mov to gif", probes) == "convert missing.mov to gif"
+    assert with_media_info("convert x.mov", None) == "convert x.mov"
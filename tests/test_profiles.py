@@ -0,0 +1,46 @@
+import pytest
+
+from wtffmpeg.profiles import GenerationLimits, load_profile, parse_profile
+
+
+def test_header_sets_limits_and_is_not_prompt_text():
+    text = '# max_tokens: 200\n# stop: ["\\n```", "\\n\\n"]\n# single_command: yes\n\nWrite ffmpeg.\n# not header\n'
+    body, limits = parse_profile(text)
+    assert body == "Write ffmpeg.\n# not header\n"
+    assert limits == GenerationLimits(max_tokens=200, stop=("\n```", "\n\n"), single_command=True)
+    assert limits.describe() == 'max_tokens=200, stop=["\\n```", "\\n\\n"], single_command'
+    assert parse_profile("Plain prompt.") == ("Plain prompt.", GenerationLimits())
+    assert parse_profile("# stop: END\nx")[1].stop == ("END",)
+
+
+def test_only_limit_keys_are_header():
+    heading = "# Role\nYou write ffmpeg commands.\n## Rules\n- one command\n"
+    assert parse_profile(heading) == (heading, GenerationLimits())
+    body, limits = parse_profile("# max_tokens: 64\n# name: tagged\n# Role: expert\nBe brief.\n")
+    assert body == "# name: tagged\n# Role: expert\nBe brief.\n"
+    assert limits == GenerationLimits(max_tokens=64)
+
+
+@pytest.mark.parametrize(
+    "header,needle",
+    [
+        ("# max_tokens: lots", "max_tokens"),
+        ("# max_tokens: 0", "max_tokens"),
+        ("# single_command: maybe", "true or false"),
+        ('# stop: ["a", ""]', "non-empty"),
+        ('# stop: ["a", "b", "c", "d", "e"]', "at most 4"),
+        ('# stop: ["a"', "not valid JSON"),
+    ],
+)
+def test_bad_header_values(header, needle):
+    with pytest.raises(ValueError, match=needle):
+        parse_profile(header + "\nprompt")
+
+
+def test_builtin_and_user_profiles_carry_limits(tmp_path):
+    minimal = load_profile("minimal", tmp_path)
+    assert minimal.limits.single_command and minimal.limits.max_tokens is None
+    assert minimal.text.startswith("You are an expert")
+    (tmp_path / "mine.txt").write_text("# max_tokens: 64\nBe brief.\n")
+    mine = load_profile("mine", tmp_path)
+    assert mine.source == "user" and mine.text == "Be brief.\n" and mine.limits.max_tokens == 64
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from wtffmpeg.progress import Progress, expected_duration, parse_time, progress_command
+
+BLOCK = """frame=1250
+fps=59.62
+stream_0_0_q=28.0
+bitrate=1843.2kbits/s
+total_size=9612345
+out_time_us=41720000
+out_time_ms=41720000
+out_time=00:00:41.720000
+dup_frames=0
+drop_frames=0
+speed=1.99x
+progress=continue
+"""
+
+
+def feed(p, text):
+    ends = 0
+    for line in text.splitlines():
+        key, _, value = line.partition("=")
+        ends += p.update(key, value)
+    return ends
+
+
+def test_parse_time():
+    assert parse_time("00:01:23.45") == pytest.approx(83.45)
+    assert parse_time("1:30") == 90 and parse_time("90") == 90 and parse_time("-5") == -5
+    assert parse_time("500ms") == 0.5 and parse_time("2s") == 2
+    assert parse_time("N/A") is None and parse_time(None) is None
+
+
+def test_progress_blocks():
+    p = Progress(duration=83.44)
+    assert feed(p, "frame=0\nfps=0.00\nout_time_us=N/A\nspeed=N/A\nprogress=continue\n") == 1
+    assert p.speed is None and p.eta is None
+    assert feed(p, BLOCK) == 1
+    assert (p.frame, p.fps, p.speed, p.out_time, p.total_size) == (1250, 59.62, 1.99, 41.72, 9612345)
+    assert p.eta == pytest.approx(20.96, abs=0.01)
+    assert p.status_line() == (
+        "frame 1250  fps 59.6  speed 1.99x  time 00:00:41.72 / 00:01:23.44 (50%)  ETA 00:00:20"
+    )
+    feed(p, "progress=end\n")
+    assert p.done and "ETA" not in p.status_line()
+
+
+def test_progress_command_keeps_the_rest_of_the_line():
+    assert progress_command("ffmpeg -i 'a b.mov' out.mp4 && ls", 5) == (
+        "ffmpeg -progress pipe:5 -nostats -i 'a b.mov' out.mp4 && ls"
+    )
+    assert progress_command("  /opt/bin/ffmpeg -i a b", 7).startswith("  /opt/bin/ffmpeg -progress pipe:7 -nostats -i")
+    assert progress_command("ffprobe a.mov", 5) is None
+
+
+class FakeProbes:
+    def get(self, path):
+        return {"format": {"duration": {"long.mov": "600.0", "short.wav": "30.5"}[os.path.basename(path)]}}
+
+
+def test_expected_duration(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "long.mov").write_bytes(b"x")
+    (tmp_path / "short.wav").write_bytes(b"x")
+    probes = FakeProbes()
+    assert expected_duration("ffmpeg -i long.mov -i short.wav out.mp4", probes) == 600
+    assert expected_duration("ffmpeg -ss 00:08:00 -i long.mov out.mp4", probes) == 120
+    assert expected_duration("ffmpeg -i long.mov -t 10 out.mp4", probes) == 10
+    assert expected_duration("ffmpeg -i missing.mov out.mp4", probes) is None
+    assert expected_duration("ffmpeg -i long.mov out.mp4", None) is None
+
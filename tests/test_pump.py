@@ -0,0 +1,88 @@
+import io
+import json
+import os
+import sys
+import textwrap
+import threading
+
+import pytest
+
+from wtffmpeg.progress import Progress
+from wtffmpeg.pump import OutputPump, TailBuffer, run_shell
+from wtffmpeg.transcript import Transcript
+
+posix = pytest.mark.skipif(os.name != "posix", reason="needs pass_fds and a POSIX shell")
+
+
+def test_tail_buffer_is_bounded():
+    tail = TailBuffer(10)
+    for i in range(1000):
+        tail.append(f"{i};")
+    assert tail.text() == "7;998;999;"
+    assert len(tail._chunks) <= 6
+    tail.append("x" * 50)
+    assert tail.text() == "x" * 10
+
+
+def test_pump_decodes_split_characters_and_batches():
+    r, w = os.pipe()
+    pump = OutputPump(os.fdopen(r, "rb", buffering=0)).start()
+    data = ("é€ line\n" * 2000).encode()
+    os.write(w, data[:1])  # the first byte of 'é' alone
+    os.write(w, data[1:])
+    os.close(w)
+    batches = list(pump.batches(interval=0.2))
+    assert "".join(batches) == data.decode()
+    assert len(batches) <= 3 and pump.tail.text() == data.decode()[-len(pump.tail.text()) :]
+
+
+def test_pump_drops_output_a_slow_consumer_cannot_keep_up_with():
+    r, w = os.pipe()
+    pump = OutputPump(os.fdopen(r, "rb", buffering=0), tail=100, max_pending=1000).start()
+    writer = threading.Thread(target=lambda: [os.write(w, b"x" * 100 + b"\n") for _ in range(500)] and os.close(w))
+    writer.start()
+    writer.join()  # never blocked: the pump kept reading with nobody consuming
+    pump.join(5)
+    out = "".join(pump.batches())
+    assert pump.skipped > 0 and f"[... {pump.skipped} characters of output not shown ...]" in out
+    assert len(out) < 1200 and len(pump.tail.text()) == 100
+
+
+@posix
+def test_run_shell_keeps_the_tail():
+    result = run_shell("for i in $(seq 1 3000); do echo line $i; done; exit 2", out=io.StringIO())
+    assert result.exit_code == 2 and result.progress is None
+    assert result.output.endswith("line 2999\nline 3000\n") and len(result.output) <= 16 * 1024
+
+
+@posix
+def test_run_shell_reads_the_progress_pipe(tmp_path):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(
+        f"#!{sys.executable}\n"
+        + textwrap.dedent(
+            """
+            import os, sys
+            args = sys.argv[1:]
+            fd = int(args[args.index("-progress") + 1].split(":")[1])
+            assert "-nostats" in args
+            print("warning on stderr", file=sys.stderr, flush=True)
+            for frame in (10, 20):
+                os.write(fd, f"frame={frame}\\nfps=25.0\\nout_time_us={frame * 40000}\\nspeed=2.0x\\nprogress=continue\\n".encode())
+            os.write(fd, b"total_size=1000\\nprogress=end\\n")
+            sys.exit(3)
+            """
+        )
+    )
+    ffmpeg.chmod(0o755)
+    out = io.StringIO()
+    result = run_shell(f"{ffmpeg} -i in.mov out.mp4", progress=Progress(duration=1.0), out=out)
+    p = result.progress
+    assert result.exit_code == 3 and out.getvalue() == "warning on stderr\n"  # no status line off a terminal
+    assert (p.frame, p.out_time, p.total_size, p.done) == (20, 0.8, 1000, True)
+
+    tr = Transcript(path=tmp_path / "t.jsonl")
+    tr.log_exec("ffmpeg -i in.mov out.mp4", 3, progress=p.to_record(), output=result.output)
+    rec = json.loads((tmp_path / "t.jsonl").read_text())
+    assert rec["progress"]["frames"] == 20 and rec["progress"]["complete"]
+    assert rec["output"] == "warning on stderr\n"
@@ -0,0 +1,199 @@
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from wtffmpeg.llm import StreamedGeneration, request_completion
+from wtffmpeg.resilience import (
+    Attempts,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    backoff_delay,
+    call_with_retries,
+    is_transient,
+)
+
+CMD = "ffmpeg -i in.mov out.mp4"
+
+
+def _cfg(**kw):
+    base = dict(model="m", provider="compat", base_url="http://h:1/v1", timeout=5.0, deadline=30.0, retries=2, structured=False,
+                profile_name="null", profile_dir="/nonexistent")
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+def _conn_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://x"))
+
+
+def _status_error(cls, code):
+    resp = httpx.Response(code, request=httpx.Request("POST", "http://x"))
+    return cls("err", response=resp, body=None)
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_is_transient():
+    assert is_transient(_conn_error())
+    assert is_transient(_status_error(openai.InternalServerError, 503))
+    assert is_transient(_status_error(openai.RateLimitError, 429))
+    assert not is_transient(_status_error(openai.NotFoundError, 404))
+    assert not is_transient(ValueError("x"))
+
+
+def test_backoff_is_jittered_and_capped():
+    assert backoff_delay(1, rng=lambda: 1.0) == 0.5
+    assert backoff_delay(3, rng=lambda: 1.0) == 2.0
+    assert backoff_delay(30, rng=lambda: 1.0) == 8.0
+    assert backoff_delay(3, rng=lambda: 0.25) == 0.5
+
+
+def test_attempt_timeout_is_capped_by_deadline():
+    clock = Clock()
+    att = Attempts(_cfg(timeout=5.0, deadline=7.0), clock=clock)
+    assert att.request_kwargs() == {"timeout": 5.0}
+    clock.t = 4.0
+    assert att.request_kwargs() == {"timeout": 3.0}
+    assert Attempts(_cfg(timeout=0, deadline=0)).request_kwargs() == {}
+
+
+def test_call_with_retries_recovers_from_transient_errors():
+    errors = [_conn_error(), _status_error(openai.InternalServerError, 502)]
+    sleeps, seen = [], []
+
+    def fn(kw):
+        seen.append(kw)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    breaker = CircuitBreaker(threshold=5)
+    assert call_with_retries(fn, _cfg(), breaker=breaker, sleep=sleeps.append) == "ok"
+    assert len(seen) == 3 and len(sleeps) == 2
+    assert all(kw["timeout"] <= 5.0 for kw in seen)
+    assert breaker.state == "closed"
+
+
+def test_call_with_retries_gives_up():
+    calls = []
+
+    def fn(kw):
+        calls.append(1)
+        raise _conn_error()
+
+    with pytest.raises(openai.APIConnectionError):
+        call_with_retries(fn, _cfg(retries=2), sleep=lambda d: None)
+    assert len(calls) == 3
+
+    calls.clear()
+
+    def bad(kw):
+        calls.append(1)
+        raise _status_error(openai.NotFoundError, 404)
+
+    with pytest.raises(openai.NotFoundError):
+        call_with_retries(bad, _cfg(), sleep=lambda d: None)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    clock = Clock()
+    b = CircuitBreaker(threshold=2, cooldown=10, clock=clock)
+    b.record_failure(_status_error(openai.NotFoundError, 404))  # not an endpoint fault
+    assert b.state == "closed"
+    b.record_failure(_conn_error())
+    assert b.state == "degraded"
+    b.record_failure(_conn_error())
+    assert b.state == "open"
+    with pytest.raises(CircuitOpenError):
+        b.check()
+    clock.t = 11
+    assert b.state == "half-open"
+    b.check()
+    b.record_failure(_conn_error())  # trial failed: straight back to open
+    assert b.state == "open"
+    clock.t = 22
+    b.record_success()
+    assert b.state == "closed" and b.failures == 0
+
+
+def test_open_breaker_skips_the_request():
+    b = CircuitBreaker(threshold=1)
+    b.record_failure(_conn_error())
+
+    class Never:
+        def create(self, **kw):
+            raise AssertionError("should not be called")
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=Never()))
+    with pytest.raises(CircuitOpenError):
+        request_completion([], client, _cfg(), breaker=b)
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class ScriptedCompletions:
+    """Each create() pops the next item: an exception to raise or a list of chunks."""
+
+    def __init__(self, script):
+        self.script, self.calls = list(script), []
+
+    def create(self, **kw):
+        self.calls.append(kw)
+        item = self.script.pop(0)
+        if isinstance(item, BaseException):
+            raise item
+        return _Stream(item)
+
+
+class _Stream:
+    def __init__(self, items):
+        self.items = items
+
+    def __iter__(self):
+        for it in self.items:
+            if isinstance(it, BaseException):
+                raise it
+            yield _chunk(it)
+
+    def close(self):
+        pass
+
+
+def test_streamed_generation_retries_before_output(monkeypatch):
+    monkeypatch.setattr("wtffmpeg.resilience.BACKOFF_BASE", 0.01)
+    comp = ScriptedCompletions([_conn_error(), [f"{CMD}\n"]])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=comp))
+    gen = StreamedGeneration([], client, _cfg(), breaker=CircuitBreaker()).start()
+    assert gen.wait(5)
+    assert gen.error is None and gen.first_command == CMD
+    assert gen.attempts == 1 and "timeout" in comp.calls[0]
+    assert gen.breaker.state == "closed"
+
+
+def test_streamed_generation_does_not_retry_after_output():
+    comp = ScriptedCompletions([["Sure: ", _conn_error()], [f"{CMD}\n"]])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=comp))
+    gen = StreamedGeneration([], client, _cfg()).start()
+    assert gen.wait(5)
+    assert isinstance(gen.error, openai.APIConnectionError)
+    assert gen.raw == "Sure:" and len(comp.calls) == 1
+
+
+def test_streamed_generation_enforces_deadline():
+    comp = ScriptedCompletions([["a", "b", "c"]])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=comp))
+    gen = StreamedGeneration([], client, _cfg(deadline=1e-9)).start()
+    assert gen.wait(5)
+    assert isinstance(gen.error, DeadlineExceeded)
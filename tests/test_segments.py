@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import sys
+import textwrap
+
+import pytest
+
+from wtffmpeg.segments import encode_parallel, filter_names, segment_count, split_points, split_problem, verify
+
+# Media files here are JSON: {"duration": seconds, "streams": [codec types]}.
+FAKE_FFMPEG = """
+import json, os, sys
+args = sys.argv[1:]
+def opt(name):
+    return args[args.index(name) + 1]
+def load(path):
+    return json.load(open(path))
+def mapped(streams):
+    # -map 0 keeps everything; -map 0:v / 0:a / 0:s keep that type
+    kinds = {"v": "video", "a": "audio", "s": "subtitle"}
+    maps = [args[i + 1] for i, a in enumerate(args) if a == "-map"]
+    if not maps or "0" in maps:
+        return streams
+    return [s for s in streams if any(kinds.get(m.split(":")[1]) == s for m in maps)]
+if "segment" in args:
+    src = load(opt("-i"))
+    cuts = [0.0, *map(float, opt("-segment_times").split(",")), src["duration"]]
+    for k in range(len(cuts) - 1):
+        json.dump({"duration": cuts[k + 1] - cuts[k], "streams": ["video"]}, open(args[-1] % k, "w"))
+elif "concat" in args:
+    listing = opt("-i")
+    parts = [ln.split("'")[1] for ln in open(listing)]
+    total = sum(load(os.path.join(os.path.dirname(listing), p))["duration"] for p in parts)
+    rest = load(args[args.index("-i", args.index("-i") + 1) + 1])["streams"] if args.count("-i") > 1 else []
+    json.dump({"duration": total + float(os.environ.get("FAKE_DRIFT", 0)), "streams": ["video", *rest]}, open(args[-1], "w"))
+else:
+    src = load(opt("-i"))
+    assert "-map" not in args or "-vn" in args, args
+    if "-vn" in args:
+        kept = [s for s in mapped(src["streams"]) if s != "video"]
+        if not kept:
+            sys.exit("Output file does not contain any stream")
+        json.dump({"duration": src["duration"], "streams": kept}, open(args[-1], "w"))
+    else:
+        assert "-an" in args and "libx264" in args and "faststart" not in " ".join(args), args
+        json.dump({"duration": src["duration"], "streams": ["video"]}, open(args[-1], "w"))
+"""
+
+
+def fake_probe(path):
+    try:
+        media = json.load(open(path))
+    except (OSError, ValueError) as e:
+        return {"error": str(e)}
+    return {"format": {"duration": str(media["duration"])}, "streams": [{"codec_type": t} for t in media["streams"]]}
+
+
+def test_split_problem():
+    assert split_problem("ffmpeg -y -i in.mov -c:v libx264 -crf 20 -c:a copy out.mp4") == ""
+    assert split_problem("ffmpeg -i in.mov -i logo.png -filter_complex overlay out.mp4") == "more than one input"
+    assert split_problem("ffmpeg -ss 10 -i in.mov -t 30 out.mp4") == "uses -ss, -t"
+    assert split_problem("ffmpeg -i in.mov out.mp4 out.wav").startswith("more than one output")
+    assert split_problem("ffmpeg -i in.mov -f null -").startswith("not a plain ffmpeg command")
+
+
+def test_split_problem_time_dependent_filters():
+    assert split_problem("ffmpeg -i in.mov -vf scale=-2:720,format=yuv420p -af aresample=48000 out.mp4") == ""
+    assert split_problem("ffmpeg -i in.mov -vf subtitles=in.srt out.mp4") == (
+        "-vf uses subtitles, which may depend on the time in the file"
+    )
+    assert split_problem("ffmpeg -i in.mov -vf fade=t=in:st=0:d=2 out.mp4").startswith("-vf uses fade")
+    assert split_problem("ffmpeg -i in.mov -filter:v 'crop=iw/2:ih:0:0, setpts=0.5*PTS' out.mp4").startswith(
+        "-filter:v uses setpts"
+    )
+    assert split_problem("ffmpeg -i in.mov -af atempo=2 out.mp4").startswith("-af uses atempo")
+    assert filter_names("[in]scale=w='min(1280,iw)':h=-2[s];[s]drawtext=text='a,b'") == ["scale", "drawtext"]
+
+
+def test_split_points_and_count():
+    assert split_points(100.0, 4) == [25.0, 50.0, 75.0]
+    assert segment_count(3600, 16) == 16 and segment_count(95, 16) == 3 and segment_count(20, 16) == 1
+
+
+def test_verify():
+    src = {"format": {"duration": "600.0"}, "streams": [{"codec_type": "audio"}, {"codec_type": "video"}]}
+    out = {"format": {"duration": "600.4"}, "streams": [{"codec_type": "video"}, {"codec_type": "audio"}]}
+    assert verify(src, out, ["video", "audio"]) == []
+    short = {"format": {"duration": "598.9"}, "streams": [{"codec_type": "video"}]}
+    assert verify(src, short, ["video", "audio"]) == [
+        "duration 00:09:58.90 but the input is 00:10:00.00",
+        "streams video; expected audio, video",
+    ]
+    assert verify(src, {"error": "Invalid data"}, ["video"]) == ["ffprobe can't read the output: Invalid data"]
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(f"#!{sys.executable}\n" + textwrap.dedent(FAKE_FFMPEG))
+    ffmpeg.chmod(0o755)
+    return ffmpeg
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs a POSIX shell and process groups")
+def test_encode_parallel_splits_encodes_joins_and_verifies(fake_ffmpeg, tmp_path, monkeypatch):
+    (tmp_path / "in.mov").write_text(json.dumps({"duration": 300.0, "streams": ["video", "audio", "subtitle"]}))
+    cmd = f"{fake_ffmpeg} -i in.mov -map 0 -c:v libx264 -crf 20 -c:a aac -movflags +faststart out.mp4"
+    result = encode_parallel(cmd, 4, probe=fake_probe, out=io.StringIO())
+    assert (result.status, result.segments) == ("done", 4), result.describe()
+    assert json.load(open("out.mp4")) == {"duration": 300.0, "streams": ["video", "audio", "subtitle"]}
+    assert not [p for p in os.listdir(tmp_path) if p.startswith(".wtff-parallel-")]
+
+    monkeypatch.setenv("FAKE_DRIFT", "-2")
+    result = encode_parallel(cmd.replace("-i", "-y -i"), 4, probe=fake_probe, out=io.StringIO())
+    assert result.status == "unverified" and result.problems == ["duration 00:04:58.00 but the input is 00:05:00.00"]
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs a POSIX shell and process groups")
+def test_encode_parallel_video_only_short_and_existing(fake_ffmpeg, tmp_path):
+    (tmp_path / "in.mov").write_text(json.dumps({"duration": 120.0, "streams": ["video"]}))
+    (tmp_path / "clip.mov").write_text(json.dumps({"duration": 40.0, "streams": ["video"]}))
+    cmd = f"{fake_ffmpeg} -i in.mov -c:v libx264 out.mkv"
+    result = encode_parallel(cmd, 8, probe=fake_probe, out=io.StringIO())
+    assert (result.status, result.segments) == ("done", 4)
+    assert encode_parallel(cmd, 8, probe=fake_probe).error == "out.mkv exists (add -y to overwrite it)."
+    assert encode_parallel(cmd.replace("in.mov", "clip.mov"), 8, probe=fake_probe).status == "skipped"
+
+
+@pytest.mark.skipif(os.name != "posix", reason="needs a POSIX shell and process groups")
+def test_encode_parallel_maps_that_drop_the_audio(fake_ffmpeg, tmp_path):
+    (tmp_path / "in.mov").write_text(json.dumps({"duration": 120.0, "streams": ["video", "audio"]}))
+    cmd = f"{fake_ffmpeg} -i in.mov -map 0:v -c:v libx264 out.mkv"
+    result = encode_parallel(cmd, 4, probe=fake_probe, out=io.StringIO())
+    assert (result.status, result.segments) == ("done", 4), result.describe()
+    assert json.load(open("out.mkv")) == {"duration": 120.0, "streams": ["video"]}
@@ -0,0 +1,128 @@
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from wtffmpeg import structured
+from wtffmpeg.compaction import condense_reply
+from wtffmpeg.llm import JsonStreamExtractor, StreamedGeneration, extract_commands, request_completion
+from wtffmpeg.structured import parse_response, partial_commands
+
+CFG = SimpleNamespace(
+    model="m", provider="compat", base_url="http://h:1/v1", timeout=60.0, deadline=180.0, retries=0, structured=True,
+    profile_name="null", profile_dir="/nonexistent",
+)
+REPLY = json.dumps(
+    {"commands": ["ffmpeg -i a.mov \\\n  -c copy b.mp4", "ffmpeg -i a.mov b.webm", "ls -la"], "notes": "Remux, no re-encode."}
+)
+CMDS = ["ffmpeg -i a.mov -c copy b.mp4", "ffmpeg -i a.mov b.webm"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_rejections(monkeypatch):
+    monkeypatch.setattr(structured, "_rejected", set())
+
+
+def test_parse_response():
+    assert parse_response(REPLY) == (CMDS, "Remux, no re-encode.")
+    assert parse_response(f"```json\n{REPLY}\n```") == (CMDS, "Remux, no re-encode.")
+    assert parse_response("ffmpeg -i a b") is None
+    assert parse_response('{"commands": "nope"}') is None
+    assert parse_response('{"commands": ["ffmpeg -i a b"') is None
+    assert extract_commands(REPLY) == CMDS
+
+
+def test_partial_commands_and_stream_extractor_agree():
+    cut = REPLY.index("b.webm")
+    assert partial_commands(REPLY[:cut]) == CMDS[:1]
+    for text in (REPLY, f"```json\n{REPLY}\n```", "Sure:\n```bash\nffmpeg -i a b\n```\n", REPLY[:cut]):
+        ex, closed = JsonStreamExtractor(), []
+        for i in range(0, len(text), 5):
+            closed += ex.feed(text[i : i + 5])
+        closed += ex.close()
+        assert closed == ex.commands
+        if text != REPLY[:cut]:
+            assert ex.commands == extract_commands(text)
+    assert ex.commands == CMDS[:1]  # truncated JSON keeps the complete commands
+
+
+def test_long_reply_in_small_chunks():
+    cmds = [f"ffmpeg -i part{i}.mov -c:v libx264 -crf 20 part{i}.mp4" for i in range(2000)]
+    text = json.dumps({"notes": "One per part.", "commands": cmds})
+    ex, closed = JsonStreamExtractor(), []
+    for i in range(0, len(text), 3):
+        closed += ex.feed(text[i : i + 3])
+    assert closed == cmds and ex.close() == [] and ex.commands == cmds
+
+
+def _bad_request(message="response_format not supported", body=None):
+    resp = httpx.Response(400, request=httpx.Request("POST", "http://x"))
+    return openai.BadRequestError(message, response=resp, body=body)
+
+
+class Completions:
+    def __init__(self, reject_schema=False, text=REPLY, error=None):
+        self.calls, self.reject_schema, self.text = [], reject_schema, text
+        self.error = error or _bad_request()
+
+    def create(self, **kw):
+        self.calls.append(kw)
+        if "response_format" in kw and self.reject_schema:
+            raise self.error
+        text = self.text if "response_format" in kw else "Here:\nffmpeg -i a.mov b.mp4\n"
+        if kw.get("stream"):
+            return iter(
+                [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i : i + 7]))])
+                 for i in range(0, len(text), 7)]
+            )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+
+def _client(comp):
+    return SimpleNamespace(chat=SimpleNamespace(completions=comp))
+
+
+def test_request_sends_schema_and_instruction():
+    comp = Completions()
+    system = [{"role": "system", "content": "You write ffmpeg."}, {"role": "user", "content": "remux"}]
+    raw = request_completion(system, _client(comp), CFG)
+    kw = comp.calls[0]
+    assert kw["response_format"]["json_schema"]["schema"] == structured.SCHEMA
+    assert kw["messages"][0]["content"].startswith("You write ffmpeg.") and '"commands"' in kw["messages"][0]["content"]
+    assert system[0]["content"] == "You write ffmpeg."  # caller's messages untouched
+    assert extract_commands(raw) == CMDS
+
+
+def test_rejected_schema_falls_back_to_text_for_the_session():
+    comp = Completions(reject_schema=True)
+    raw = request_completion([], _client(comp), CFG)
+    assert extract_commands(raw) == ["ffmpeg -i a.mov b.mp4"]
+    assert ["response_format" in kw for kw in comp.calls] == [True, False]
+    gen = StreamedGeneration([], _client(comp), CFG).start()
+    assert gen.wait(5) and gen.error is None
+    assert "response_format" not in comp.calls[-1] and gen.commands == ["ffmpeg -i a.mov b.mp4"]
+    other = SimpleNamespace(**{**vars(CFG), "base_url": "http://other:1/v1"})
+    request_completion([], _client(Completions()), other)
+    assert structured.structured_enabled(other)  # only that server
+
+
+def test_other_bad_requests_are_not_schema_rejections():
+    body = {"error": {"message": "Unsupported value: 'response_format' does not support json_schema"}}
+    assert structured.is_rejection(_bad_request("Error code: 400", body))
+    comp = Completions(reject_schema=True, error=_bad_request("maximum context length exceeded"))
+    with pytest.raises(openai.BadRequestError):
+        request_completion([], _client(comp), CFG)
+    assert len(comp.calls) == 1 and structured.structured_enabled(CFG)
+
+
+def test_streamed_structured_reply():
+    comp = Completions()
+    gen = StreamedGeneration([], _client(comp), CFG).start()
+    assert gen.wait(5) and gen.error is None
+    assert gen.first_command == CMDS[0] and gen.commands == CMDS
+
+
+def test_condensed_structured_reply_uses_notes():
+    assert condense_reply(REPLY, "brief") == "# Remux, no re-encode.\n" + "\n".join(CMDS)
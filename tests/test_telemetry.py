@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from wtffmpeg.llm import StreamedGeneration, request_completion
+from wtffmpeg.telemetry import RequestStats, format_stats, percentile, summarize
+from wtffmpeg.transcript import Transcript, format_exchange
+
+CMD = "ffmpeg -i in.mov out.mp4"
+CFG = SimpleNamespace(model="m", provider="compat", base_url="http://h:1/v1", timeout=60.0, deadline=180.0, retries=0, structured=False, profile_name="null", profile_dir="/nonexistent")
+
+
+def test_percentile_interpolates():
+    xs = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert percentile(xs, 50) == 3.0
+    assert percentile(xs, 95) == pytest.approx(4.8)
+    assert percentile([7.0], 95) == 7.0
+    with pytest.raises(ValueError):
+        percentile([], 50)
+
+
+def test_rates():
+    s = RequestStats(wall=3.0, ttft=1.0, prompt_tokens=500, completion_tokens=100)
+    assert s.tokens_per_s == 50.0  # decode time only
+    assert s.prefill_per_s == 500.0
+    assert RequestStats(wall=2.0, completion_tokens=100).tokens_per_s == 50.0
+    assert RequestStats(wall=2.0).tokens_per_s is None
+    shifted = s.shifted(0.5)
+    assert (shifted.wall, shifted.ttft, shifted.tokens_per_s) == (3.5, 1.5, 50.0)
+
+
+def _chunk(text=None, usage=None):
+    choices = [] if text is None else [SimpleNamespace(delta=SimpleNamespace(content=text))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeCompletions:
+    def __init__(self, chunks):
+        self.chunks, self.kwargs = chunks, None
+
+    def create(self, **kw):
+        self.kwargs = kw
+        return iter(self.chunks) if kw.get("stream") else self.chunks
+
+
+def test_streamed_generation_records_usage():
+    usage = SimpleNamespace(prompt_tokens=321, completion_tokens=12)
+    comp = FakeCompletions([_chunk("Here:\n"), _chunk(CMD + "\n"), _chunk(usage=usage)])
+    gen = StreamedGeneration([], SimpleNamespace(chat=SimpleNamespace(completions=comp)), CFG).start()
+    assert gen.wait(5) and gen.first_command == CMD
+    assert comp.kwargs["stream_options"] == {"include_usage": True}
+    s = gen.stats
+    assert (s.prompt_tokens, s.completion_tokens, s.estimated) == (321, 12, False)
+    assert 0 <= s.ttft <= s.wall == gen.elapsed
+
+
+def test_missing_usage_is_estimated():
+    comp = FakeCompletions([_chunk(CMD + "\n")])
+    messages = [{"role": "user", "content": "convert in.mov"}]
+    gen = StreamedGeneration(messages, SimpleNamespace(chat=SimpleNamespace(completions=comp)), CFG).start()
+    assert gen.wait(5)
+    assert gen.stats.estimated and gen.stats.prompt_tokens > 0 and gen.stats.completion_tokens > 0
+
+    resp = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=CMD))],
+        usage=SimpleNamespace(prompt_tokens=40, completion_tokens=9),
+    )
+    stats = RequestStats()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(resp)))
+    assert request_completion(messages, client, CFG, stats=stats) == CMD
+    assert (stats.prompt_tokens, stats.completion_tokens, stats.estimated) == (40, 9, False)
+    assert stats.wall is not None and stats.ttft is None
+
+
+def test_stats_in_transcript_record_and_raw(tmp_path):
+    path = tmp_path / "t.jsonl"
+    tr = Transcript(path=path)
+    ex = tr.begin_exchange("convert")
+    ex.stats = RequestStats(wall=2.5, ttft=0.5, prompt_tokens=300, completion_tokens=80)
+    tr.finish_exchange(ex, CMD, [CMD])
+    rec = json.loads(path.read_text().splitlines()[0])
+    assert rec["wall"] == 2.5 and rec["ttft"] == 0.5
+    assert rec["prompt_tokens"] == 300 and rec["completion_tokens"] == 80 and rec["tok_s"] == 40.0
+    assert "Timing: 2.50s total, first token 0.50s, 300 in / 80 out, 40.0 tok/s" in format_exchange(ex, 1)
+
+
+def test_summary_table():
+    stats = [RequestStats(wall=float(i), ttft=0.1 * i, prompt_tokens=100, completion_tokens=10) for i in range(1, 11)]
+    rows = {label: (n, p50, p95) for label, n, p50, p95 in summarize(stats)}
+    assert rows["wall (s)"] == (10, "5.50", "9.55")
+    assert rows["prompt tokens"][1] == "100"
+    out = format_stats(stats)
+    assert out.startswith("10 requests") and "Total tokens: 1000 in, 100 out" in out
+    assert format_stats([]) == "No completed requests yet."
@@ -37,6 +37,14 @@ def test_log_exec_marks_matching_exchange(tmp_path):
     assert [r["t"] for r in recs] == ["exchange", "exec", "exchange", "exec"]
 
 
+def test_log_exec_for_an_earlier_exchange():
+    t = Transcript(path=None)
+    first = t.add_exchange("q", "r", ["ffmpeg -i a.mov b.mp4"], persist=False)
+    later = t.add_exchange("q2", "r2", ["ffmpeg -i x.mov y.mp4"], persist=False)
+    t.log_exec("ffmpeg -i a.mov b.mp4", 0, persist=False, exchange=first)  # a background job started before q2
+    assert first.executed and first.runs == [("ffmpeg -i a.mov b.mp4", 0)] and later.runs == []
+
+
 def test_rotation_keeps_tail(tmp_path, monkeypatch):
     p = tmp_path / "t.jsonl"
     monkeypatch.setattr(transcript_mod, "MAX_BYTES", 100)
@@ -66,3 +74,35 @@ def test_format_exchange_includes_everything():
     assert "full response" in out
     assert "1. ffmpeg -i a b" in out
     assert "Executed: no" in out
+
+
+def test_streaming_exchange_logged_on_finish(tmp_path):
+    p = tmp_path / "t.jsonl"
+    t = Transcript(path=p)
+    ex = t.begin_exchange("make a gif")
+    ex.raw, ex.ttfc = "ffmpeg -i a b", 0.25
+    assert build_pane_lines(t.entries, 40)[0].startswith("#1 [streaming]")
+    assert not p.exists()  # nothing logged until the response is complete
+    t.finish_exchange(ex, "ffmpeg -i a b\nmore", ["ffmpeg -i a b"])
+    rec = json.loads(p.read_text().splitlines()[0])
+    assert rec["raw"] == "ffmpeg -i a b\nmore" and rec["ttfc"] == 0.25
+    assert not ex.streaming
+
+
+def test_discard_exchange_uses_identity():
+    t = Transcript(path=None)
+    a = t.add_exchange("q", "", [], persist=False)
+    b = t.begin_exchange("q")
+    t.discard_exchange(b)
+    assert t.entries == [a] and t.entries[0] is a
+
+
+def test_cancelled_exchange_keeps_partial_text(tmp_path):
+    p = tmp_path / "t.jsonl"
+    t = Transcript(path=p)
+    ex = t.begin_exchange("slow one")
+    t.finish_exchange(ex, "Let me expl", [], cancelled=True)
+    rec = json.loads(p.read_text().splitlines()[0])
+    assert rec["cancelled"] is True and rec["raw"] == "Let me expl"
+    assert build_pane_lines(t.entries, 40)[0].startswith("#1 [cancelled]")
+    assert "(cancelled; partial)" in format_exchange(ex, 1)